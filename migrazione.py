@@ -12,6 +12,9 @@ PREREQUISITI:
 
 USO:
     python migrazione.py --target "C:\\path\\to\\nuovo\\progetto"
+
+    # Non interattivo (CI, entrypoint container), risultato JSON su stdout:
+    python migrazione.py --target /srv/strapi --yes --install-deps --json
     
     # Oppure con eseguibile standalone (vedi README):
     migrazione.exe --target "C:\\path\\to\\nuovo\\progetto"
@@ -22,142 +25,37 @@ Data: 2025-10-20
 """
 
 import argparse
+import contextlib
 import json
-import os
-import shutil
-import subprocess
 import sys
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Tuple
-
-# Colori per output (compatibile Windows/Linux/Mac)
-class Colors:
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    GRAY = '\033[90m'
-    WHITE = '\033[97m'
-    RESET = '\033[0m'
-    BOLD = '\033[1m'
-
-# Disabilita colori su Windows vecchi (opzionale)
-if sys.platform == 'win32':
-    try:
-        import colorama
-        colorama.init()
-    except ImportError:
-        # Se colorama non disponibile, usa stringhe vuote
-        Colors.CYAN = Colors.GREEN = Colors.YELLOW = ''
-        Colors.RED = Colors.GRAY = Colors.WHITE = Colors.RESET = Colors.BOLD = ''
-
-
-def print_header(text: str, color=Colors.CYAN):
-    """Stampa un header formattato"""
-    print(f"{color}{'=' * 40}{Colors.RESET}")
-    print(f"{color}  {text}{Colors.RESET}")
-    print(f"{color}{'=' * 40}{Colors.RESET}")
-    print()
-
-
-def print_step(step: str, total: int, current: int, text: str):
-    """Stampa un passo della migrazione"""
-    print(f"{Colors.CYAN}[{current}/{total}] {text}...{Colors.RESET}")
-
-
-def print_success(text: str, indent: str = '   '):
-    """Stampa messaggio di successo"""
-    print(f"{indent}{Colors.GREEN}[OK] {text}{Colors.RESET}")
-
-
-def print_error(text: str, indent: str = '   '):
-    """Stampa messaggio di errore"""
-    print(f"{indent}{Colors.RED}[ERRORE] {text}{Colors.RESET}")
-
-
-def print_warning(text: str, indent: str = '   '):
-    """Stampa messaggio di warning"""
-    print(f"{indent}{Colors.YELLOW}[WARNING] {text}{Colors.RESET}")
-
-
-def print_info(text: str, indent: str = '   '):
-    """Stampa messaggio informativo"""
-    print(f"{indent}{Colors.YELLOW}[INFO] {text}{Colors.RESET}")
-
-
-def print_detail(text: str, indent: str = '        '):
-    """Stampa dettaglio grigio"""
-    print(f"{indent}{Colors.GRAY}{text}{Colors.RESET}")
-
-
-def validate_paths(target_path: str) -> Tuple[Path, Path]:
-    """
-    Valida i percorsi sorgente e target
-    Returns: (source_path, target_path)
-    """
-    print_step('Validazione percorsi', 9, 1, 'Validazione percorsi')
-    
-    # 1. Verifica che siamo nella root del progetto sorgente
-    source_path = Path.cwd()
-    package_json_path = source_path / 'package.json'
-    
-    if not package_json_path.exists():
-        print_error('Non sei nella root di un progetto Strapi!')
-        print_warning(f'Cartella corrente: {source_path}')
-        print()
-        print_warning('Esegui questo script dalla root del progetto Strapi SORGENTE')
-        sys.exit(1)
-    
-    # 2. Verifica che il progetto sorgente sia Strapi
-    with open(package_json_path, 'r', encoding='utf-8') as f:
-        source_package = json.load(f)
-    
-    if '@strapi/strapi' not in source_package.get('dependencies', {}):
-        print_error('Questo non sembra un progetto Strapi!')
-        sys.exit(1)
-    
-    # 3. Verifica che il percorso target esista
-    target_path = Path(target_path).resolve()
-    
-    if not target_path.exists():
-        print_error('Il percorso target non esiste!')
-        print_warning(f'Path: {target_path}')
-        sys.exit(1)
-    
-    # 4. Verifica che il target sia un progetto Strapi
-    target_package_json = target_path / 'package.json'
-    
-    if not target_package_json.exists():
-        print_error('Il progetto target non ha un package.json!')
-        print_warning(f'Path: {target_path}')
-        sys.exit(1)
-    
-    with open(target_package_json, 'r', encoding='utf-8') as f:
-        target_package = json.load(f)
-    
-    if '@strapi/strapi' not in target_package.get('dependencies', {}):
-        print_error('Il progetto target non sembra un progetto Strapi!')
-        sys.exit(1)
-    
-    # 5. Verifica che non siano lo stesso progetto
-    if source_path.resolve() == target_path.resolve():
-        print_error('Il progetto sorgente e target sono lo stesso!')
-        print_warning('Non puoi migrare un progetto su se stesso')
-        sys.exit(1)
-    
-    print_success('Validazioni completate')
-    print()
-    print(f"{Colors.WHITE}   Sorgente: {source_path}{Colors.RESET}")
-    print(f"{Colors.WHITE}   Target:   {target_path}{Colors.RESET}")
-    print()
+from typing import List, Dict, Optional, Tuple
+
+from migrazione_cache import read_json
+from migrazione_comune import (
+    Colors, print_header, print_step, print_success, print_error, print_warning, print_info, print_detail,
+    validate_paths as comune_validate_paths, verify_copies,
+)
+from migrazione_copia import CopyEngine, CopyResult, DEFAULT_BACKUP_KEEP, DEFAULT_JOBS, active_ignore, format_size
+from migrazione_piano import PHASE_PLANS, build_graph, execute_steps, select_plan
+from migrazione_schema import api_folders_of, select_closure
+from migrazione_processi import DEFAULT_TIMEOUT, CommandResult, run_command, run_concurrently
+
+
+def validate_paths(target_path: str, total_steps: int) -> Tuple[Path, Path]:
+    """Valida sorgente e target (migrazione_comune) e ricorda cosa viene migrato"""
+    source_path, target_path = comune_validate_paths(target_path, total_steps)
     print_warning('NOTA: Verranno migrati anche content-types e components')
     print()
-    
     return source_path, target_path
 
 
-def confirm_migration() -> bool:
-    """Chiede conferma all'utente"""
+def confirm_migration(assume_yes: bool = False) -> bool:
+    """Chiede conferma all'utente (saltata con --yes)"""
+    if assume_yes:
+        print_info('Conferma automatica (--yes)')
+        return True
     try:
         response = input('Vuoi procedere con la migrazione? (s/n): ').lower().strip()
         return response == 's'
@@ -165,309 +63,244 @@ def confirm_migration() -> bool:
         print()
         print_error('Migrazione annullata dall\'utente')
         return False
+    except EOFError:
+        # stdin chiuso (pipeline, container senza TTY)
+        print()
+        print_error('Nessun input disponibile: usa --yes per l\'esecuzione non interattiva')
+        return False
 
 
-def copy_directory(source: Path, target: Path, description: str) -> Tuple[int, bool]:
+def migrate_files(source: Path, target: Path, engine: CopyEngine, total_steps: int,
+                  only: Optional[List[str]] = None) -> Tuple[int, int]:
     """
-    Copia una directory ricorsivamente
-    Returns: (numero_file_copiati, successo)
+    Migra tutti i file necessari: il piano 'completa' di migrazione_piano
+    only: uid da migrare (--only), None per tutte le collection e i components
+    Returns: (file_migrati, errori)
     """
-    try:
-        if not source.exists():
-            print_warning(f'{description} non trovato')
-            return 0, False
-        
-        # Crea directory parent se non esiste
-        target.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Rimuovi target se esiste
-        if target.exists():
-            shutil.rmtree(target)
-        
-        # Copia ricorsivamente
-        shutil.copytree(source, target)
-        
-        # Conta files
-        file_count = sum(1 for _ in target.rglob('*') if _.is_file())
-        
-        print_success(f'{description} migrato ({file_count} files)')
-        return file_count, True
-        
-    except Exception as e:
-        print_error(f'Errore migrazione {description}: {e}')
-        return 0, False
+    selection = select_plan(source, only) if only is not None else None
+    graph = build_graph(source, target, ['completa'], PHASE_PLANS, selection)
+    return execute_steps(graph, engine, PHASE_PLANS, 'completa', 2, total_steps)
 
 
-def copy_file(source: Path, target: Path, description: str, create_backup: bool = True) -> Tuple[int, bool]:
+REQUIRED_DEPS = {
+    '@strapi-community/strapi-provider-upload-google-cloud-storage': '^5.0.5',
+    'slugify': '^1.6.6',
+}
+
+REQUIRED_DEV_DEPS = {
+    '@types/node': '^20.19.21',
+}
+
+
+def _lockfile_packages(target: Path) -> Optional[set]:
     """
-    Copia un singolo file
-    Returns: (1 se successo 0 altrimenti, successo)
+    Nomi dei pacchetti registrati in package-lock.json (formato v1, v2 e v3)
+    Returns: None se il lockfile manca o non è leggibile
     """
+    lock_path = target / 'package-lock.json'
     try:
-        if not source.exists():
-            print_warning(f'{description} non trovato')
-            return 0, False
-        
-        # Backup se richiesto e file esiste
-        if create_backup and target.exists():
-            backup_path = Path(str(target) + '.backup')
-            shutil.copy2(target, backup_path)
-            print_info(f'Backup creato: {backup_path.name}')
-        
-        # Crea directory parent se non esiste
-        target.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Copia file
-        shutil.copy2(source, target)
-        
-        print_success(f'{description} migrato')
-        return 1, True
-        
-    except Exception as e:
-        print_error(f'Errore migrazione {description}: {e}')
-        return 0, False
+        lock = read_json(lock_path)
+    except (OSError, ValueError):
+        return None
+    
+    names = set(lock.get('dependencies', {}))
+    for key in lock.get('packages', {}):
+        if key.startswith('node_modules/'):
+            names.add(key[len('node_modules/'):])
+    return names
 
 
-def migrate_files(source: Path, target: Path) -> Tuple[int, int]:
+def plan_npm_commands(target: Path) -> Tuple[List[List[str]], List[str]]:
     """
-    Migra tutti i file necessari
-    Returns: (file_migrati, errori)
+    Confronta package.json, package-lock.json e node_modules del target con
+    le dipendenze richieste. Al massimo un npm install runtime e uno dev; se
+    package.json e lockfile contengono già tutto basta un npm ci offline.
+    Returns: (comandi npm da eseguire, dipendenze mancanti in package.json)
     """
-    migrated_files = 0
-    errors = 0
-    
-    # 1. Migrazione Plugin Tree-View
-    print_step('Migrazione plugin tree-view', 9, 2, 'Migrazione plugin tree-view')
-    files, success = copy_directory(
-        source / 'src' / 'plugins' / 'tree-view',
-        target / 'src' / 'plugins' / 'tree-view',
-        'Plugin tree-view'
-    )
-    migrated_files += files
-    if not success and files == 0:
-        pass  # Warning già stampato
-    elif not success:
-        errors += 1
-    print()
-    
-    # 2. Migrazione API Common (AGGIORNATO CON NUOVE FUNZIONALITÀ)
-    print_step('Migrazione API Common', 9, 3, 'Migrazione API Common')
-    files, success = copy_directory(
-        source / 'src' / 'api' / 'common',
-        target / 'src' / 'api' / 'common',
-        'API Common'
-    )
-    migrated_files += files
-    if success:
-        print_detail('- archivio controller/routes')
-        print_detail('- unpublish controller/routes')
-        print_detail('- path-resolver service/controller/routes (gestione path duplicati)')
-        print_detail('- default-path service')
-        print_detail('- content-type placeholder (nascosto)')
-    elif not success and files == 0:
-        pass
-    else:
-        errors += 1
-    print()
-    
-    # 3. Migrazione TUTTE le Collection Types (src/api/)
-    print_step('Migrazione collection types', 9, 4, 'Migrazione collection types')
-    
-    source_api = source / 'src' / 'api'
-    target_api = target / 'src' / 'api'
-    
-    if source_api.exists():
-        # Trova tutte le cartelle in src/api/ (escluso 'common' già migrato)
-        api_folders = [f for f in source_api.iterdir() if f.is_dir() and f.name != 'common']
-        
-        if api_folders:
-            print_info(f'Trovate {len(api_folders)} collection types da migrare:')
-            for folder in api_folders:
-                print_detail(f'  - {folder.name}')
-            print()
-            
-            collection_count = 0
-            for folder in api_folders:
-                files, success = copy_directory(
-                    folder,
-                    target_api / folder.name,
-                    f'Collection "{folder.name}"'
-                )
-                migrated_files += files
-                if success:
-                    collection_count += 1
-                elif not success and files > 0:
-                    errors += 1
-            
-            print()
-            print_success(f'{collection_count}/{len(api_folders)} collection types migrate correttamente')
-        else:
-            print_warning('Nessuna collection type custom trovata (escluso common)')
-    else:
-        print_warning('Cartella src/api/ non trovata')
-    
-    print()
-    
-    # 4. Migrazione Components
-    print_step('Migrazione components', 9, 5, 'Migrazione components')
-    files, success = copy_directory(
-        source / 'src' / 'components',
-        target / 'src' / 'components',
-        'Components'
-    )
-    migrated_files += files
-    if success:
-        print_detail('- url/url-addizionali (per default-path)')
-        print_detail('- altri components custom')
-    elif not success and files == 0:
-        pass
-    else:
-        errors += 1
-    print()
-    
-    # 5. Migrazione src/utils (SEO auto-populate)
-    print_step('Migrazione src/utils', 9, 5.5, 'Migrazione src/utils')
-    files, success = copy_directory(
-        source / 'src' / 'utils',
-        target / 'src' / 'utils',
-        'Utils (SEO auto-populate)'
+    pkg_data = read_json(target / 'package.json')
+    
+    deps = pkg_data.get('dependencies', {})
+    dev_deps = pkg_data.get('devDependencies', {})
+    
+    missing = [f'{dep}@{version}' for dep, version in REQUIRED_DEPS.items() if dep not in deps]
+    missing_dev = [f'{dep}@{version}' for dep, version in REQUIRED_DEV_DEPS.items()
+                   if dep not in dev_deps and dep not in deps]
+    
+    commands = []
+    if missing:
+        commands.append(['npm', 'install', *missing])
+    if missing_dev:
+        commands.append(['npm', 'install', '--save-dev', *missing_dev])
+    if commands:
+        return commands, missing + missing_dev
+    
+    # package.json è già a posto: serve solo che node_modules sia allineato
+    required = list(REQUIRED_DEPS) + list(REQUIRED_DEV_DEPS)
+    if all((target / 'node_modules' / dep / 'package.json').exists() for dep in required):
+        return [], []
+    
+    locked = _lockfile_packages(target)
+    if locked is not None and all(dep in locked for dep in required):
+        return [['npm', 'ci', '--prefer-offline', '--no-audit', '--no-fund']], []
+    return [['npm', 'install']], []
+
+
+def print_npm_line(line: str) -> None:
+    print(f"        {Colors.GRAY}[npm] {line}{Colors.RESET}")
+
+
+def run_npm(command: List[str], target: Path, timeout: Optional[float],
+            output: Optional[List[str]] = None) -> CommandResult:
+    """Esegue un comando npm nel target mostrando l'output man mano (o conservandolo in output)"""
+    return run_command(
+        command,
+        cwd=target,
+        timeout=timeout,
+        on_line=output.append if output is not None else print_npm_line
     )
-    migrated_files += files
-    if success:
-        print_detail('- seo-auto-populate.ts (auto-popolamento SEO)')
-    elif not success and files == 0:
-        pass
-    else:
-        errors += 1
-    print()
-    
-    # 6. Migrazione src/index.ts (Global Subscriber)
-    print_step('Migrazione src/index.ts', 9, 6, 'Migrazione src/index.ts')
-    files, success = copy_file(
-        source / 'src' / 'index.ts',
-        target / 'src' / 'index.ts',
-        'src/index.ts (global subscriber + default-path logic)',
-        create_backup=True
-    )
-    migrated_files += files
-    if not success and files == 0:
-        pass
-    elif not success:
-        errors += 1
-    print()
-    
-    # 7. Migrazione Config Files
-    print_step('Migrazione file di configurazione', 9, 7, 'Migrazione file di configurazione')
-    
-    config_files = [
-        ('admin.ts', 'config/admin.ts'),
-        ('plugins.ts', 'config/plugins.ts'),
-    ]
-    
-    for filename, description in config_files:
-        files, success = copy_file(
-            source / 'config' / filename,
-            target / 'config' / filename,
-            description,
-            create_backup=True
-        )
-        migrated_files += files
-        if not success and files > 0:
+
+
+@dataclass
+class NpmRun:
+    """Comando npm eseguito, con l'output se eseguito in parallelo alla copia"""
+    command: List[str]
+    result: Optional[CommandResult] = None
+    error: Optional[Exception] = None
+    retried: bool = False
+    output: Optional[List[str]] = None
+
+
+def install_dependencies(commands: List[List[str]], target: Path, timeout: Optional[float],
+                         buffered: bool = False) -> List[NpmRun]:
+    """
+    Esegue i comandi npm in ordine, fermandosi al primo che non si avvia
+    buffered: l'output non viene stampato ma conservato in NpmRun.output,
+              per riportarlo dopo la copia eseguita in parallelo
+    """
+    runs = []
+    queue = list(commands)
+    while queue:
+        run = NpmRun(queue.pop(0), output=[] if buffered else None)
+        runs.append(run)
+        if not buffered:
+            print_detail(' '.join(run.command))
+        try:
+            run.result = run_npm(run.command, target, timeout, run.output)
+        except Exception as e:
+            run.error = e
+            break
+        if not run.result.ok and not run.result.timed_out and run.command[1] == 'ci':
+            # Lockfile non allineato a package.json: si ripiega su npm install
+            run.retried = True
+            if not buffered:
+                print_warning('npm ci fallito, riprovo con npm install')
+            queue.insert(0, ['npm', 'install'])
+    return runs
+
+
+def report_npm_runs(runs: List[NpmRun], timeout: Optional[float]) -> int:
+    """Stampa l'esito dei comandi npm (e l'output conservato). Returns: errori"""
+    errors = 0
+    for run in runs:
+        if run.output is not None:
+            print_detail(' '.join(run.command))
+            for line in run.output:
+                if line:
+                    print_npm_line(line)
+            if run.retried:
+                print_warning('npm ci fallito, riprovo con npm install')
+        if run.retried:
+            continue
+        if run.error is not None:
+            print_error(f'Errore durante installazione dipendenze: {run.error}')
             errors += 1
-    
-    print()
-    
-    return migrated_files, errors
+        elif run.result.timed_out:
+            print_error(f'Timeout ({timeout:g} s) eseguendo: {" ".join(run.command)}')
+            errors += 1
+        elif not run.result.ok:
+            print_error(f'Errore eseguendo: {" ".join(run.command)} (exit code {run.result.returncode})')
+            for line in run.result.tail[-5:]:
+                print_detail(line)
+            errors += 1
+    return errors
 
 
-def manage_dependencies(target: Path) -> int:
+def manage_dependencies(target: Path, install: Optional[bool] = None,
+                        timeout: Optional[float] = DEFAULT_TIMEOUT,
+                        step: Tuple[int, int] = (1, 1),
+                        planned: Optional[Tuple[List[List[str]], List[str]]] = None,
+                        runs: Optional[List[NpmRun]] = None) -> Tuple[int, bool]:
     """
     Gestisce l'installazione delle dipendenze
-    Returns: errori
+    install: True/False da --install-deps/--no-install-deps, None per chiedere
+    timeout: secondi massimi per ogni comando npm (None = nessun limite)
+    step: (passo, totale) per l'intestazione
+    planned, runs: comandi (plan_npm_commands) ed esito di un'installazione
+                   già eseguita in parallelo alla copia, da riportare
+    Returns: (errori, dipendenze installate)
     """
     errors = 0
     
-    print_step('Gestione dipendenze', 9, 8, 'Gestione dipendenze')
+    print_step('Gestione dipendenze', step[1], step[0], 'Gestione dipendenze')
     
-    required_deps = {
-        '@strapi-community/strapi-provider-upload-google-cloud-storage': '^5.0.5',
-        'slugify': '^1.6.6',
-    }
+    try:
+        commands, missing = planned if planned is not None else plan_npm_commands(target)
+    except (OSError, ValueError) as e:
+        print_error(f'Errore lettura package.json del target: {e}')
+        print()
+        return 1, False
     
-    required_dev_deps = {
-        '@types/node': '^20.19.21',
-    }
+    if not commands:
+        print_success('Tutte le dipendenze richieste sono già installate')
+        print()
+        return 0, False
     
-    print_warning('Dipendenze richieste:')
-    for dep, version in required_deps.items():
-        print_detail(f'- {dep}@{version}')
+    if missing:
+        print_warning('Dipendenze mancanti nel package.json del target:')
+        for dep in missing:
+            print_detail(f'- {dep}')
+    else:
+        print_warning('Dipendenze presenti in package.json ma non installate in node_modules')
     
     print()
     
-    try:
-        response = input('Vuoi installare le dipendenze nel progetto target ora? (s/n): ').lower().strip()
-        install_deps = response == 's'
-    except KeyboardInterrupt:
-        print()
-        install_deps = False
+    if install is not None:
+        install_deps = install
+    else:
+        try:
+            response = input('Vuoi installare le dipendenze nel progetto target ora? (s/n): ').lower().strip()
+            install_deps = response == 's'
+        except (KeyboardInterrupt, EOFError):
+            print()
+            install_deps = False
     
     if install_deps:
-        print_info('Installazione dipendenze nel progetto target...')
-        
-        # Cambia directory al target
-        original_dir = os.getcwd()
-        os.chdir(target)
+        if runs is None:
+            print_info('Installazione dipendenze nel progetto target...')
+            runs = install_dependencies(commands, target, timeout)
+        else:
+            print_info('Installazione dipendenze eseguita durante la copia dei file:')
+        errors = report_npm_runs(runs, timeout)
         
-        try:
-            for dep, version in required_deps.items():
-                dep_string = f'{dep}@{version}'
-                print_detail(f'Installing {dep_string}...')
-                
-                result = subprocess.run(
-                    ['npm', 'install', dep_string],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                    print_error(f'Errore installando {dep_string}')
-                    errors += 1
-            
-            for dep in required_dev_deps.keys():
-                print_detail(f'Installing {dep} (dev)...')
-                
-                result = subprocess.run(
-                    ['npm', 'install', '--save-dev', dep],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                    print_error(f'Errore installando {dep}')
-                    errors += 1
-            
-            if errors == 0:
-                print_success('Dipendenze installate')
-            
-        except Exception as e:
-            print_error(f'Errore durante installazione dipendenze: {e}')
-            errors += 1
-        finally:
-            # Ritorna alla directory originale
-            os.chdir(original_dir)
+        if errors == 0:
+            print_success('Dipendenze installate')
     else:
         print_warning('Installazione dipendenze saltata')
         print_info('Esegui manualmente nel progetto target:')
-        for dep, version in required_deps.items():
-            print_detail(f'npm install {dep}@{version}')
+        for command in commands:
+            print_detail(' '.join(command))
     
     print()
-    return errors
+    return errors, install_deps
 
 
-def verify_env(target: Path):
-    """Verifica la configurazione .env"""
-    print_step('Verifica configurazione .env', 9, 9, 'Verifica configurazione .env')
+def verify_env(target: Path, step: Tuple[int, int] = (1, 1)) -> List[str]:
+    """
+    Verifica la configurazione .env
+    step: (passo, totale) per l'intestazione
+    Returns: variabili mancanti
+    """
+    print_step('Verifica configurazione .env', step[1], step[0], 'Verifica configurazione .env')
     
     env_file = target / '.env'
     env_vars_needed = [
@@ -492,6 +325,7 @@ def verify_env(target: Path):
         else:
             print_success('Tutte le variabili ambiente sono configurate')
     else:
+        missing_vars = list(env_vars_needed)
         print_warning('File .env non trovato nel progetto target')
         print()
         print_info('Crea un file .env nella root del progetto target con:')
@@ -501,12 +335,29 @@ def verify_env(target: Path):
         print_detail('GCS_BUCKET_NAME=your-bucket-name (opzionale)')
     
     print()
+    return missing_vars
 
 
-def print_summary(migrated_files: int, errors: int):
+def ignored_summary() -> Dict:
+    """Path esclusi da .migrationignore, per l'output --json"""
+    rules = active_ignore()
+    if rules is None:
+        return {}
+    files, size, dirs = rules.totals()
+    return {'source': rules.origin, 'files': files, 'bytes': size, 'directories': rules.pruned()}
+
+
+def print_summary(migrated_files: int, errors: int, copy_summary: CopyResult):
     """Stampa il riepilogo finale"""
     print_header('Riepilogo Migrazione', Colors.CYAN)
     print(f"{Colors.GREEN}[OK] File migrati:  {migrated_files}{Colors.RESET}")
+    print(f"{Colors.GREEN}[OK] Dati migrati:  {format_size(copy_summary.bytes)} "
+          f"({copy_summary.copied} file scritti, {format_size(copy_summary.bytes_copied)}){Colors.RESET}")
+    rules = active_ignore()
+    if rules is not None and rules.excluded:
+        ignored_files, ignored_bytes, ignored_dirs = rules.totals()
+        print(f"{Colors.GREEN}[OK] Esclusi:       {ignored_dirs} cartelle non visitate, "
+              f"{ignored_files} file ({format_size(ignored_bytes)}) - {rules.origin}{Colors.RESET}")
     print(f"{Colors.RED}[ERRORE] Errori:    {errors}{Colors.RESET}")
     print()
     
@@ -559,6 +410,9 @@ def main():
 Esempio:
     python migrazione.py --target "C:\\path\\to\\nuovo\\progetto"
     
+    # Non interattivo con risultato JSON:
+    python migrazione.py --target /srv/strapi --yes --no-install-deps --json
+    
     # Con eseguibile standalone:
     migrazione.exe --target "C:\\path\\to\\nuovo\\progetto"
         """
@@ -570,50 +424,232 @@ Esempio:
         help='Percorso del progetto Strapi target'
     )
     
+    parser.add_argument(
+        '-y', '--yes',
+        action='store_true',
+        help='Non chiede conferma (uso non interattivo: CI, entrypoint container)'
+    )
+    
+    parser.add_argument(
+        '--install-deps',
+        dest='install_deps',
+        action='store_true',
+        default=None,
+        help='Installa le dipendenze nel target senza chiedere'
+    )
+    
+    parser.add_argument(
+        '--no-install-deps',
+        dest='install_deps',
+        action='store_false',
+        help='Salta l\'installazione delle dipendenze senza chiedere (default con --yes)'
+    )
+    
+    parser.add_argument(
+        '--npm-timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f'Secondi massimi per ogni comando npm (default: {DEFAULT_TIMEOUT}, 0 = nessun limite)'
+    )
+    
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Stampa su stdout il risultato in JSON (l\'output leggibile va su stderr)'
+    )
+    
+    parser.add_argument(
+        '--only',
+        type=str,
+        help='Migra solo le collection indicate (es: pagina,articoli) più content-type e components da cui dipendono'
+    )
+    
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Dopo la copia confronta hash e dimensioni di ogni file del target con il sorgente'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Copia solo i file nuovi o modificati (manifest degli hash nel target)'
+    )
+    
+    parser.add_argument(
+        '--staged',
+        action='store_true',
+        help='Copia ogni directory in una cartella temporanea e la sostituisce con rename atomici'
+    )
+    
+    parser.add_argument(
+        '--hardlink',
+        action='store_true',
+        help='Crea hardlink invece di copie (solo mirror in sola lettura: modificare il target modifica il sorgente)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Riprende una migrazione interrotta saltando le operazioni già completate nel journal del target '
+             '(il journal si scrive sempre e viene eliminato a fine esecuzione senza errori)'
+    )
+    
+    parser.add_argument(
+        '--backup-keep',
+        type=int,
+        default=DEFAULT_BACKUP_KEEP,
+        help=f'Archivi di backup da conservare in .migrazione/backups (default: {DEFAULT_BACKUP_KEEP})'
+    )
+    
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f'Numero di copie eseguite in parallelo (default: {DEFAULT_JOBS}, 1 = sequenziale)'
+    )
+    
     args = parser.parse_args()
     
+    # Con --json l'output leggibile va su stderr e stdout contiene solo il risultato
+    result = {
+        'status': 'failed',
+        'source': str(Path.cwd()),
+        'target': args.target,
+    }
+    output = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    exit_code = 1
+    try:
+        with output:
+            exit_code = run_migration(args, result)
+    finally:
+        if args.json:
+            result['exit_code'] = exit_code
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(exit_code)
+
+
+def run_migration(args: argparse.Namespace, result: Dict) -> int:
+    """
+    Esegue la migrazione completa aggiornando result (output di --json)
+    Returns: exit code
+    """
     # Header
     print()
     print_header('Strapi Custom Features - Migrazione')
     
     try:
-        # 1. Validazione
-        source, target = validate_paths(args.target)
+        # 1. Validazione; poi gli step del piano, la verifica (--verify), dipendenze e .env
+        result['status'] = 'invalid'
+        copy_steps = len(PHASE_PLANS['completa']['steps'])
+        total_steps = 1 + copy_steps + (1 if args.verify else 0) + 2
+        source, target = validate_paths(args.target, total_steps)
+        result['target'] = str(target)
+        
+        only = None
+        if args.only:
+            try:
+                only = select_closure(source, args.only)
+            except ValueError as e:
+                print_error(str(e))
+                return 1
+            print_info(f'--only {args.only}: {len(api_folders_of(only))} collection e '
+                       f'{sum(1 for uid in only if not uid.startswith("api::"))} components (con dipendenze)')
+            print_detail(', '.join(only))
+            print()
+            result['only'] = only
         
         # 2. Conferma
-        if not confirm_migration():
+        if not confirm_migration(args.yes):
             print_error('Migrazione annullata.')
-            sys.exit(1)
+            result['status'] = 'aborted'
+            return 1
         
         print()
         
-        # 3. Migrazione files
-        migrated_files, file_errors = migrate_files(source, target)
+        # 3. Migrazione files e 4. gestione dipendenze
+        result['status'] = 'failed'
+        engine = CopyEngine(source, target, incremental=args.incremental, jobs=args.jobs,
+                            staged=args.staged, hardlink=args.hardlink, resume=args.resume,
+                            backup_keep=args.backup_keep, verify=args.verify)
+        install = args.install_deps
+        if install is None and args.yes:
+            # Nessuna domanda con --yes: senza --install-deps non si installa
+            install = False
+        timeout = args.npm_timeout or None
+        
+        def copy_step():
+            try:
+                migrated, errors = migrate_files(source, target, engine, total_steps, only)
+                if args.verify:
+                    print_step('Verifica integrità', total_steps, copy_steps + 2, 'Verifica integrità dei file copiati')
+                    errors += len(verify_copies(engine).mismatches)
+            finally:
+                engine.close()
+            if errors == 0:
+                engine.complete()
+            return migrated, errors
         
-        # 4. Gestione dipendenze
-        dep_errors = manage_dependencies(target)
+        dependencies_step = (total_steps - 1, total_steps)
+        planned = runs = None
+        if install:
+            try:
+                planned = plan_npm_commands(target)
+            except (OSError, ValueError):
+                pass  # l'errore viene riportato dallo step delle dipendenze
+        
+        if planned and planned[0]:
+            # La risposta è già nota: npm (package.json, node_modules) e la copia
+            # (src/, config/) non si toccano, quindi girano in parallelo. Solo i
+            # processi npm: il loro output viene riportato dopo la copia
+            print_info('Installazione dipendenze in parallelo alla copia dei file')
+            print()
+            (migrated_files, file_errors), runs = run_concurrently(
+                copy_step,
+                lambda: install_dependencies(planned[0], target, timeout, buffered=True)
+            )
+        else:
+            migrated_files, file_errors = copy_step()
+        dep_errors, deps_installed = manage_dependencies(target, install, timeout, dependencies_step,
+                                                         planned, runs)
         
         # 5. Verifica .env
-        verify_env(target)
+        missing_env = verify_env(target, (total_steps, total_steps))
         
         # 6. Riepilogo
         total_errors = file_errors + dep_errors
-        print_summary(migrated_files, total_errors)
+        copy_summary = engine.summary()
+        print_summary(migrated_files, total_errors, copy_summary)
+        
+        result.update({
+            'status': 'ok' if total_errors == 0 else 'errors',
+            'files_migrated': migrated_files,
+            'files_written': copy_summary.copied,
+            'bytes': copy_summary.bytes,
+            'bytes_written': copy_summary.bytes_copied,
+            'ignored': ignored_summary(),
+            'file_errors': file_errors,
+            'dependency_errors': dep_errors,
+            'dependencies_installed': deps_installed,
+            'env_missing': missing_env,
+        })
         
         # Exit code
-        sys.exit(0 if total_errors == 0 else 1)
+        return 0 if total_errors == 0 else 1
         
     except KeyboardInterrupt:
         print()
         print_error('Migrazione interrotta dall\'utente')
-        sys.exit(1)
+        print_info('Le operazioni completate sono nel journal: rilancia con --resume per riprendere')
+        result['status'] = 'interrupted'
+        return 1
     except Exception as e:
         print()
         print_error(f'Errore imprevisto: {e}')
         import traceback
         traceback.print_exc()
-        sys.exit(1)
-
+        result['error'] = str(e)
+        return 1
 
 if __name__ == '__main__':
     main()
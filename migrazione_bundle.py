@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+====================================
+Bundle di migrazione (tar + zstd)
+====================================
+Per i target remoti (server, container su un altro host) i file delle
+fasi selezionate vengono esportati in un unico archivio compresso invece
+di essere copiati file per file su una share di rete.
+
+ESPORTAZIONE (--bundle out.tar.zst):
+Il bundle viene scritto in streaming in una sola passata: ogni file del
+sorgente viene letto una volta, compresso e contemporaneamente passato
+allo SHA-256. In coda all'archivio c'è bundle.json con le operazioni del
+piano (directory sostituite per intero, file singoli, backup) e hash,
+dimensione e mtime di ogni file, nello stesso formato del manifest.
+Con '-' il bundle viene scritto su stdout (es. pipe verso ssh).
+
+APPLICAZIONE (--apply-bundle out.tar.zst):
+Il bundle viene estratto in streaming in .migrazione/bundle nel target
+(stesso filesystem), verificando dimensione e hash di ogni file rispetto
+a bundle.json. Il progetto non viene toccato finché l'estrazione non è
+completa e verificata: un bundle troncato o corrotto viene scartato.
+Le operazioni vengono poi eseguite con il motore di copia, con hardlink
+dai file estratti (nessuna seconda copia dei dati) e con le stesse
+opzioni degli script: --incremental, --staged, --resume, --verify, backup.
+
+BUNDLE DELTA (--bundle delta.tar.zst --base release.json):
+Dopo ogni --apply-bundle riuscito il target registra la release
+applicata in .migrazione/release.json (hash, dimensione e mtime di ogni
+file). Un bundle delta viene costruito confrontando quella release con
+il sorgente attuale: contiene solo i file nuovi o modificati e l'elenco
+dei file eliminati (i file con stessa dimensione e mtime non vengono
+nemmeno letti). In applicazione il target deve essere ancora sulla
+release base; i file da sostituire o eliminare vengono spostati da
+parte e, a qualsiasi errore, ripristinati: il delta si applica per
+intero o per niente.
+
+COMPRESSIONE:
+.tar.zst richiede il pacchetto opzionale zstandard; .tar.gz e .tar
+usano solo la libreria standard. In lettura il formato viene riconosciuto
+dal contenuto, non dall'estensione.
+====================================
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Dict, List, Optional, Set, Tuple
+
+from migrazione_copia import (
+    HASH_CHUNK_SIZE, MANIFEST_DIR, BackupStore, SyncManifest, file_sha256, scan_tree,
+)
+
+# zstandard è opzionale: senza, si usano i bundle .tar.gz
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BUNDLE_VERSION = 1
+BUNDLE_INDEX = 'bundle.json'
+BUNDLE_FILES = 'files'
+BUNDLE_DIR = 'bundle'
+RELEASE_FILE = 'release.json'
+UNDO_DIR = 'undo'
+ZSTD_LEVEL = 3
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class BundleError(Exception):
+    """Bundle illeggibile, incompleto o non corrispondente a bundle.json"""
+
+
+@dataclass
+class BundleOperation:
+    """Operazione del piano registrata nel bundle (path relativo alla root del target)"""
+    kind: str
+    path: str
+    phase: str
+    step: str
+    backup: bool = False
+
+
+@dataclass
+class BundleIndex:
+    """Contenuto di bundle.json"""
+    phases: List[str] = field(default_factory=list)
+    operations: List[BundleOperation] = field(default_factory=list)
+    files: Dict[str, Dict] = field(default_factory=dict)
+    created: str = ''
+    source: str = ''
+    release: str = ''
+    base: str = ''
+    deleted: List[str] = field(default_factory=list)
+
+    @property
+    def bytes(self) -> int:
+        return sum(entry['size'] for entry in self.files.values())
+
+    @property
+    def delta(self) -> bool:
+        return bool(self.base)
+
+    def backup_keys(self) -> Set[str]:
+        """File singoli da salvare nei backup prima di sovrascriverli"""
+        return {op.path for op in self.operations if op.kind == 'file' and op.backup}
+
+    def to_json(self) -> Dict:
+        return {
+            'version': BUNDLE_VERSION,
+            'created': self.created,
+            'source': self.source,
+            'phases': self.phases,
+            'release': self.release,
+            'base': self.base,
+            'deleted': self.deleted,
+            'operations': [op.__dict__ for op in self.operations],
+            'files': self.files,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'BundleIndex':
+        if data.get('version') != BUNDLE_VERSION:
+            raise BundleError(f'versione del bundle non supportata: {data.get("version")}')
+        return cls(
+            phases=data.get('phases', []),
+            operations=[BundleOperation(**op) for op in data.get('operations', [])],
+            files=data.get('files', {}),
+            created=data.get('created', ''),
+            source=data.get('source', ''),
+            release=data.get('release', ''),
+            base=data.get('base', ''),
+            deleted=data.get('deleted', []),
+        )
+
+
+def release_id(files: Dict[str, Dict]) -> str:
+    """Identificativo di una release: hash dell'elenco di path, hash, dimensioni e mtime"""
+    return hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def release_path(target_root: Path) -> Path:
+    return target_root / MANIFEST_DIR / RELEASE_FILE
+
+
+def load_release(path: Path) -> BundleIndex:
+    """
+    Release applicata a un target: path di release.json o della root del progetto target
+    """
+    if path.is_dir():
+        path = release_path(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return BundleIndex.from_json(json.load(f))
+    except FileNotFoundError:
+        raise BundleError(f'release non trovata: {path} (serve un --apply-bundle completo sul target)')
+    except ValueError as e:
+        raise BundleError(f'release illeggibile: {path}: {e}')
+
+
+def save_release(target_root: Path, index: BundleIndex, files: Dict[str, Dict]) -> None:
+    """Registra nel target la release applicata (base per i bundle delta successivi)"""
+    release = BundleIndex(phases=index.phases, created=index.created, source=index.source,
+                          release=release_id(files), files=files)
+    path = release_path(target_root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(release.to_json(), f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class _HashingReader:
+    """File in lettura che aggiorna lo SHA-256 mentre tarfile ne copia il contenuto"""
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def bundle_compression(path: str) -> str:
+    """Compressione del bundle in base all'estensione: 'zst', 'gz' o '' (tar semplice)"""
+    name = path.lower()
+    if name == '-':
+        return 'zst' if zstandard is not None else 'gz'
+    if name.endswith(('.tar.zst', '.tzst', '.zst')):
+        return 'zst'
+    if name.endswith(('.tar.gz', '.tgz', '.gz')):
+        return 'gz'
+    return ''
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise BundleError('bundle .tar.zst: installa il pacchetto zstandard (pip install zstandard) '
+                          'oppure usa un bundle .tar.gz')
+
+
+def _safe_member_path(name: str) -> Optional[str]:
+    """Path relativo al target di un membro files/..., None se il nome non è ammesso"""
+    path = PurePosixPath(name)
+    if path.is_absolute() or '..' in path.parts or path.parts[:1] != (BUNDLE_FILES,):
+        return None
+    return PurePosixPath(*path.parts[1:]).as_posix() if len(path.parts) > 1 else ''
+
+
+def write_bundle(output: str, operations, target_root: Path, phases: List[str], source_name: str,
+                 on_operation: Optional[Callable[[object, int], None]] = None,
+                 base: Optional[BundleIndex] = None) -> BundleIndex:
+    """
+    Scrive in streaming le operazioni del piano (kind/source/target/phase/step/backup)
+    nel bundle output ('-' = stdout). I path nel bundle sono relativi a target_root.
+    Con base il bundle è un delta: solo i file cambiati rispetto alla release base.
+    on_operation(op, file) viene chiamato al termine di ogni operazione.
+    Returns: l'indice scritto in coda al bundle
+    """
+    compression = bundle_compression(output)
+    if compression == 'zst':
+        _require_zstandard()
+
+    index = BundleIndex(phases=list(phases), created=datetime.now().isoformat(timespec='seconds'),
+                        source=source_name)
+    # Stato completo del sorgente dopo questo bundle (id della nuova release)
+    current: Dict[str, Dict] = {}
+    tmp_path = None
+    if output == '-':
+        raw = sys.__stdout__.buffer
+    else:
+        # Scrittura su un temporaneo: un bundle interrotto non sembra mai completo
+        tmp_path = Path(output + '.tmp')
+        raw = open(tmp_path, 'wb')
+
+    try:
+        if compression == 'zst':
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+            stream = compressor.stream_writer(raw, closefd=False)
+            tar = tarfile.open(fileobj=stream, mode='w|')
+        else:
+            stream = None
+            tar = tarfile.open(fileobj=raw, mode=f'w|{compression}')
+
+        with tar:
+            for op in operations:
+                key = op.target.relative_to(target_root).as_posix()
+                index.operations.append(BundleOperation(op.kind, key, op.phase, op.step, op.backup))
+                if op.kind == 'tree':
+                    dirs, files = scan_tree(op.source)
+                    if base is None:
+                        _add_directory(tar, op.source, key)
+                        for rel in dirs:
+                            _add_directory(tar, op.source / rel, f'{key}/{rel.as_posix()}')
+                    members = [(op.source / rel, f'{key}/{rel.as_posix()}', st) for rel, st in files]
+                else:
+                    members = [(op.source, key, op.source.stat())]
+                added = 0
+                for source, rel, st in members:
+                    unchanged = _unchanged_entry(base, source, rel, st) if base is not None else None
+                    if unchanged is not None:
+                        current[rel] = unchanged
+                        continue
+                    current[rel] = index.files[rel] = _add_file(tar, source, rel, st)
+                    added += 1
+                if on_operation is not None:
+                    on_operation(op, added)
+
+            index.release = release_id(current)
+            if base is not None:
+                index.base = base.release
+                index.deleted = sorted(set(base.files) - set(current))
+
+            data = json.dumps(index.to_json(), indent=1, sort_keys=True).encode('utf-8')
+            info = tarfile.TarInfo(BUNDLE_INDEX)
+            info.size = len(data)
+            info.mtime = int(datetime.now().timestamp())
+            tar.addfile(info, io.BytesIO(data))
+
+        if stream is not None:
+            stream.close()
+        raw.flush()
+    except BaseException:
+        if tmp_path is not None:
+            raw.close()
+            tmp_path.unlink(missing_ok=True)
+        raise
+
+    if tmp_path is not None:
+        raw.close()
+        os.replace(tmp_path, output)
+    return index
+
+
+def _unchanged_entry(base: BundleIndex, source: Path, key: str, st: os.stat_result) -> Optional[Dict]:
+    """Voce della release base se il file non è cambiato (stat, poi hash solo se serve)"""
+    entry = base.files.get(key)
+    if entry is None or entry['size'] != st.st_size:
+        return None
+    if entry['mtime_ns'] == st.st_mtime_ns or entry['sha256'] == file_sha256(source):
+        return entry
+    return None
+
+
+def _add_directory(tar: tarfile.TarFile, path: Path, key: str) -> None:
+    info = tarfile.TarInfo(f'{BUNDLE_FILES}/{key}')
+    info.type = tarfile.DIRTYPE
+    info.mode = 0o755
+    info.mtime = int(path.stat().st_mtime)
+    tar.addfile(info)
+
+
+def _add_file(tar: tarfile.TarFile, source: Path, key: str, st: os.stat_result) -> Dict:
+    info = tarfile.TarInfo(f'{BUNDLE_FILES}/{key}')
+    info.size = st.st_size
+    info.mode = st.st_mode & 0o777
+    info.mtime = int(st.st_mtime)
+    with open(source, 'rb') as f:
+        reader = _HashingReader(f)
+        tar.addfile(info, reader)
+    return {'sha256': reader.digest.hexdigest(), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _open_input(path: str) -> BinaryIO:
+    if path == '-':
+        return sys.__stdin__.buffer
+    return open(path, 'rb', buffering=HASH_CHUNK_SIZE)
+
+
+def extract_bundle(path: str, extract_root: Path) -> BundleIndex:
+    """
+    Estrae in streaming il bundle path ('-' = stdin) in extract_root e verifica
+    ogni file con bundle.json. In caso di errore extract_root viene rimossa.
+    Returns: l'indice del bundle (i file sono in extract_root/files)
+    """
+    shutil.rmtree(extract_root, ignore_errors=True)
+    extract_root.mkdir(parents=True)
+    raw = _open_input(path)
+    try:
+        magic = raw.peek(4)[:4]
+        if magic.startswith(ZSTD_MAGIC):
+            _require_zstandard()
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+            tar = tarfile.open(fileobj=stream, mode='r|')
+        else:
+            tar = tarfile.open(fileobj=raw, mode='r|gz' if magic.startswith(GZIP_MAGIC) else 'r|')
+
+        digests: Dict[str, Dict] = {}
+        index = None
+        with tar:
+            for member in tar:
+                if member.name == BUNDLE_INDEX:
+                    index = BundleIndex.from_json(json.loads(tar.extractfile(member).read().decode('utf-8')))
+                    continue
+                key = _safe_member_path(member.name)
+                if key is None or not (member.isfile() or member.isdir()):
+                    raise BundleError(f'membro non ammesso nel bundle: {member.name}')
+                destination = extract_root / BUNDLE_FILES / key
+                if member.isdir():
+                    destination.mkdir(parents=True, exist_ok=True)
+                    continue
+                digests[key] = _extract_file(tar, member, destination)
+    except (tarfile.TarError, EOFError, OSError) as e:
+        shutil.rmtree(extract_root, ignore_errors=True)
+        raise BundleError(f'bundle illeggibile: {e}') from e
+    except BaseException:
+        shutil.rmtree(extract_root, ignore_errors=True)
+        raise
+    finally:
+        if raw is not sys.__stdin__.buffer:
+            raw.close()
+
+    problems = _check_index(index, digests)
+    if problems:
+        shutil.rmtree(extract_root, ignore_errors=True)
+        raise BundleError('; '.join(problems[:5]) + (f' (e altri {len(problems) - 5})' if len(problems) > 5 else ''))
+
+    # mtime del sorgente, come copy2: manifest e --resume restano coerenti
+    for key, entry in index.files.items():
+        os.utime(extract_root / BUNDLE_FILES / key, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    return index
+
+
+def _extract_file(tar: tarfile.TarFile, member: tarfile.TarInfo, destination: Path) -> Dict:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    source = tar.extractfile(member)
+    with open(destination, 'wb') as f:
+        while True:
+            chunk = source.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    os.chmod(destination, member.mode & 0o777 or 0o644)
+    return {'sha256': digest.hexdigest(), 'size': size}
+
+
+def _check_index(index: Optional[BundleIndex], digests: Dict[str, Dict]) -> List[str]:
+    """Confronta i file estratti con bundle.json. Returns: i problemi trovati"""
+    if index is None:
+        return [f'{BUNDLE_INDEX} mancante: bundle incompleto o troncato']
+    problems = []
+    for key, entry in sorted(index.files.items()):
+        extracted = digests.get(key)
+        if extracted is None:
+            problems.append(f'{key}: file mancante nel bundle')
+        elif extracted['size'] != entry['size']:
+            problems.append(f'{key}: dimensione {extracted["size"]} byte invece di {entry["size"]}')
+        elif extracted['sha256'] != entry['sha256']:
+            problems.append(f'{key}: contenuto diverso (hash SHA-256)')
+    for key in sorted(set(digests) - set(index.files)):
+        problems.append(f'{key}: file non elencato in {BUNDLE_INDEX}')
+    return problems
+
+
+def bundle_extract_root(target_root: Path) -> Path:
+    """Cartella di estrazione nel target (stesso filesystem: i file vengono poi collegati con hardlink)"""
+    return target_root / MANIFEST_DIR / BUNDLE_DIR
+
+
+@dataclass
+class DeltaResult:
+    """Esito dell'applicazione di un bundle delta"""
+    written: int = 0
+    bytes_written: int = 0
+    deleted: int = 0
+    backups: int = 0
+    files: Dict[str, Dict] = field(default_factory=dict)
+
+
+def apply_delta(index: BundleIndex, extract_root: Path, target_root: Path,
+                backups: BackupStore) -> DeltaResult:
+    """
+    Applica un bundle delta già estratto e verificato in extract_root.
+    Tutto o niente: i file sostituiti o eliminati vengono spostati in
+    extract_root/undo e ripristinati se un'operazione fallisce.
+    Returns: l'esito, con l'elenco completo dei file della nuova release
+    """
+    release = load_release(target_root)
+    if release.release != index.base:
+        raise BundleError('il target non è sulla release base del delta '
+                          f'({release.release[:12]} invece di {index.base[:12]}): serve un bundle completo')
+
+    conflicts = _check_base(release, index, target_root)
+    if conflicts:
+        raise BundleError('file modificati nel target dopo l\'ultima release: ' + ', '.join(conflicts[:5])
+                          + (f' (e altri {len(conflicts) - 5})' if len(conflicts) > 5 else ''))
+
+    result = DeltaResult()
+    result.files = {key: entry for key, entry in release.files.items() if key not in index.deleted}
+    result.files.update(index.files)
+    if release_id(result.files) != index.release:
+        raise BundleError('la release risultante non coincide con quella del bundle')
+
+    backup_keys = release.backup_keys() | index.backup_keys()
+    undo_root = extract_root / UNDO_DIR
+    # (path nel target, path spostato da parte o None, nuovo file messo al suo posto)
+    done: List[Tuple[Path, Optional[Path], bool]] = []
+    try:
+        for key in list(index.files) + index.deleted:
+            target = target_root / key
+            moved = None
+            if target.exists():
+                if key in backup_keys and backups.add(key, target):
+                    result.backups += 1
+                moved = undo_root / key
+                moved.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(target, moved)
+            done.append((target, moved, False))
+            if key in index.files:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(extract_root / BUNDLE_FILES / key, target)
+                done[-1] = (target, moved, True)
+    except BaseException:
+        for target, moved, placed in reversed(done):
+            if placed:
+                target.unlink(missing_ok=True)
+            if moved is not None:
+                os.rename(moved, target)
+        raise
+
+    result.written = len(index.files)
+    result.bytes_written = index.bytes
+    for key in index.deleted:
+        _remove_empty_parents(target_root / key, target_root)
+        result.deleted += 1
+
+    # Manifest delle migrazioni incrementali: allineato ai file sostituiti ed eliminati
+    manifest = SyncManifest(target_root)
+    if manifest.path.exists():
+        manifest.load()
+        for key, entry in index.files.items():
+            manifest.record(key, entry['sha256'], entry['size'], entry['mtime_ns'])
+        for key in index.deleted:
+            manifest.forget(key)
+        manifest.save()
+    return result
+
+
+def _check_base(release: BundleIndex, index: BundleIndex, target_root: Path) -> List[str]:
+    """File toccati dal delta che nel target non corrispondono più alla release base"""
+    conflicts = []
+    for key in list(index.files) + index.deleted:
+        entry = release.files.get(key)
+        if entry is None:
+            continue
+        target = target_root / key
+        try:
+            st = target.stat()
+        except FileNotFoundError:
+            if key not in index.deleted:
+                conflicts.append(f'{key} (mancante)')
+            continue
+        if st.st_size != entry['size'] or (st.st_mtime_ns != entry['mtime_ns']
+                                           and file_sha256(target) != entry['sha256']):
+            conflicts.append(key)
+    return conflicts
+
+
+def _remove_empty_parents(path: Path, root: Path) -> None:
+    """Rimuove le cartelle rimaste vuote dopo un'eliminazione, fino a root esclusa"""
+    for folder in path.parents:
+        if folder == root or root not in folder.parents:
+            return
+        try:
+            folder.rmdir()
+        except OSError:
+            return
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+====================================
+Cache dei metadati JSON
+====================================
+package.json, package-lock.json, schema.json e components vengono letti
+da validazione, verifica dipendenze e diff degli schema a ogni esecuzione.
+Il contenuto già interpretato viene conservato in un file binario (pickle)
+nel progetto sorgente, .migrazione/metadata.cache, indicizzato per path:
+- se dimensione e mtime del file sono quelli registrati si usa la copia
+  in cache senza leggere il file;
+- se cambiano (checkout git, copia che non preserva l'mtime) si rilegge il
+  file ma si ricalcola il JSON solo se l'hash del contenuto è diverso.
+
+Su dischi lenti (Windows, share di rete, migrazione.exe) le esecuzioni
+successive partono senza rileggere centinaia di file JSON. Una cache
+illeggibile o di un'altra versione viene semplicemente ignorata.
+
+Solo i file del progetto sorgente passano dalla cache (i file del target,
+es. package-lock.json, vengono letti direttamente), le voci dei file
+eliminati vengono scartate al salvataggio e read_json restituisce sempre
+una copia: modificarla non altera la cache.
+====================================
+"""
+
+import atexit
+import copy
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CACHE_DIR = '.migrazione'
+CACHE_FILE = 'metadata.cache'
+CACHE_VERSION = 2
+
+
+class MetadataCache:
+    """Contenuto JSON interpretato dei file, valido finché dimensione/mtime (o hash) non cambiano"""
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = os.path.abspath(root)
+        # Chiave: path relativo alla root del sorgente
+        self.entries: Dict[str, tuple] = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception:
+            # Cache mancante, troncata o scritta da un'altra versione
+            return
+        if isinstance(data, dict) and data.get('version') == CACHE_VERSION:
+            self.entries = data.get('entries', {})
+
+    def save(self) -> None:
+        with self._lock:
+            stale = [key for key in self.entries if not os.path.exists(os.path.join(self.root, key))]
+            for key in stale:
+                del self.entries[key]
+            if not self.dirty and not stale:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix('.tmp')
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+                self.dirty = False
+            except OSError:
+                # Progetto sorgente in sola lettura: si lavora senza cache persistente
+                pass
+
+    def key(self, path: Path) -> Optional[str]:
+        """Chiave di path nella cache, None se è fuori dal progetto sorgente"""
+        full = os.path.abspath(path)
+        try:
+            if os.path.commonpath([self.root, full]) != self.root:
+                return None
+        except ValueError:
+            # Dischi diversi su Windows
+            return None
+        return os.path.relpath(full, self.root).replace(os.sep, '/')
+
+    def read_json(self, path: Path) -> Any:
+        """Come json.load sul file (stesse eccezioni), servito dalla cache se possibile"""
+        key = self.key(path)
+        if key is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        full = os.path.join(self.root, key)
+        st = os.stat(full)
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            self.hits += 1
+            return copy.deepcopy(entry[3])
+
+        with open(full, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        if entry is not None and entry[2] == digest:
+            self.hits += 1
+            data = entry[3]
+        else:
+            self.misses += 1
+            data = json.loads(raw.decode('utf-8'))
+        with self._lock:
+            self.entries[key] = (st.st_size, st.st_mtime_ns, digest, data)
+            self.dirty = True
+        return copy.deepcopy(data)
+
+
+_cache: Optional[MetadataCache] = None
+
+
+def open_cache(project_root: Path) -> MetadataCache:
+    """Attiva la cache del progetto sorgente (salvata automaticamente all'uscita)"""
+    global _cache
+    if _cache is None or _cache.path != project_root / CACHE_DIR / CACHE_FILE:
+        _cache = MetadataCache(project_root / CACHE_DIR / CACHE_FILE, project_root)
+        _cache.load()
+        atexit.register(_cache.save)
+    return _cache
+
+
+def read_json(path: Path) -> Any:
+    """Legge un file JSON passando dalla cache, se attiva"""
+    if _cache is not None:
+        return _cache.read_json(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+====================================
+Funzioni comuni agli script di migrazione
+====================================
+Output colorato, validazione dei progetti e copie con stampa degli esiti,
+condivisi da migrazione.py, migrazione_fase1/2/3.py e migrazione_piano.py.
+Le operazioni su disco sono delegate a migrazione_copia.CopyEngine.
+====================================
+"""
+
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+from migrazione_cache import open_cache, read_json
+from migrazione_copia import CopyEngine, VerifyResult, active_ignore, format_size, open_ignore
+
+# Colori per output
+class Colors:
+    CYAN = '\033[96m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    GRAY = '\033[90m'
+    WHITE = '\033[97m'
+    RESET = '\033[0m'
+    BOLD = '\033[1m'
+
+if sys.platform == 'win32':
+    try:
+        import colorama
+        colorama.init()
+    except ImportError:
+        Colors.CYAN = Colors.GREEN = Colors.YELLOW = ''
+        Colors.RED = Colors.GRAY = Colors.WHITE = Colors.RESET = Colors.BOLD = ''
+
+
+def print_header(text: str, color=Colors.CYAN):
+    print(f"{color}{'=' * 60}{Colors.RESET}")
+    print(f"{color}  {text}{Colors.RESET}")
+    print(f"{color}{'=' * 60}{Colors.RESET}")
+    print()
+
+
+def print_step(step: str, total: int, current: int, text: str):
+    print(f"{Colors.CYAN}[{current}/{total}] {text}...{Colors.RESET}")
+
+
+def print_success(text: str, indent: str = '   '):
+    print(f"{indent}{Colors.GREEN}✓ {text}{Colors.RESET}")
+
+
+def print_error(text: str, indent: str = '   '):
+    print(f"{indent}{Colors.RED}✗ {text}{Colors.RESET}")
+
+
+def print_warning(text: str, indent: str = '   '):
+    print(f"{indent}{Colors.YELLOW}⚠ {text}{Colors.RESET}")
+
+
+def print_info(text: str, indent: str = '   '):
+    print(f"{indent}{Colors.WHITE}ℹ {text}{Colors.RESET}")
+
+
+def print_detail(text: str, indent: str = '        '):
+    print(f"{indent}{Colors.GRAY}• {text}{Colors.RESET}")
+
+
+def validate_paths(target_path: str, total_steps: int) -> Tuple[Path, Path]:
+    """Valida i percorsi sorgente e target"""
+    print_step('Validazione percorsi', total_steps, 1, 'Validazione percorsi')
+    source_path = validate_source()
+    target = validate_target(target_path)
+    if target == source_path.resolve():
+        print_error('Il progetto sorgente e target sono lo stesso!')
+        print_info('Non puoi migrare un progetto su se stesso')
+        sys.exit(1)
+    print()
+    return source_path, target
+
+
+def validate_source() -> Path:
+    """Verifica che la directory corrente sia il progetto Strapi sorgente"""
+    source_path = Path.cwd()
+    open_cache(source_path)
+
+    # Verifica package.json sorgente
+    source_package = source_path / 'package.json'
+    if not source_package.exists():
+        print_error('File package.json non trovato nella directory corrente')
+        print_info('Esegui questo script dalla ROOT del progetto Strapi sorgente')
+        sys.exit(1)
+
+    # Verifica che sia un progetto Strapi
+    pkg_data = read_json(source_package)
+    if '@strapi/strapi' not in pkg_data.get('dependencies', {}):
+        print_error('La directory corrente non sembra essere un progetto Strapi')
+        sys.exit(1)
+
+    print_success(f'Progetto sorgente: {source_path.name}')
+    rules = open_ignore(source_path)
+    print_detail(f'Esclusioni: {rules.origin} ({len(rules)} regole)')
+    return source_path
+
+
+def validate_target(target_path: str) -> Path:
+    """Verifica che target_path sia un progetto Strapi"""
+    target = Path(target_path).resolve()
+    target_package = target / 'package.json'
+
+    if not target_package.exists():
+        print_error(f'File package.json non trovato in: {target}')
+        sys.exit(1)
+
+    pkg_data = read_json(target_package)
+    if '@strapi/strapi' not in pkg_data.get('dependencies', {}):
+        print_error('Il progetto target non sembra essere un progetto Strapi')
+        sys.exit(1)
+
+    print_success(f'Progetto target: {target.name}')
+    return target
+
+
+def copy_file(source: Path, target: Path, description: str, engine: CopyEngine,
+              create_backup: bool = True) -> Tuple[int, bool]:
+    """Copia un singolo file"""
+    if not create_backup:
+        return copy_files([(source, target, description)], engine)[0]
+
+    try:
+        if not source.exists():
+            print_warning(f'{description} non trovato - skip')
+            return 0, False
+
+        if engine.is_unchanged(source, target):
+            print_success(f'{description} (invariato)')
+            return 1, True
+
+        if target.exists():
+            archive = engine.backup(target)
+            print_info(f'Backup: {archive.name}')
+
+        engine.copy_file(source, target)
+        print_success(f'{description}')
+        return 1, True
+
+    except Exception as e:
+        print_error(f'{description}: {e}')
+        return 0, False
+
+
+def copy_files(items: List[Tuple[Path, Path, str]], engine: CopyEngine) -> List[Tuple[int, bool]]:
+    """Copia più file in parallelo (--jobs, senza backup), stampando gli esiti in ordine"""
+    results = []
+    outcomes = engine.copy_files([(source, target) for source, target, _ in items if source.exists()])
+
+    for source, target, description in items:
+        if not source.exists():
+            print_warning(f'{description} non trovato - skip')
+            results.append((0, False))
+            continue
+
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            print_error(f'{description}: {outcome}')
+            results.append((0, False))
+        elif not outcome:
+            print_success(f'{description} (invariato)')
+            results.append((1, True))
+        else:
+            print_success(f'{description}')
+            results.append((1, True))
+
+    return results
+
+
+def copy_directory(source: Path, target: Path, description: str, engine: CopyEngine) -> Tuple[int, bool]:
+    """Copia ricorsivamente una directory"""
+    return copy_directories([(source, target, description)], engine)[0]
+
+
+def copy_directories(items: List[Tuple[Path, Path, str]], engine: CopyEngine) -> List[Tuple[int, bool]]:
+    """Copia più directory in parallelo (--jobs), stampando gli esiti in ordine"""
+    results = []
+    outcomes = engine.copy_trees([(source, target) for source, target, _ in items if source.exists()])
+
+    for source, target, description in items:
+        if not source.exists():
+            print_warning(f'{description} non trovato - skip')
+            results.append((0, False))
+            continue
+
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            print_error(f'{description}: {outcome}')
+            results.append((0, False))
+        elif outcome.resumed:
+            print_success(f'{description} ({outcome.files} files, già completata)')
+            results.append((outcome.files, True))
+        elif engine.incremental:
+            print_success(f'{description} ({outcome.files} files, {outcome.copied} aggiornati, {outcome.removed} rimossi)')
+            results.append((outcome.files, True))
+        else:
+            print_success(f'{description} ({outcome.files} files)')
+            results.append((outcome.files, True))
+
+    return results
+
+
+def print_ignored() -> None:
+    """Riepilogo dei path esclusi da .migrationignore durante le scansioni"""
+    rules = active_ignore()
+    if rules is None or not rules.excluded:
+        return
+    files, size, dirs = rules.totals()
+    print_success(f'Esclusi ({rules.origin}): {dirs} cartelle non visitate, '
+                  f'{files} file ({format_size(size)})')
+    for rel in rules.pruned():
+        print_detail(f'{rel}/')
+
+
+def verify_copies(engine: CopyEngine) -> VerifyResult:
+    """Verifica di integrità (--verify): stampa l'esito e le differenze trovate"""
+    print_info('Verifica integrità dei file copiati...')
+    result = engine.verify()
+    if result.ok:
+        print_success(f'Verifica integrità: {result.checked} file OK ({format_size(result.bytes_read)} letti)')
+    else:
+        print_error(f'Verifica integrità: {len(result.mismatches)} file su {result.checked} non corrispondono')
+        for key, problem in result.mismatches:
+            print_detail(f'{key}: {problem}')
+    print()
+    return result
@@ -0,0 +1,1110 @@
+#!/usr/bin/env python3
+"""
+====================================
+Motore di copia condiviso
+====================================
+Logica di copia file/directory usata da migrazione.py e dagli script
+migrazione_fase1/2/3.py. Gli script gestiscono l'output colorato, il
+motore si occupa solo delle operazioni su disco.
+
+MODALITÀ:
+- Completa (default): la directory target viene sostituita
+  (rmtree + copytree), come nelle versioni precedenti degli script.
+- Incrementale (--incremental): copia solo i file nuovi o modificati.
+  Nel target viene mantenuto un manifest (.migrazione/manifest.json)
+  con hash SHA-256, dimensione e mtime di ogni file migrato.
+
+PARALLELISMO (--jobs N):
+Le copie delle directory e dei singoli file vengono eseguite su due
+thread pool limitati a N worker (uno per le directory, uno per i file,
+così i task di directory possono attendere i propri file senza deadlock).
+Gli esiti vengono restituiti sempre nell'ordine delle richieste.
+
+STAGING (--staged):
+Invece di rmtree + copia sul target "live", ogni directory viene copiata
+in .migrazione/staging (stesso filesystem) e poi scambiata con il target
+tramite due rename: chi osserva il progetto (Strapi in develop, restart
+del container) non vede mai cartelle popolate a metà. In modalità
+incrementale ogni file viene scritto in un temporaneo e sostituito con
+os.replace.
+
+COPIA VELOCE:
+Se sorgente e target sono sullo stesso filesystem i file vengono clonati
+con reflink (FICLONE, btrfs/XFS) o os.copy_file_range (copia lato
+kernel/server), con fallback alla copia standard. Con --hardlink i file
+del target diventano hardlink del sorgente: solo per mirror in sola
+lettura, perché modificare il target modifica anche il sorgente.
+
+RIPRESA (--resume):
+Ogni operazione completata (una directory o un singolo file) viene
+aggiunta al journal .migrazione/journal.jsonl nel target, una riga JSON
+scritta e sincronizzata su disco subito; le firme (path, dimensione,
+mtime) vengono dalla scansione già fatta per la copia. Se l'esecuzione
+viene interrotta (Ctrl-C, errore di copia) il journal resta: rilanciando
+con --resume le operazioni già nel journal vengono saltate se le firme di
+sorgente e target sono ancora quelle registrate; le altre vengono
+rieseguite. Il journal viene eliminato solo a fine esecuzione senza
+errori (CopyEngine.complete).
+
+BACKUP:
+Prima di sovrascrivere un file con backup (src/index.ts, config/*.ts) il
+contenuto attuale viene salvato in .migrazione/backups/backup-<timestamp>/:
+i contenuti sono deduplicati per hash (objects/<sha256>) e index.json
+elenca path, hash e timestamp di ogni snapshot. Ogni backup è scritto su
+disco prima che il file venga sovrascritto; a fine esecuzione la cartella
+viene compressa in backup-<timestamp>.tar.gz (un'esecuzione interrotta
+lascia la cartella, già utilizzabile). I file identici al sorgente non
+vengono né salvati né riscritti. Si conservano gli ultimi N backup
+(--backup-keep, default 5).
+
+VERIFICA (--verify):
+Dopo la copia ogni file dell'inventario viene confrontato con il target:
+dimensione, poi hash SHA-256. L'hash del sorgente è quello calcolato
+durante la copia (con --verify la copia legge il sorgente una volta sola
+per copiare e calcolare l'hash), quindi si rilegge solo il target. Gli
+hash sono calcolati in parallelo sul thread pool dei file, a blocchi
+(memoria limitata) e con mmap per i file grandi.
+
+ESCLUSIONI (.migrationignore):
+Ogni scansione sotto la root del progetto sorgente applica le regole di
+.migrationignore (sintassi .gitignore; se il file manca si usano
+DEFAULT_IGNORE: node_modules, dist, build, .cache, .strapi, *.backup).
+Le cartelle escluse non vengono visitate, quindi non entrano né nella
+copia né nelle firme del journal, nei dry-run e nei bundle. Path esclusi
+e byte dei file esclusi sono raccolti per il riepilogo.
+
+INVENTARIO:
+Ogni directory viene visitata una sola volta con os.scandir. Conteggi,
+byte ed esito di ogni file (FileRecord) vengono raccolti durante la
+copia e accumulati in CopyEngine.inventory, così riepilogo, manifest e
+verifiche successive non devono rileggere il target.
+====================================
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar, Union
+
+# fcntl non esiste su Windows: niente reflink, si usa la copia standard
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+T = TypeVar('T')
+
+MANIFEST_DIR = '.migrazione'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+STAGING_DIR = 'staging'
+JOURNAL_FILE = 'journal.jsonl'
+JOURNAL_VERSION = 1
+BACKUP_DIR = 'backups'
+DEFAULT_BACKUP_KEEP = 5
+HASH_CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 32 * 1024 * 1024
+DEFAULT_JOBS = 8
+FICLONE = 0x40049409  # ioctl da linux/fs.h
+IGNORE_FILE = '.migrationignore'
+# Usate se il progetto sorgente non ha un .migrationignore
+DEFAULT_IGNORE = [
+    'node_modules/',
+    'dist/',
+    'build/',
+    '.cache/',
+    '.strapi/',
+    '.tmp/',
+    '*.backup',
+]
+
+
+def file_sha256(path: Path) -> str:
+    """
+    Calcola l'hash SHA-256 di un file leggendolo a blocchi.
+    I file grandi vengono mappati in memoria (mmap): niente copie nei buffer
+    Python, le pagine restano nella cache del sistema operativo.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, HASH_CHUNK_SIZE):
+                        digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+        else:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_with_sha256(source: Path, target: Path) -> str:
+    """Copia un file (come shutil.copy2) calcolandone l'hash nella stessa lettura"""
+    digest = hashlib.sha256()
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    shutil.copystat(source, target)
+    return digest.hexdigest()
+
+
+def clone_file(source: Path, target: Path) -> str:
+    """
+    Copia un file sullo stesso filesystem con il metodo più rapido disponibile:
+    reflink (FICLONE), os.copy_file_range, copia standard. Preserva i metadati come copy2.
+    Returns: il metodo usato ('reflink', 'copy_file_range' o 'copy')
+    """
+    method = 'copy'
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                method = 'reflink'
+            except OSError:
+                pass
+
+        if method == 'copy' and hasattr(os, 'copy_file_range'):
+            try:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    method = 'copy_file_range'
+            except OSError:
+                pass
+
+        if method == 'copy':
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst, HASH_CHUNK_SIZE)
+    shutil.copystat(source, target)
+    return method
+
+
+def compile_glob(pattern: str) -> re.Pattern:
+    """
+    Converte un glob su path posix in regex.
+    '*' e '?' non attraversano '/', '**' corrisponde a qualsiasi numero di cartelle.
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex += f'[{chars}]'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + r'\Z')
+
+
+def format_size(size: int) -> str:
+    """Formatta una dimensione in byte (es: 1.5 MB)"""
+    value = float(size)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f'{value:.0f} {unit}' if unit == 'B' else f'{value:.1f} {unit}'
+        value /= 1024
+    return f'{value:.1f} GB'
+
+
+class IgnoreRules:
+    """
+    Regole di esclusione in sintassi .gitignore, relative alla root del
+    progetto sorgente: commenti (#), negazione (!), '/' finale per le sole
+    cartelle, pattern con '/' ancorati alla root, gli altri validi a
+    qualsiasi profondità. Come in git, un file dentro una cartella esclusa
+    non può essere reincluso: la cartella non viene nemmeno visitata.
+    """
+
+    def __init__(self, root: Path, patterns: List[str], origin: str):
+        self.root = root
+        self.origin = origin
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []
+        # path relativo → byte (None per le cartelle non visitate)
+        self.excluded: Dict[str, Optional[int]] = {}
+        self._lock = threading.Lock()
+        for line in patterns:
+            self._add(line)
+
+    def _add(self, line: str) -> None:
+        line = line.rstrip('\n\r')
+        if line.endswith(' ') and not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            return
+        negate = line.startswith('!')
+        if negate or line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/').replace('\\', '')
+        if not line:
+            return
+        if '/' in line:
+            pattern = compile_glob(line.lstrip('/'))
+        else:
+            pattern = compile_glob('**/' + line)
+        self.rules.append((pattern, negate, dir_only))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def relative(self, path: Path) -> Optional[str]:
+        """Path relativo alla root del sorgente ('' per la root), None se fuori dal sorgente"""
+        try:
+            rel = path.relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+        return '' if rel == '.' else rel
+
+    def match(self, rel: str, is_dir: bool) -> bool:
+        """True se rel (relativo alla root) è escluso; vince l'ultima regola che corrisponde"""
+        ignored = False
+        for pattern, negate, dir_only in self.rules:
+            if (is_dir or not dir_only) and pattern.match(rel):
+                ignored = not negate
+        return ignored
+
+    def is_ignored(self, path: Path) -> bool:
+        """True se path o una delle sue cartelle (sotto la root del sorgente) è escluso"""
+        rel = self.relative(path)
+        if not rel or not self.rules:
+            return False
+        parts = rel.split('/')
+        for i in range(1, len(parts)):
+            if self.match('/'.join(parts[:i]), True):
+                return True
+        return self.match(rel, path.is_dir())
+
+    def record(self, rel: str, size: Optional[int]) -> None:
+        with self._lock:
+            self.excluded[rel] = size
+
+    def totals(self) -> Tuple[int, int, int]:
+        """Returns: (file esclusi, byte dei file esclusi, cartelle non visitate)"""
+        with self._lock:
+            sizes = list(self.excluded.values())
+        files = [size for size in sizes if size is not None]
+        return len(files), sum(files), len(sizes) - len(files)
+
+    def pruned(self) -> List[str]:
+        """Cartelle escluse (non visitate), ordinate"""
+        with self._lock:
+            return sorted(rel for rel, size in self.excluded.items() if size is None)
+
+
+_ignore: Optional[IgnoreRules] = None
+
+
+def open_ignore(project_root: Path) -> IgnoreRules:
+    """
+    Attiva le regole di esclusione del progetto sorgente: .migrationignore
+    nella root, oppure DEFAULT_IGNORE se il file non esiste. Da quel momento
+    ogni scansione sotto project_root (copie, piani, bundle) le applica.
+    """
+    global _ignore
+    ignore_path = project_root / IGNORE_FILE
+    if _ignore is None or _ignore.root != project_root:
+        try:
+            with open(ignore_path, 'r', encoding='utf-8') as f:
+                _ignore = IgnoreRules(project_root, f.read().splitlines(), IGNORE_FILE)
+        except FileNotFoundError:
+            _ignore = IgnoreRules(project_root, DEFAULT_IGNORE, 'regole predefinite')
+    return _ignore
+
+
+def active_ignore() -> Optional[IgnoreRules]:
+    """Regole di esclusione attive (None se nessuno script le ha caricate)"""
+    return _ignore
+
+
+def is_ignored(path: Path) -> bool:
+    """True se path è escluso dalle regole attive (registrandolo nel riepilogo)"""
+    if _ignore is None or not _ignore.is_ignored(path):
+        return False
+    try:
+        size = None if path.is_dir() else path.stat().st_size
+    except OSError:
+        size = 0
+    _ignore.record(_ignore.relative(path), size)
+    return True
+
+
+def scan_tree(root: Path) -> Tuple[List[Path], List[Tuple[Path, os.stat_result]]]:
+    """
+    Visita ricorsivamente root con os.scandir (una sola stat per file).
+    Sotto la root del sorgente applica le regole di esclusione attive: le
+    cartelle escluse non vengono visitate.
+    Returns: (directory, [(file, stat)]) con path relativi a root, ordinati
+    """
+    dirs: List[Path] = []
+    files: List[Tuple[Path, os.stat_result]] = []
+    rules = _ignore if _ignore is not None and len(_ignore) else None
+    prefix = rules.relative(root) if rules is not None else None
+    if prefix:
+        prefix += '/'
+    stack = [Path()]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(root / rel_dir) as entries:
+            for entry in entries:
+                rel = rel_dir / entry.name
+                if entry.is_dir():
+                    if prefix is not None and rules.match(prefix + rel.as_posix(), True):
+                        rules.record(prefix + rel.as_posix(), None)
+                        continue
+                    dirs.append(rel)
+                    stack.append(rel)
+                elif entry.is_file():
+                    st = entry.stat()
+                    if prefix is not None and rules.match(prefix + rel.as_posix(), False):
+                        rules.record(prefix + rel.as_posix(), st.st_size)
+                        continue
+                    files.append((rel, st))
+    dirs.sort()
+    files.sort(key=lambda item: item[0])
+    return dirs, files
+
+
+def tree_signature(root: Path) -> str:
+    """Firma stat-only di una directory: path relativi, dimensioni e mtime di tutti i file"""
+    _, files = scan_tree(root)
+    return stat_signature((rel, st.st_size, st.st_mtime_ns) for rel, st in files)
+
+
+def stat_signature(files: Iterable[Tuple[Path, int, int]]) -> str:
+    """Firma di tree_signature da (path relativo, dimensione, mtime) già noti, ordinati per path"""
+    digest = hashlib.sha256()
+    for rel, size, mtime_ns in files:
+        digest.update(f'{rel.as_posix()}\0{size}\0{mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def file_signature(path: Path) -> str:
+    """Firma stat-only di un singolo file"""
+    st = path.stat()
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+
+@dataclass
+class FileRecord:
+    """Esito della copia di un singolo file"""
+    source: Path
+    target: Path
+    size: int
+    mtime_ns: int
+    copied: bool = False
+    sha256: Optional[str] = None
+    method: str = ''
+    # mtime del file scritto nel target, per la firma del journal
+    target_mtime_ns: Optional[int] = None
+
+
+@dataclass
+class CopyResult:
+    """Esito della copia di una directory"""
+    files: int = 0
+    copied: int = 0
+    skipped: int = 0
+    removed: int = 0
+    bytes: int = 0
+    bytes_copied: int = 0
+    resumed: bool = False
+    records: List[FileRecord] = field(default_factory=list)
+
+    def add(self, record: FileRecord) -> None:
+        self.records.append(record)
+        self.files += 1
+        self.bytes += record.size
+        if record.copied:
+            self.copied += 1
+            self.bytes_copied += record.size
+        else:
+            self.skipped += 1
+
+
+@dataclass
+class VerifyResult:
+    """Esito della verifica di integrità del target"""
+    checked: int = 0
+    bytes_read: int = 0
+    mismatches: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches
+
+
+class SyncManifest:
+    """
+    Manifest dei file migrati, salvato nel progetto target.
+    Le chiavi sono i path relativi alla root del target (formato posix).
+    """
+
+    def __init__(self, target_root: Path):
+        self.path = target_root / MANIFEST_DIR / MANIFEST_FILE
+        self.entries: Dict[str, Dict] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Manifest illeggibile: si riparte da zero (verranno ricalcolati gli hash)
+            return
+        if data.get('version') == MANIFEST_VERSION:
+            self.entries = data.get('files', {})
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def record(self, key: str, digest: str, size: int, mtime_ns: int) -> None:
+        with self._lock:
+            self.entries[key] = {
+                'sha256': digest,
+                'size': size,
+                'mtime_ns': mtime_ns,
+            }
+            self.dirty = True
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            if self.entries.pop(key, None) is not None:
+                self.dirty = True
+
+
+class MigrationJournal:
+    """
+    Journal delle operazioni completate, salvato nel progetto target.
+    Append-only: ogni riga è scritta con fsync, così un'interruzione
+    (Ctrl-C, errore, crash) perde al massimo l'operazione in corso.
+    """
+
+    def __init__(self, target_root: Path):
+        self.path = target_root / MANIFEST_DIR / JOURNAL_FILE
+        self.entries: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Ultima riga troncata da un'interruzione
+                    continue
+                if entry.get('version') == JOURNAL_VERSION:
+                    self.entries[(entry['op'], entry['target'])] = entry
+
+    def reset(self) -> None:
+        """Migrazione completata: elimina il journal"""
+        self.entries = {}
+        self.path.unlink(missing_ok=True)
+
+    def append(self, op: str, target: str, source: str, source_sig: str, target_sig: str, files: int) -> None:
+        entry = {
+            'version': JOURNAL_VERSION,
+            'op': op,
+            'target': target,
+            'source': source,
+            'source_sig': source_sig,
+            'target_sig': target_sig,
+            'files': files,
+        }
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(entry, sort_keys=True) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.entries[(op, target)] = entry
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _fsync_file(path: Path) -> None:
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path) -> None:
+    """Rende persistenti le rinomine nella cartella (non supportato su Windows)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BackupStore:
+    """
+    Backup dei file sovrascritti durante una esecuzione, in
+    .migrazione/backups/backup-<timestamp>/ con contenuti deduplicati per
+    hash. Ogni backup è su disco (fsync) prima che il file venga
+    sovrascritto, quindi anche un'esecuzione interrotta lascia una cartella
+    utilizzabile; close() la comprime in backup-<timestamp>.tar.gz.
+    La cartella viene creata solo al primo backup effettivo.
+    """
+
+    def __init__(self, target_root: Path, keep: int = DEFAULT_BACKUP_KEEP):
+        self.folder = target_root / MANIFEST_DIR / BACKUP_DIR
+        self.keep = max(1, keep)
+        # I nomi ordinati alfabeticamente sono anche in ordine cronologico
+        self.directory = self.folder / f'backup-{datetime.now().strftime("%Y%m%d-%H%M%S-%f")}'
+        self.path = self.directory.with_name(self.directory.name + '.tar.gz')
+        self.snapshots: Dict[str, Dict] = {}
+        self._objects: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, key: str, path: Path) -> bool:
+        """
+        Salva il contenuto attuale di path e aggiorna index.json.
+        Returns: False se key era già stato salvato in questa esecuzione
+        (si conserva lo stato precedente alla migrazione)
+        """
+        with self._lock:
+            if key in self.snapshots:
+                return False
+            st = path.stat()
+            digest = file_sha256(path)
+            objects = self.directory / 'objects'
+            objects.mkdir(parents=True, exist_ok=True)
+            if digest not in self._objects:
+                tmp_path = objects / f'{digest}.tmp'
+                shutil.copyfile(path, tmp_path)
+                _fsync_file(tmp_path)
+                os.replace(tmp_path, objects / digest)
+                self._objects.add(digest)
+            self.snapshots[key] = {
+                'sha256': digest,
+                'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+            }
+            self._write_index()
+            return True
+
+    def _write_index(self) -> None:
+        """index.json sostituito atomicamente: riflette sempre i backup già su disco"""
+        tmp_path = self.directory / 'index.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self.snapshots}, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / 'index.json')
+        _fsync_dir(self.directory)
+
+    def close(self) -> None:
+        """Comprime la cartella dell'esecuzione in un archivio e applica la retention"""
+        with self._lock:
+            if not self.snapshots:
+                return
+            tmp_path = self.path.with_suffix('.tmp')
+            with tarfile.open(tmp_path, 'w:gz') as tar:
+                tar.add(self.directory / 'index.json', arcname='index.json')
+                for digest in sorted(self._objects):
+                    tar.add(self.directory / 'objects' / digest, arcname=f'objects/{digest}')
+            _fsync_file(tmp_path)
+            os.replace(tmp_path, self.path)
+            shutil.rmtree(self.directory)
+            self.snapshots = {}
+            self._objects = set()
+
+            # Archivi e cartelle lasciate da esecuzioni interrotte, dal più vecchio
+            backups = sorted(p for p in self.folder.glob('backup-*')
+                             if p.is_dir() or p.name.endswith('.tar.gz'))
+            for old in backups[:-self.keep]:
+                if old.is_dir():
+                    shutil.rmtree(old)
+                else:
+                    old.unlink()
+
+
+class CopyEngine:
+    """Esegue le copie della migrazione in modalità completa o incrementale"""
+
+    def __init__(self, source_root: Path, target_root: Path, incremental: bool = False,
+                 jobs: int = DEFAULT_JOBS, staged: bool = False, hardlink: bool = False,
+                 resume: bool = False, backup_keep: int = DEFAULT_BACKUP_KEEP, verify: bool = False):
+        self.source_root = source_root
+        self.target_root = target_root
+        self.incremental = incremental
+        self.staged = staged
+        self.hardlink = hardlink
+        self.verify_copies = verify
+        self.same_device = os.stat(source_root).st_dev == os.stat(target_root).st_dev
+        self.jobs = max(1, jobs)
+        self.manifest: Optional[SyncManifest] = None
+        self.inventory: List[FileRecord] = []
+        # Hash dei sorgenti già noti (es. calcolati durante l'estrazione di un bundle)
+        self.known_hashes: Dict[Path, str] = {}
+        self._inventory_lock = threading.Lock()
+        self._tree_pool: Optional[ThreadPoolExecutor] = None
+        self._file_pool: Optional[ThreadPoolExecutor] = None
+
+        if incremental:
+            self.manifest = SyncManifest(target_root)
+            self.manifest.load()
+
+        self.resume = resume
+        self.backups = BackupStore(target_root, backup_keep)
+        # Il journal si scrive sempre (un'esecuzione interrotta si può riprendere
+        # con --resume); con --resume si leggono anche le operazioni già completate
+        self.journal = MigrationJournal(target_root)
+        if resume:
+            self.journal.load()
+
+        if staged:
+            # Residui di esecuzioni interrotte: copie parziali mai scambiate
+            shutil.rmtree(target_root / MANIFEST_DIR / STAGING_DIR, ignore_errors=True)
+
+    def close(self) -> None:
+        """Chiude i thread pool e salva il manifest (solo in modalità incrementale)"""
+        for pool in (self._tree_pool, self._file_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        self._tree_pool = self._file_pool = None
+        self.journal.close()
+        self.backups.close()
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.staged:
+            # Rimuove le cartelle di lavoro se vuote (ignora se contengono altro)
+            for folder in (self.target_root / MANIFEST_DIR / STAGING_DIR, self.target_root / MANIFEST_DIR):
+                try:
+                    folder.rmdir()
+                except OSError:
+                    pass
+
+    def complete(self) -> None:
+        """Esecuzione terminata senza errori (dopo close): il journal non serve più e viene eliminato"""
+        self.journal.reset()
+        try:
+            # .migrazione creata solo per il journal
+            self.journal.path.parent.rmdir()
+        except OSError:
+            pass
+
+    def summary(self) -> CopyResult:
+        """Totali di tutte le copie eseguite finora (dall'inventario, senza rileggere il disco)"""
+        result = CopyResult()
+        with self._inventory_lock:
+            for record in self.inventory:
+                result.add(record)
+        return result
+
+    def _pool(self, kind: str) -> ThreadPoolExecutor:
+        if kind == 'tree':
+            if self._tree_pool is None:
+                self._tree_pool = ThreadPoolExecutor(self.jobs, thread_name_prefix='migrazione-tree')
+            return self._tree_pool
+        if self._file_pool is None:
+            self._file_pool = ThreadPoolExecutor(self.jobs, thread_name_prefix='migrazione-file')
+        return self._file_pool
+
+    def _run_ordered(self, kind: str, tasks: List[Callable[[], T]]) -> Iterator[Union[T, Exception]]:
+        """
+        Esegue i task sul pool indicato.
+        Yields: il risultato (o l'eccezione) di ogni task, nell'ordine originale
+        """
+        if self.jobs == 1 or len(tasks) <= 1:
+            for task in tasks:
+                try:
+                    yield task()
+                except Exception as e:
+                    yield e
+            return
+
+        futures = [self._pool(kind).submit(task) for task in tasks]
+        for future in futures:
+            try:
+                yield future.result()
+            except Exception as e:
+                yield e
+
+    def _key(self, target: Path) -> str:
+        try:
+            return target.relative_to(self.target_root).as_posix()
+        except ValueError:
+            return target.as_posix()
+
+    def copy_tree(self, source: Path, target: Path) -> CopyResult:
+        """Copia ricorsivamente source in target"""
+        outcome = next(self.copy_trees([(source, target)]))
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def copy_trees(self, pairs: List[Tuple[Path, Path]]) -> Iterator[Union[CopyResult, Exception]]:
+        """
+        Copia più directory in parallelo.
+        Yields: CopyResult (o l'eccezione) per ogni coppia, nell'ordine originale
+        """
+        tasks = [lambda s=source, t=target: self._journaled_tree(s, t) for source, target in pairs]
+        return self._run_ordered('tree', tasks)
+
+    def copy_files(self, pairs: List[Tuple[Path, Path]]) -> Iterator[Union[bool, Exception]]:
+        """
+        Copia più file singoli in parallelo.
+        Yields: esito di copy_file (o l'eccezione) per ogni coppia, nell'ordine originale
+        """
+        tasks = [lambda s=source, t=target: self.copy_file(s, t) for source, target in pairs]
+        return self._run_ordered('file', tasks)
+
+    def _journal_entry(self, op: str, source: Path, target: Path) -> Optional[Dict]:
+        """
+        Voce del journal per l'operazione, se --resume è attivo e l'operazione
+        risulta ancora verificata (firme di sorgente e target invariate).
+        Senza --resume il journal viene solo scritto.
+        """
+        if not self.resume:
+            return None
+        entry = self.journal.entries.get((op, self._key(target)))
+        if entry is None or entry['source'] != self._source_key(source) or not target.exists():
+            return None
+        signature = tree_signature if op == 'tree' else file_signature
+        try:
+            if signature(source) != entry['source_sig'] or signature(target) != entry['target_sig']:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def _source_key(self, source: Path) -> str:
+        try:
+            return source.relative_to(self.source_root).as_posix()
+        except ValueError:
+            return source.as_posix()
+
+    def _journaled_tree(self, source: Path, target: Path) -> CopyResult:
+        if is_ignored(source):
+            return CopyResult()
+        entry = self._journal_entry('tree', source, target)
+        if entry is not None:
+            return CopyResult(files=entry['files'], skipped=entry['files'], resumed=True)
+
+        result = self._copy_tree(source, target)
+        records = sorted((record.target.relative_to(target), record) for record in result.records)
+        self.journal.append(
+            'tree', self._key(target), self._source_key(source),
+            stat_signature((rel, record.size, record.mtime_ns) for rel, record in records),
+            stat_signature((rel, record.size, record.target_mtime_ns) for rel, record in records),
+            result.files,
+        )
+        return result
+
+    def _copy_tree(self, source: Path, target: Path) -> CopyResult:
+        result = CopyResult()
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.incremental:
+            write_root = target
+        elif self.staged:
+            write_root = self._staging_path(target, 'new')
+        else:
+            if target.exists():
+                shutil.rmtree(target)
+            write_root = target
+
+        dirs, files = scan_tree(source)
+        write_root.mkdir(parents=True, exist_ok=True)
+        for rel_dir in dirs:
+            (write_root / rel_dir).mkdir(parents=True, exist_ok=True)
+
+        tasks = [
+            lambda rel=rel, st=st: self._copy_one(source / rel, target / rel, st, write_root / rel)
+            for rel, st in files
+        ]
+        errors = []
+        for outcome in self._run_ordered('file', tasks):
+            if isinstance(outcome, Exception):
+                errors.append(outcome)
+            else:
+                result.add(outcome)
+        if errors:
+            if write_root != target:
+                # Il target live non è stato toccato: basta scartare lo staging
+                shutil.rmtree(write_root, ignore_errors=True)
+            raise errors[0]
+
+        if write_root != target:
+            self._swap(write_root, target)
+
+        if self.incremental:
+            # File migrati in passato ma non più presenti nel sorgente.
+            # Vengono rimossi solo quelli registrati nel manifest: i file creati
+            # a mano nel target non vengono mai toccati. Quelli ora esclusi
+            # (.migrationignore) escono dal manifest ma restano nel target.
+            keys = {self._key(record.target) for record in result.records}
+            prefix = self._key(target) + '/'
+            stale_keys = [k for k in list(self.manifest.entries) if k.startswith(prefix) and k not in keys]
+            for key in stale_keys:
+                stale_file = self.target_root / key
+                excluded = _ignore is not None and _ignore.is_ignored(source / key[len(prefix):])
+                if stale_file.is_file() and not excluded:
+                    stale_file.unlink()
+                    result.removed += 1
+                self.manifest.forget(key)
+
+        return result
+
+    def _staging_path(self, target: Path, kind: str) -> Path:
+        """
+        Cartella temporanea per lo scambio di target, sullo stesso filesystem.
+        Di norma in .migrazione/staging (fuori da src/, così Strapi non la
+        carica); se è su un altro device si usa una cartella nascosta accanto al target.
+        """
+        name = f'{self._key(target).replace("/", "__")}.{kind}.{os.getpid()}.{threading.get_ident()}'
+        staging_root = self.target_root / MANIFEST_DIR / STAGING_DIR
+        staging_root.mkdir(parents=True, exist_ok=True)
+        if os.stat(staging_root).st_dev == os.stat(target.parent).st_dev:
+            path = staging_root / name
+        else:
+            path = target.parent / f'.{target.name}.migrazione-{kind}-{os.getpid()}'
+        if path.exists():
+            shutil.rmtree(path)
+        return path
+
+    def _swap(self, staging: Path, target: Path) -> None:
+        """Sostituisce target con staging tramite rename (finestra di inconsistenza minima)"""
+        if not target.exists():
+            os.rename(staging, target)
+            return
+
+        old = self._staging_path(target, 'old')
+        os.rename(target, old)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            os.rename(old, target)
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        shutil.rmtree(old, ignore_errors=True)
+
+    def is_unchanged(self, source: Path, target: Path) -> bool:
+        """True se il target è già allineato al sorgente (journal, manifest o contenuto identico)"""
+        if self._journal_entry('file', source, target) is not None:
+            return True
+        if not target.is_file():
+            return False
+        src_stat = source.stat()
+        if self.incremental:
+            return self._check_unchanged(source, target, src_stat.st_size, src_stat.st_mtime_ns) is not None
+        return target.stat().st_size == src_stat.st_size and self._source_sha256(source) == file_sha256(target)
+
+    def remove_file(self, target: Path) -> None:
+        """Elimina un file migrato in passato e non più presente nel sorgente"""
+        target.unlink()
+        if self.manifest is not None:
+            self.manifest.forget(self._key(target))
+
+    def backup(self, target: Path) -> Path:
+        """
+        Salva il contenuto attuale di target nell'archivio dei backup dell'esecuzione.
+        Returns: il path dell'archivio
+        """
+        self.backups.add(self._key(target), target)
+        return self.backups.path
+
+    def copy_file(self, source: Path, target: Path) -> bool:
+        """
+        Copia un singolo file.
+        Returns: True se il file è stato scritto, False se era già allineato
+        """
+        if is_ignored(source) or self._journal_entry('file', source, target) is not None:
+            return False
+        src_stat = source.stat()
+        record = self._copy_one(source, target, src_stat)
+        self.journal.append('file', self._key(target), self._source_key(source),
+                            f'{record.size}:{record.mtime_ns}', f'{record.size}:{record.target_mtime_ns}', 1)
+        return record.copied
+
+    def _copy_one(self, source: Path, target: Path, src_stat: os.stat_result,
+                  write_to: Optional[Path] = None) -> FileRecord:
+        """
+        Copia source sul path finale target. write_to, se indicato, è il path
+        effettivamente scritto (es. la cartella di staging di una directory).
+        """
+        record = FileRecord(source, target, src_stat.st_size, src_stat.st_mtime_ns)
+        key = self._key(target)
+        write_to = write_to or target
+
+        if self.incremental:
+            record.sha256 = self._check_unchanged(source, target, record.size, record.mtime_ns)
+
+        if record.sha256 is None and write_to.exists() and os.path.samefile(source, write_to):
+            # Hardlink creato da una migrazione precedente: è già lo stesso file
+            record.method = 'hardlink'
+        elif record.sha256 is None:
+            write_to.parent.mkdir(parents=True, exist_ok=True)
+            # I file sul target live vengono sostituiti in modo atomico (staging)
+            # e un hardlink non può sovrascrivere un file esistente
+            use_tmp = write_to == target and (self.staged or (self.hardlink and write_to.exists()))
+            destination = write_to.with_name(f'.{write_to.name}.migrazione-tmp') if use_tmp else write_to
+            if use_tmp and destination.exists():
+                destination.unlink()
+            record.sha256, record.method = self._write_file(source, destination)
+            if use_tmp:
+                os.replace(destination, write_to)
+            record.copied = True
+
+        # Rename dello staging e os.replace conservano l'mtime
+        record.target_mtime_ns = os.stat(write_to).st_mtime_ns
+        if self.manifest is not None:
+            self.manifest.record(key, record.sha256, record.size, record.mtime_ns)
+        with self._inventory_lock:
+            self.inventory.append(record)
+        return record
+
+    def _write_file(self, source: Path, destination: Path) -> Tuple[Optional[str], str]:
+        """
+        Scrive destination con il metodo più rapido consentito.
+        Returns: (hash SHA-256 se serve al manifest, metodo usato)
+        """
+        method = None
+        if self.hardlink:
+            try:
+                os.link(source, destination)
+                method = 'hardlink'
+            except OSError:
+                # Device diversi o filesystem senza hardlink: si copia
+                pass
+
+        want_hash = self.incremental or self.verify_copies
+        if method is None and self.same_device:
+            method = clone_file(source, destination)
+        elif method is None:
+            if want_hash:
+                return copy_with_sha256(source, destination), 'copy'
+            shutil.copy2(source, destination)
+            method = 'copy'
+
+        # Clone e hardlink non leggono i dati: l'hash si calcola sul sorgente
+        return (self._source_sha256(source) if want_hash else None), method
+
+    def verify(self) -> VerifyResult:
+        """
+        Confronta con il target tutti i file copiati finora (dall'inventario).
+        Da chiamare prima di close(): usa il thread pool dei file.
+        """
+        result = VerifyResult()
+        with self._inventory_lock:
+            records = list(self.inventory)
+        tasks = [lambda record=record: self._verify_one(record) for record in records]
+        for record, outcome in zip(records, self._run_ordered('file', tasks)):
+            result.checked += 1
+            if isinstance(outcome, Exception):
+                result.mismatches.append((self._key(record.target), f'errore di lettura: {outcome}'))
+                continue
+            problem, bytes_read = outcome
+            result.bytes_read += bytes_read
+            if problem:
+                result.mismatches.append((self._key(record.target), problem))
+        return result
+
+    def _verify_one(self, record: FileRecord) -> Tuple[Optional[str], int]:
+        """Returns: (descrizione del problema o None, byte letti)"""
+        try:
+            st = os.stat(record.target)
+        except FileNotFoundError:
+            return 'file mancante nel target', 0
+        if st.st_size != record.size:
+            return f'dimensione {st.st_size} byte invece di {record.size}', 0
+        if record.method == 'hardlink' and os.path.samefile(record.source, record.target):
+            return None, 0
+
+        bytes_read = st.st_size
+        expected = record.sha256
+        if expected is None:
+            # Copia eseguita senza hash (es. engine creato senza verify)
+            expected = self._source_sha256(record.source)
+            bytes_read += 0 if record.source in self.known_hashes else record.size
+        if file_sha256(record.target) != expected:
+            return 'contenuto diverso dal sorgente (hash SHA-256)', bytes_read
+        return None, bytes_read
+
+    def _source_sha256(self, source: Path) -> str:
+        digest = self.known_hashes.get(source)
+        return digest if digest is not None else file_sha256(source)
+
+    def _check_unchanged(self, source: Path, target: Path, size: int, mtime_ns: int) -> Optional[str]:
+        """
+        Confronta sorgente e target usando il manifest.
+        Returns: l'hash del sorgente se il target è allineato, None altrimenti
+        """
+        try:
+            dst_size = target.stat().st_size
+        except OSError:
+            return None
+        if dst_size != size:
+            return None
+
+        entry = self.manifest.entries.get(self._key(target))
+        if entry and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+            # Sorgente non modificato dall'ultima migrazione: nessuna lettura
+            return entry['sha256']
+
+        digest = self._source_sha256(source)
+        if entry and entry['sha256'] == digest:
+            return digest
+
+        # Target senza manifest (es. dopo una migrazione completa):
+        # se il contenuto coincide lo si adotta senza riscriverlo
+        if file_sha256(target) == digest:
+            return digest
+        return None
@@ -23,6 +23,16 @@ TEMPO TEST: 1-2 ore
 
 USO:
     python migrazione_fase1.py --target "C:\\path\\to\\progetto\\docker"
+    python migrazione_fase1.py --target "C:\\path\\to\\progetto\\docker" --plan   (dry-run)
+    python migrazione_fase1.py --target "C:\\path\\to\\progetto\\docker" --schema-diff   (solo report schema)
+    python migrazione_fase1.py --target "C:\\path\\to\\progetto\\docker" --only pagina   (una collection + dipendenze)
+
+DIFF SEMANTICO:
+Schema e components vengono confrontati con quelli del target
+(migrazione_schema.py): si scrivono solo quelli cambiati davvero, così
+Strapi non rilancia la sincronizzazione del database per tipi invariati.
+Le modifiche che riscrivono tabelle (cambi di tipo colonna, relazioni,
+draftAndPublish, ...) vengono segnalate prima della copia.
 
 Autore: Generato automaticamente
 Data: 2025-11-05
@@ -30,233 +40,56 @@ Data: 2025-11-05
 """
 
 import argparse
-import json
-import os
-import shutil
-import subprocess
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
-
-# Colori per output
-class Colors:
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    GRAY = '\033[90m'
-    WHITE = '\033[97m'
-    RESET = '\033[0m'
-    BOLD = '\033[1m'
-
-if sys.platform == 'win32':
-    try:
-        import colorama
-        colorama.init()
-    except ImportError:
-        Colors.CYAN = Colors.GREEN = Colors.YELLOW = ''
-        Colors.RED = Colors.GRAY = Colors.WHITE = Colors.RESET = Colors.BOLD = ''
-
-
-def print_header(text: str, color=Colors.CYAN):
-    print(f"{color}{'=' * 60}{Colors.RESET}")
-    print(f"{color}  {text}{Colors.RESET}")
-    print(f"{color}{'=' * 60}{Colors.RESET}")
-    print()
-
-
-def print_step(step: str, total: int, current: int, text: str):
-    print(f"{Colors.CYAN}[{current}/{total}] {text}...{Colors.RESET}")
-
-
-def print_success(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.GREEN}✓ {text}{Colors.RESET}")
-
-
-def print_error(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.RED}✗ {text}{Colors.RESET}")
-
-
-def print_warning(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.YELLOW}⚠ {text}{Colors.RESET}")
-
-
-def print_info(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.WHITE}ℹ {text}{Colors.RESET}")
-
-
-def print_detail(text: str, indent: str = '        '):
-    print(f"{indent}{Colors.GRAY}• {text}{Colors.RESET}")
-
-
-def validate_paths(target_path: str) -> Tuple[Path, Path]:
-    """Valida i percorsi sorgente e target"""
-    print_step('Validazione percorsi', 5, 1, 'Validazione percorsi')
-    
-    source_path = Path.cwd()
-    
-    # Verifica package.json sorgente
-    source_package = source_path / 'package.json'
-    if not source_package.exists():
-        print_error('File package.json non trovato nella directory corrente')
-        print_info('Esegui questo script dalla ROOT del progetto Strapi sorgente')
-        sys.exit(1)
-    
-    # Verifica che sia un progetto Strapi
-    with open(source_package, 'r', encoding='utf-8') as f:
-        pkg_data = json.load(f)
-        if '@strapi/strapi' not in pkg_data.get('dependencies', {}):
-            print_error('La directory corrente non sembra essere un progetto Strapi')
-            sys.exit(1)
-    
-    print_success(f'Progetto sorgente valido: {source_path.name}')
-    print()
-    
-    # Verifica target
-    target = Path(target_path).resolve()
-    target_package = target / 'package.json'
-    
-    if not target_package.exists():
-        print_error(f'File package.json non trovato in: {target}')
-        sys.exit(1)
-    
-    with open(target_package, 'r', encoding='utf-8') as f:
-        pkg_data = json.load(f)
-        if '@strapi/strapi' not in pkg_data.get('dependencies', {}):
-            print_error('Il progetto target non sembra essere un progetto Strapi')
-            sys.exit(1)
-    
-    print_success(f'Progetto target valido: {target.name}')
-    print()
-    
-    return source_path, target
-
-
-def copy_file(source: Path, target: Path, description: str) -> Tuple[int, bool]:
-    """Copia un singolo file"""
-    try:
-        if not source.exists():
-            print_warning(f'{description} non trovato - skip')
-            return 0, False
-        
-        target.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(source, target)
-        print_success(f'{description}')
-        return 1, True
-        
-    except Exception as e:
-        print_error(f'{description}: {e}')
-        return 0, False
-
-
-def migrate_content_type_schemas(source: Path, target: Path) -> int:
-    """Migra SOLO gli schema.json di tutte le collection"""
-    print_step('Migrazione content-types schema', 5, 2, 'Migrazione schema content-types')
-    
-    migrated = 0
-    source_api = source / 'src' / 'api'
-    target_api = target / 'src' / 'api'
-    
-    if not source_api.exists():
-        print_warning('Cartella src/api/ non trovata')
-        return 0
-    
-    api_folders = [f for f in source_api.iterdir() if f.is_dir()]
-    
-    for api_folder in api_folders:
-        content_types_folder = api_folder / 'content-types'
-        
-        if not content_types_folder.exists():
-            continue
-        
-        # Per ogni content-type, copia SOLO schema.json
-        for ct_folder in content_types_folder.iterdir():
-            if not ct_folder.is_dir():
-                continue
-            
-            schema_file = ct_folder / 'schema.json'
-            if schema_file.exists():
-                target_schema = target_api / api_folder.name / 'content-types' / ct_folder.name / 'schema.json'
-                files, success = copy_file(schema_file, target_schema, f'Schema {api_folder.name}/{ct_folder.name}')
-                migrated += files
-    
-    print()
-    print_success(f'{migrated} schema migrati')
-    print()
-    return migrated
-
-
-def copy_directory(source: Path, target: Path, description: str) -> Tuple[int, bool]:
-    """Copia ricorsivamente una directory"""
-    try:
-        if not source.exists():
-            print_warning(f'{description} non trovato - skip')
-            return 0, False
-        
-        target.parent.mkdir(parents=True, exist_ok=True)
-        
-        if target.exists():
-            shutil.rmtree(target)
-        
-        shutil.copytree(source, target)
-        file_count = sum(1 for _ in target.rglob('*') if _.is_file())
-        
-        print_success(f'{description} ({file_count} files)')
-        return file_count, True
-        
-    except Exception as e:
-        print_error(f'{description}: {e}')
-        return 0, False
-
-
-def migrate_components(source: Path, target: Path) -> int:
-    """Migra tutti i components"""
-    print_step('Migrazione components', 5, 3, 'Migrazione components')
-    
-    files, success = copy_directory(
-        source / 'src' / 'components',
-        target / 'src' / 'components',
-        'Components'
-    )
-    
-    if success:
-        print_detail('url/url-addizionali')
-        print_detail('shared/seo')
-        print_detail('Altri components custom')
-    
+from typing import Callable, Dict, List
+
+from migrazione_comune import (
+    Colors, print_header, print_success, print_error, print_warning, print_info,
+    print_detail, validate_paths, verify_copies, print_ignored,
+)
+from migrazione_copia import CopyEngine, DEFAULT_JOBS, format_size
+from migrazione_piano import PHASE_PLANS, build_graph, execute_steps, plan_graph, print_plan_report, select_plan
+from migrazione_schema import (
+    DEFAULT_LARGE_ROWS, SQLITE_DATABASE, SchemaDiff, diff_projects, print_schema_report, print_selection,
+    select_closure, table_row_counts,
+)
+
+
+def report_unchanged(diffs: List[SchemaDiff]) -> Callable[[Dict, int, bool], None]:
+    """Output degli step Schema e Components oltre alle copie: schema invariati e solo nel target"""
+    def after_step(step: Dict, files: int, success: bool) -> None:
+        if not step.get('schemas'):
+            return
+        content_types = step['name'] == 'Schema'
+        selected = [diff for diff in diffs if diff.uid.startswith('api::') == content_types]
+        unchanged = sum(1 for diff in selected if diff.source is not None and not diff.changed)
+        if unchanged:
+            print_success(f'{unchanged} {"schema" if content_types else "components"} invariati (non riscritti)')
+        if content_types:
+            for diff in selected:
+                if diff.status == 'removed':
+                    print_warning(f'Schema {diff.uid} presente solo nel target (non rimosso)')
+    return after_step
+
+
+def report_schema_changes(source: Path, diffs: List[SchemaDiff], large_rows: int) -> Dict[str, int]:
+    """Mostra il diff semantico prima della copia (le righe vengono dal database SQLite del sorgente)"""
+    print_info('Diff semantico schema/components rispetto al target')
     print()
-    return files
+    row_counts = table_row_counts(source / SQLITE_DATABASE)
+    print_schema_report(diffs, row_counts, large_rows)
+    return row_counts
 
 
-def migrate_base_configs(source: Path, target: Path) -> int:
-    """Migra solo configurazioni base (NO admin.ts, NO plugins.ts)"""
-    print_step('Migrazione configurazioni base', 5, 4, 'Migrazione configurazioni base')
-    
-    migrated = 0
-    
-    config_files = [
-        ('server.ts', 'config/server.ts'),
-        ('middlewares.ts', 'config/middlewares.ts'),
-        ('api.ts', 'config/api.ts'),
-    ]
-    
-    for filename, description in config_files:
-        files, success = copy_file(
-            source / 'config' / filename,
-            target / 'config' / filename,
-            description
-        )
-        migrated += files
-    
-    print()
+def print_not_migrated():
+    """Configurazioni lasciate alla fase 3 o alla configurazione manuale"""
     print_info('NON migrati (configurare manualmente):')
     print_detail('config/admin.ts (preview mode, security)')
     print_detail('config/plugins.ts (GCS upload)')
     print_detail('config/database.ts (PostgreSQL vs SQLite)')
     print_detail('.env (variabili d\'ambiente)')
     print()
-    
-    return migrated
 
 
 def main():
@@ -269,6 +102,64 @@ def main():
         required=True,
         help='Percorso al progetto Strapi target (es: C:\\progetti\\strapi-docker)'
     )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Dry-run: mostra file creati/sovrascritti/eliminati e durata stimata senza copiare'
+    )
+    parser.add_argument(
+        '--schema-diff',
+        action='store_true',
+        help='Mostra solo il diff semantico di schema e components rispetto al target, senza copiare'
+    )
+    parser.add_argument(
+        '--all-schemas',
+        action='store_true',
+        help='Copia tutti gli schema e components anche se semanticamente invariati'
+    )
+    parser.add_argument(
+        '--large-rows',
+        type=int,
+        default=DEFAULT_LARGE_ROWS,
+        help=f'Righe oltre le quali una tabella da riscrivere viene segnalata (default: {DEFAULT_LARGE_ROWS})'
+    )
+    parser.add_argument(
+        '--only',
+        type=str,
+        help='Migra solo le collection indicate (es: pagina,articoli) più content-type e components da cui dipendono'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Dopo la copia confronta hash e dimensioni di ogni file del target con il sorgente'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Copia solo i file nuovi o modificati (manifest degli hash nel target)'
+    )
+    parser.add_argument(
+        '--staged',
+        action='store_true',
+        help='Copia ogni directory in una cartella temporanea e la sostituisce con rename atomici'
+    )
+    parser.add_argument(
+        '--hardlink',
+        action='store_true',
+        help='Crea hardlink invece di copie (solo mirror in sola lettura: modificare il target modifica il sorgente)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Riprende una migrazione interrotta saltando le operazioni già completate nel journal del target '
+             '(il journal si scrive sempre e viene eliminato a fine esecuzione senza errori)'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f'Numero di copie eseguite in parallelo (default: {DEFAULT_JOBS}, 1 = sequenziale)'
+    )
     
     args = parser.parse_args()
     
@@ -279,19 +170,64 @@ def main():
     print()
     
     # Validazione
-    source_path, target_path = validate_paths(args.target)
-    
-    # Contatori
-    total_files = 0
+    steps = PHASE_PLANS['fase1']['steps']
+    source_path, target_path = validate_paths(args.target, len(steps) + 1)
+    
+    diffs = diff_projects(source_path, target_path)
+    closure = None
+    if args.only:
+        try:
+            closure = select_closure(source_path, args.only)
+        except ValueError as e:
+            print_error(str(e), indent='')
+            sys.exit(1)
+        print_selection(closure, args.only)
+        order = {uid: index for index, uid in enumerate(closure)}
+        diffs = sorted((diff for diff in diffs if diff.uid in order), key=lambda diff: order[diff.uid])
+    if args.schema_diff:
+        report_schema_changes(source_path, diffs, args.large_rows)
+        return
+    if args.all_schemas:
+        # Tutti gli schema del sorgente vengono riscritti, come nelle versioni precedenti
+        for diff in diffs:
+            if diff.source is not None and not diff.changed:
+                diff.status = 'forced'
+    else:
+        report_schema_changes(source_path, diffs, args.large_rows)
+    
+    # Con --all-schemas senza --only components copiati per intero (cartella)
+    selection = None if args.all_schemas and not args.only else select_plan(source_path, closure, diffs)
+    graph = build_graph(source_path, target_path, ['fase1'], PHASE_PLANS, selection)
+    if args.plan:
+        # Stesse operazioni della copia: --only, diff semantico, components rimossi
+        print_plan_report(plan_graph(graph, target_path, args.incremental, args.jobs))
+        return
+    
+    engine = CopyEngine(source_path, target_path, incremental=args.incremental, jobs=args.jobs,
+                        staged=args.staged, hardlink=args.hardlink, resume=args.resume,
+                        verify=args.verify)
     
     # Migrazione
-    total_files += migrate_content_type_schemas(source_path, target_path)
-    total_files += migrate_components(source_path, target_path)
-    total_files += migrate_base_configs(source_path, target_path)
+    try:
+        total_files, errors = execute_steps(graph, engine, PHASE_PLANS, 'fase1', 2, len(steps) + 1,
+                                            report_unchanged(diffs))
+        print_not_migrated()
+        if args.verify:
+            errors += len(verify_copies(engine).mismatches)
+    finally:
+        engine.close()
+    if errors == 0:
+        engine.complete()
     
     # Riepilogo
-    print_header('📊 RIEPILOGO FASE 1', Colors.GREEN)
+    copy_summary = engine.summary()
+    print_header('📊 RIEPILOGO FASE 1', Colors.GREEN if errors == 0 else Colors.YELLOW)
     print_success(f'Files migrati: {total_files}')
+    print_success(f'Dati migrati: {format_size(copy_summary.bytes)} '
+                  f'({copy_summary.copied} file scritti, {format_size(copy_summary.bytes_copied)})')
+    print_ignored()
+    if errors:
+        print_error(f'Errori: {errors}')
     print()
     
     print_header('✅ PROSSIMI PASSI', Colors.YELLOW)
@@ -302,6 +238,8 @@ def main():
     print()
     print_detail('Se tutto OK → Procedi con FASE 2 (Services + Controllers)')
     print()
+    if errors:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -33,6 +33,7 @@ NOTE IMPORTANTI:
 
 USO:
     python migrazione_fase3.py --target "C:\\path\\to\\progetto\\docker"
+    python migrazione_fase3.py --target "C:\\path\\to\\progetto\\docker" --plan   (dry-run)
 
 Autore: Generato automaticamente
 Data: 2025-11-05
@@ -40,280 +41,38 @@ Data: 2025-11-05
 """
 
 import argparse
-import json
-import os
-import shutil
-import subprocess
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Dict
 
-# Colori per output
-class Colors:
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    GRAY = '\033[90m'
-    WHITE = '\033[97m'
-    RESET = '\033[0m'
-    BOLD = '\033[1m'
-
-if sys.platform == 'win32':
-    try:
-        import colorama
-        colorama.init()
-    except ImportError:
-        Colors.CYAN = Colors.GREEN = Colors.YELLOW = ''
-        Colors.RED = Colors.GRAY = Colors.WHITE = Colors.RESET = Colors.BOLD = ''
-
-
-def print_header(text: str, color=Colors.CYAN):
-    print(f"{color}{'=' * 60}{Colors.RESET}")
-    print(f"{color}  {text}{Colors.RESET}")
-    print(f"{color}{'=' * 60}{Colors.RESET}")
-    print()
-
-
-def print_step(step: str, total: int, current: int, text: str):
-    print(f"{Colors.CYAN}[{current}/{total}] {text}...{Colors.RESET}")
-
-
-def print_success(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.GREEN}✓ {text}{Colors.RESET}")
-
-
-def print_error(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.RED}✗ {text}{Colors.RESET}")
-
-
-def print_warning(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.YELLOW}⚠ {text}{Colors.RESET}")
-
-
-def print_info(text: str, indent: str = '   '):
-    print(f"{indent}{Colors.WHITE}ℹ {text}{Colors.RESET}")
-
-
-def print_detail(text: str, indent: str = '        '):
-    print(f"{indent}{Colors.GRAY}• {text}{Colors.RESET}")
-
-
-def validate_paths(target_path: str) -> Tuple[Path, Path]:
-    """Valida i percorsi sorgente e target"""
-    print_step('Validazione percorsi', 7, 1, 'Validazione percorsi')
-    
-    source_path = Path.cwd()
-    
-    source_package = source_path / 'package.json'
-    if not source_package.exists():
-        print_error('File package.json non trovato nella directory corrente')
-        sys.exit(1)
-    
-    with open(source_package, 'r', encoding='utf-8') as f:
-        pkg_data = json.load(f)
-        if '@strapi/strapi' not in pkg_data.get('dependencies', {}):
-            print_error('La directory corrente non sembra essere un progetto Strapi')
-            sys.exit(1)
-    
-    print_success(f'Progetto sorgente: {source_path.name}')
-    
-    target = Path(target_path).resolve()
-    target_package = target / 'package.json'
-    
-    if not target_package.exists():
-        print_error(f'File package.json non trovato in: {target}')
-        sys.exit(1)
-    
-    with open(target_package, 'r', encoding='utf-8') as f:
-        pkg_data = json.load(f)
-        if '@strapi/strapi' not in pkg_data.get('dependencies', {}):
-            print_error('Il progetto target non sembra essere un progetto Strapi')
-            sys.exit(1)
-    
-    print_success(f'Progetto target: {target.name}')
-    print()
-    
-    return source_path, target
-
-
-def copy_file(source: Path, target: Path, description: str, create_backup: bool = True) -> Tuple[int, bool]:
-    """Copia un singolo file"""
-    try:
-        if not source.exists():
-            print_warning(f'{description} non trovato - skip')
-            return 0, False
-        
-        if create_backup and target.exists():
-            backup_path = Path(str(target) + '.backup')
-            shutil.copy2(target, backup_path)
-            print_info(f'Backup: {backup_path.name}')
-        
-        target.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(source, target)
-        print_success(f'{description}')
-        return 1, True
-        
-    except Exception as e:
-        print_error(f'{description}: {e}')
-        return 0, False
-
-
-def copy_directory(source: Path, target: Path, description: str) -> Tuple[int, bool]:
-    """Copia ricorsivamente una directory"""
-    try:
-        if not source.exists():
-            print_warning(f'{description} non trovato - skip')
-            return 0, False
-        
-        target.parent.mkdir(parents=True, exist_ok=True)
-        
-        if target.exists():
-            shutil.rmtree(target)
-        
-        shutil.copytree(source, target)
-        file_count = sum(1 for _ in target.rglob('*') if _.is_file())
-        
-        print_success(f'{description} ({file_count} files)')
-        return file_count, True
-        
-    except Exception as e:
-        print_error(f'{description}: {e}')
-        return 0, False
-
-
-def migrate_tree_view_plugin(source: Path, target: Path) -> int:
-    """Migra plugin tree-view"""
-    print_step('Migrazione plugin tree-view', 7, 2, 'Migrazione plugin tree-view')
-    
-    files, success = copy_directory(
-        source / 'src' / 'plugins' / 'tree-view',
-        target / 'src' / 'plugins' / 'tree-view',
-        'Plugin tree-view'
-    )
-    
-    if success:
-        print_detail('Visualizzazione gerarchica ad albero')
-        print_detail('Drag-and-drop riorganizzazione')
-        print_detail('Supporto multi-collection')
-        print()
-        print_warning('ATTENZIONE: Potrebbe richiedere rebuild admin panel!')
-        print_detail('Esegui: npm run build')
-    
-    print()
-    return files
+from migrazione_cache import read_json
+from migrazione_comune import (
+    Colors, print_header, print_step, print_success, print_error, print_warning,
+    print_info, print_detail, validate_paths, verify_copies, print_ignored,
+)
+from migrazione_copia import CopyEngine, DEFAULT_BACKUP_KEEP, DEFAULT_JOBS, format_size
+from migrazione_piano import PHASE_PLANS, build_graph, execute_steps, plan_graph, print_plan_report
 
 
-def migrate_admin_customizations(source: Path, target: Path) -> int:
-    """Migra customizations admin panel"""
-    print_step('Migrazione admin customizations', 7, 3, 'Migrazione admin customizations')
-    
-    migrated = 0
-    
-    # src/admin/app.tsx (nascondi menu)
-    app_file = source / 'src' / 'admin' / 'app.tsx'
-    if app_file.exists():
-        files, success = copy_file(
-            app_file,
-            target / 'src' / 'admin' / 'app.tsx',
-            'src/admin/app.tsx (nascondi Deploy/Marketplace)',
-            create_backup=True
-        )
-        migrated += files
-        
-        if success:
-            print_detail('Nascondi menu Deploy per ruoli Editor/Author')
-            print_detail('Nascondi menu Marketplace')
-            print()
-            print_warning('TESTARE con Strapi 5.30 - potrebbe non funzionare!')
-    else:
-        print_warning('src/admin/app.tsx non trovato (cerco app.example.tsx)')
-        
-        app_example = source / 'src' / 'admin' / 'app.example.tsx'
-        if app_example.exists():
-            files, success = copy_file(
-                app_example,
-                target / 'src' / 'admin' / 'app.tsx',
-                'src/admin/app.example.tsx → app.tsx',
-                create_backup=True
-            )
-            migrated += files
-    
-    print()
-    return migrated
+def print_gcs_setup(step: Dict, files: int, success: bool) -> None:
+    """Dopo config/plugins.ts: variabili GCS e caricamento dei media esistenti"""
+    if step['name'] != 'Config plugins' or not success:
+        return
+    print_detail('Variabili necessarie:')
+    print_detail('  - GCS_SERVICE_ACCOUNT')
+    print_detail('  - GCS_BUCKET_NAME')
+    print_detail('  - GCS_BASE_PATH (opzionale)')
+    print_info('Media già caricati in public/uploads: python migrazione_media.py gcs')
 
 
-def migrate_extensions(source: Path, target: Path) -> int:
-    """Migra extensions (content-manager, etc.)"""
-    print_step('Migrazione extensions', 7, 4, 'Migrazione extensions')
-    
-    files, success = copy_directory(
-        source / 'src' / 'extensions',
-        target / 'src' / 'extensions',
-        'Extensions (content-manager customizations)'
-    )
-    
-    print()
-    return files
-
-
-def migrate_advanced_configs(source: Path, target: Path) -> int:
-    """Migra configurazioni avanzate"""
-    print_step('Migrazione configurazioni avanzate', 7, 5, 'Migrazione configurazioni avanzate')
-    
-    migrated = 0
-    
-    # config/admin.ts (preview mode)
-    files, success = copy_file(
-        source / 'config' / 'admin.ts',
-        target / 'config' / 'admin.ts',
-        'config/admin.ts (preview mode, security)',
-        create_backup=True
-    )
-    migrated += files
-    
-    if success:
-        print_detail('Preview mode configurato')
-        print_detail('Security tokens (JWT, API, Transfer)')
-        print()
-        print_warning('IMPORTANTE: Verifica CLIENT_URL in .env!')
-        print_warning('IMPORTANTE: Verifica PREVIEW_SECRET in .env!')
-        print()
-    
-    # config/plugins.ts (GCS upload)
-    files, success = copy_file(
-        source / 'config' / 'plugins.ts',
-        target / 'config' / 'plugins.ts',
-        'config/plugins.ts (GCS upload provider)',
-        create_backup=True
-    )
-    migrated += files
-    
-    if success:
-        print_detail('Google Cloud Storage upload provider')
-        print_detail('Path intelligente: folder/contentType/slug/filename')
-        print_detail('Slugify automatico nomi file')
-        print()
-        print_warning('CRITICO: Configura credenziali GCS in .env!')
-        print_detail('Variabili necessarie:')
-        print_detail('  - GCS_SERVICE_ACCOUNT')
-        print_detail('  - GCS_BUCKET_NAME')
-        print_detail('  - GCS_BASE_PATH (opzionale)')
-        print()
-    
-    print()
-    return migrated
-
-
-def manage_dependencies(target: Path) -> bool:
+def manage_dependencies(target: Path, total_steps: int) -> bool:
     """Verifica e suggerisce dipendenze necessarie"""
-    print_step('Verifica dipendenze avanzate', 7, 6, 'Verifica dipendenze avanzate')
+    print_step('Verifica dipendenze avanzate', total_steps, total_steps, 'Verifica dipendenze avanzate')
     
     target_package = target / 'package.json'
     
     try:
-        with open(target_package, 'r', encoding='utf-8') as f:
-            pkg_data = json.load(f)
+        pkg_data = read_json(target_package)
         
         deps = pkg_data.get('dependencies', {})
         required_deps = {
@@ -355,6 +114,49 @@ def main():
         required=True,
         help='Percorso al progetto Strapi target (es: C:\\progetti\\strapi-docker)'
     )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Dry-run: mostra file creati/sovrascritti/eliminati e durata stimata senza copiare'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Dopo la copia confronta hash e dimensioni di ogni file del target con il sorgente'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Copia solo i file nuovi o modificati (manifest degli hash nel target)'
+    )
+    parser.add_argument(
+        '--staged',
+        action='store_true',
+        help='Copia ogni directory in una cartella temporanea e la sostituisce con rename atomici'
+    )
+    parser.add_argument(
+        '--hardlink',
+        action='store_true',
+        help='Crea hardlink invece di copie (solo mirror in sola lettura: modificare il target modifica il sorgente)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Riprende una migrazione interrotta saltando le operazioni già completate nel journal del target '
+             '(il journal si scrive sempre e viene eliminato a fine esecuzione senza errori)'
+    )
+    parser.add_argument(
+        '--backup-keep',
+        type=int,
+        default=DEFAULT_BACKUP_KEEP,
+        help=f'Archivi di backup da conservare in .migrazione/backups (default: {DEFAULT_BACKUP_KEEP})'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f'Numero di copie eseguite in parallelo (default: {DEFAULT_JOBS}, 1 = sequenziale)'
+    )
     
     args = parser.parse_args()
     
@@ -367,22 +169,39 @@ def main():
     print_warning('ATTENZIONE: Questa fase modifica UI e integrazioni esterne!')
     print()
     
-    # Validazione
-    source_path, target_path = validate_paths(args.target)
+    # Validazione: gli step del piano più la verifica delle dipendenze
+    total_steps = len(PHASE_PLANS['fase3']['steps']) + 2
+    source_path, target_path = validate_paths(args.target, total_steps)
     
-    # Contatori
-    total_files = 0
+    graph = build_graph(source_path, target_path, ['fase3'], PHASE_PLANS)
+    if args.plan:
+        print_plan_report(plan_graph(graph, target_path, args.incremental, args.jobs))
+        return
+    
+    engine = CopyEngine(source_path, target_path, incremental=args.incremental, jobs=args.jobs,
+                        staged=args.staged, hardlink=args.hardlink, resume=args.resume,
+                        backup_keep=args.backup_keep, verify=args.verify)
     
     # Migrazione
-    total_files += migrate_tree_view_plugin(source_path, target_path)
-    total_files += migrate_admin_customizations(source_path, target_path)
-    total_files += migrate_extensions(source_path, target_path)
-    total_files += migrate_advanced_configs(source_path, target_path)
-    manage_dependencies(target_path)
+    try:
+        total_files, errors = execute_steps(graph, engine, PHASE_PLANS, 'fase3', 2, total_steps, print_gcs_setup)
+        if args.verify:
+            errors += len(verify_copies(engine).mismatches)
+    finally:
+        engine.close()
+    if errors == 0:
+        engine.complete()
+    manage_dependencies(target_path, total_steps)
     
     # Riepilogo
-    print_header('📊 RIEPILOGO FASE 3', Colors.GREEN)
+    copy_summary = engine.summary()
+    print_header('📊 RIEPILOGO FASE 3', Colors.GREEN if errors == 0 else Colors.YELLOW)
     print_success(f'Files migrati: {total_files}')
+    print_success(f'Dati migrati: {format_size(copy_summary.bytes)} '
+                  f'({copy_summary.copied} file scritti, {format_size(copy_summary.bytes_copied)})')
+    print_ignored()
+    if errors:
+        print_error(f'Errori: {errors}')
     print()
     
     print_header('⚠️ CONFIGURAZIONE .ENV OBBLIGATORIA', Colors.RED)
@@ -409,6 +228,8 @@ def main():
     print_detail('8. Testa upload file su GCS bucket')
     print_detail('9. Verifica path file generati: folder/contentType/slug/filename')
     print()
+    if errors:
+        sys.exit(1)
     print_header('🎉 MIGRAZIONE COMPLETA', Colors.GREEN)
     print_success('Tutte e 3 le fasi completate!')
     print()
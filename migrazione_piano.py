@@ -0,0 +1,1004 @@
+#!/usr/bin/env python3
+"""
+====================================
+MIGRAZIONE PER PIANO: più fasi in un solo passaggio
+====================================
+Esegue una o più fasi di migrazione descritte in modo dichiarativo
+(fase → sorgenti, destinazioni, glob include/exclude).
+
+Le fasi selezionate vengono espanse in un unico grafo di operazioni
+deduplicato: ogni file viene copiato UNA sola volta anche se compare in
+più fasi (es. src/api/common copiato sia da 'completa' che da 'fase2',
+oppure src/components copiato da 'fase1' e da 'completa').
+
+FASI DISPONIBILI:
+- completa: equivalente a migrazione.py
+- fase1, fase2, fase3: equivalenti a migrazione_fase1/2/3.py
+- tutte: fase1 + fase2 + fase3
+
+FORMATO DEL PIANO (--plan-file, JSON):
+    {
+      "fase2": {
+        "description": "Services + Controllers + Lifecycles",
+        "steps": [
+          {"name": "Controllers", "source": "src/api/*/controllers",
+           "exclude": ["src/api/common"]},
+          {"name": "src/index.ts", "source": "src/index.ts", "backup": true}
+        ]
+      }
+    }
+
+- source: path o glob relativo alla root del progetto. Può essere una
+  lista di alternative: viene usata la prima esistente.
+- target: destinazione (default: stesso path relativo).
+- include/exclude: glob relativi alla root del progetto. Una directory
+  senza filtri viene sostituita per intero (come copy_directory), con
+  filtri vengono copiati solo i file selezionati.
+- backup: salva il file esistente nell'archivio dei backup prima di sovrascriverlo.
+- schemas: lo step contiene schema di content-type/components; con una
+  selezione (--only, diff semantico di fase 1) si scrivono solo quelli
+  selezionati, gli altri file dello step vengono copiati comunque.
+- details, warnings: righe stampate dagli script delle fasi dopo lo step.
+
+SCRIPT DELLE FASI:
+migrazione.py e migrazione_fase1/2/3.py eseguono il piano della propria
+fase (build_graph + execute_steps), step per step nell'ordine del piano.
+--only e il diff semantico diventano una Selection applicata al grafo:
+la copia e il dry-run (--plan) vedono le stesse operazioni.
+
+DRY-RUN (--plan):
+Calcola cosa verrebbe creato, sovrascritto, salvato nei backup o
+eliminato dall'rmtree, con byte e durata stimata, senza scrivere nulla.
+Usa una sola scansione stat-only di sorgente e target (nessuna lettura
+del contenuto dei file). Disponibile anche in migrazione_fase1/2/3.py.
+
+BUNDLE PER TARGET REMOTI (--bundle / --apply-bundle):
+--bundle out.tar.zst esporta i file delle fasi selezionate in un unico
+archivio compresso (una sola lettura di ogni file, hash calcolati in
+streaming); --apply-bundle lo estrae e verifica nel target e poi esegue
+le stesse operazioni, con manifest, backup e --verify come una copia
+diretta. Con --base (la release registrata nel target) il bundle è un
+delta: solo i file cambiati ed eliminati, applicati tutto o niente.
+Vedi migrazione_bundle.py.
+
+NOTA: questo script esegue solo le copie. Verifica dipendenze e .env
+restano negli script delle singole fasi.
+
+USO:
+    python migrazione_piano.py --target "C:\\path\\to\\progetto\\docker" --fasi tutte
+    python migrazione_piano.py --target "C:\\path\\to\\progetto\\docker" --fasi completa,fase3
+    python migrazione_piano.py --fasi tutte --bundle migrazione.tar.zst
+    python migrazione_piano.py --target /srv/strapi --apply-bundle migrazione.tar.zst
+    python migrazione_piano.py --fasi tutte --bundle delta.tar.zst --base release.json
+====================================
+"""
+
+import argparse
+import json
+import shutil
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from migrazione_bundle import (
+    BUNDLE_FILES, BundleError, BundleIndex, apply_delta, bundle_extract_root, extract_bundle,
+    load_release, save_release, write_bundle,
+)
+from migrazione_comune import (
+    Colors, print_header, print_step, print_success, print_error, print_warning,
+    print_info, print_detail, validate_paths, validate_source, validate_target, verify_copies,
+    copy_file, copy_files, copy_directories, print_ignored,
+)
+from migrazione_copia import (
+    BackupStore, CopyEngine, BACKUP_DIR, DEFAULT_BACKUP_KEEP, DEFAULT_JOBS, MANIFEST_DIR, SyncManifest,
+    compile_glob, file_sha256, format_size, is_ignored, scan_tree,
+)
+from migrazione_schema import SchemaDiff, api_folders_of, load_schemas
+
+PHASE_PLANS: Dict[str, Dict] = {
+    'completa': {
+        'description': 'Migrazione completa (migrazione.py)',
+        'steps': [
+            {'name': 'Plugin tree-view', 'source': 'src/plugins/tree-view'},
+            {'name': 'API Common', 'source': 'src/api/common',
+             'details': ['archivio controller/routes', 'unpublish controller/routes',
+                         'path-resolver service/controller/routes (gestione path duplicati)',
+                         'default-path service', 'content-type placeholder (nascosto)']},
+            {'name': 'Collection', 'source': 'src/api/*', 'exclude': ['src/api/common']},
+            {'name': 'Components', 'source': 'src/components', 'schemas': True,
+             'details': ['url/url-addizionali (per default-path)', 'altri components custom']},
+            {'name': 'Utils', 'source': 'src/utils',
+             'details': ['seo-auto-populate.ts (auto-popolamento SEO)']},
+            {'name': 'Global subscriber', 'source': 'src/index.ts', 'backup': True,
+             'details': ['global subscriber + default-path logic']},
+            {'name': 'Config admin', 'source': 'config/admin.ts', 'backup': True},
+            {'name': 'Config plugins', 'source': 'config/plugins.ts', 'backup': True},
+        ],
+    },
+    'fase1': {
+        'description': 'Schema + Configurazioni Base',
+        'steps': [
+            {'name': 'Schema', 'source': 'src/api/*/content-types/*/schema.json', 'schemas': True},
+            {'name': 'Components', 'source': 'src/components', 'schemas': True,
+             'details': ['url/url-addizionali', 'shared/seo', 'Altri components custom']},
+            {'name': 'Config server', 'source': 'config/server.ts'},
+            {'name': 'Config middlewares', 'source': 'config/middlewares.ts'},
+            {'name': 'Config api', 'source': 'config/api.ts'},
+        ],
+    },
+    'fase2': {
+        'description': 'Services + Controllers + Lifecycles',
+        'steps': [
+            {'name': 'API Common', 'source': 'src/api/common',
+             'details': ['path-resolver service (cache O(1))', 'default-path service (path gerarchici)',
+                         'archivio controller (anno/mese/giorno)', 'unpublish controller (universale)',
+                         'path-resolver controller + routes']},
+            {'name': 'Controllers', 'source': 'src/api/*/controllers', 'exclude': ['src/api/common']},
+            {'name': 'Services', 'source': 'src/api/*/services', 'exclude': ['src/api/common']},
+            {'name': 'Routes', 'source': 'src/api/*/routes', 'exclude': ['src/api/common']},
+            {'name': 'Global lifecycles', 'source': 'src/index.ts', 'backup': True,
+             'details': ['PathResolver invalidation subscriber', 'Auto-slug generation (slugify)',
+                         'SEO auto-populate lifecycle', 'Default-path hierarchical management']},
+            {'name': 'Utils', 'source': 'src/utils',
+             'details': ['seo-auto-populate.ts (strip HTML, keywords, OpenGraph)']},
+        ],
+    },
+    'fase3': {
+        'description': 'Plugin + Admin + Configurazioni Avanzate',
+        'steps': [
+            {'name': 'Plugin tree-view', 'source': 'src/plugins/tree-view',
+             'details': ['Visualizzazione gerarchica ad albero', 'Drag-and-drop riorganizzazione',
+                         'Supporto multi-collection'],
+             'warnings': ['ATTENZIONE: Potrebbe richiedere rebuild admin panel! (npm run build)']},
+            {'name': 'Admin customizations', 'source': ['src/admin/app.tsx', 'src/admin/app.example.tsx'],
+             'target': 'src/admin/app.tsx', 'backup': True,
+             'details': ['Nascondi menu Deploy per ruoli Editor/Author', 'Nascondi menu Marketplace'],
+             'warnings': ['TESTARE con Strapi 5.30 - potrebbe non funzionare!']},
+            {'name': 'Extensions', 'source': 'src/extensions',
+             'details': ['content-manager customizations']},
+            {'name': 'Config admin', 'source': 'config/admin.ts', 'backup': True,
+             'details': ['Preview mode configurato', 'Security tokens (JWT, API, Transfer)'],
+             'warnings': ['IMPORTANTE: Verifica CLIENT_URL in .env!', 'IMPORTANTE: Verifica PREVIEW_SECRET in .env!']},
+            {'name': 'Config plugins', 'source': 'config/plugins.ts', 'backup': True,
+             'details': ['Google Cloud Storage upload provider', 'Path intelligente: folder/contentType/slug/filename',
+                         'Slugify automatico nomi file'],
+             'warnings': ['CRITICO: Configura credenziali GCS in .env!']},
+        ],
+    },
+}
+
+PHASE_ALIASES = {
+    'tutte': ['fase1', 'fase2', 'fase3'],
+}
+
+GLOB_CHARS = set('*?[')
+
+# Parametri per la stima della durata in --plan (prudenziali per share di rete)
+PLAN_THROUGHPUT_BYTES_S = 40 * 1024 * 1024
+PLAN_FILE_OVERHEAD_S = 0.004
+
+PLAN_ACTIONS = {
+    'create': 'Nuovi file',
+    'overwrite': 'File sovrascritti',
+    'backup': f'Backup ({MANIFEST_DIR}/{BACKUP_DIR})',
+    'delete': 'Eliminati (rmtree o component rimossi)',
+    'unchanged': 'Invariati',
+}
+
+
+@dataclass
+class Operation:
+    """
+    Operazione del grafo: copia di una directory ('tree') o di un file
+    ('file'), oppure eliminazione di un file del target ('remove')
+    """
+    kind: str
+    source: Path
+    target: Path
+    phase: str
+    step: str
+    backup: bool = False
+    depends_on: List[int] = field(default_factory=list)
+    level: int = 0
+    name: str = ''  # step del piano che ha generato l'operazione
+
+    @property
+    def mirror(self) -> bool:
+        """Una directory copiata per intero sostituisce tutto il contenuto del target"""
+        return self.kind == 'tree'
+
+
+@dataclass
+class OperationGraph:
+    """Grafo deduplicato delle operazioni di una o più fasi"""
+    operations: List[Operation] = field(default_factory=list)
+    duplicates: int = 0
+    conflicts: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    missing_steps: Set[Tuple[str, str]] = field(default_factory=set)
+
+    def levels(self) -> List[List[Operation]]:
+        """Operazioni raggruppate per livello: ogni livello dipende solo dai precedenti"""
+        grouped: Dict[int, List[Operation]] = {}
+        for op in self.operations:
+            grouped.setdefault(op.level, []).append(op)
+        return [grouped[level] for level in sorted(grouped)]
+
+
+@dataclass
+class Selection:
+    """
+    Sottoinsieme del piano scelto dagli script delle fasi: --only (collection
+    e dipendenze) e diff semantico degli schema. Applicato da build_graph,
+    vale allo stesso modo per la copia e per il dry-run (--plan).
+    """
+    api_folders: Optional[Set[str]] = None  # cartelle di src/api da copiare (common sempre inclusa)
+    schemas: Optional[Set[Path]] = None  # schema del sorgente da scrivere negli step 'schemas' (None = tutti)
+    known_schemas: Set[Path] = field(default_factory=set)  # tutti gli schema del sorgente
+    removed: List[Path] = field(default_factory=list)  # components del target non più nel sorgente
+    labels: Dict[Path, str] = field(default_factory=dict)  # descrizioni delle operazioni sugli schema
+
+    def skips_api(self, rel: str) -> bool:
+        """True se rel è in una cartella di src/api esclusa da --only"""
+        parts = rel.split('/')
+        return (self.api_folders is not None and len(parts) > 2 and parts[:2] == ['src', 'api']
+                and parts[2] != 'common' and parts[2] not in self.api_folders)
+
+    def skips_schema(self, path: Path) -> bool:
+        """True se path è uno schema non selezionato (invariato o fuori da --only)"""
+        return self.schemas is not None and path in self.known_schemas and path not in self.schemas
+
+
+def select_plan(source_root: Path, closure: Optional[List[str]] = None,
+                diffs: Optional[List[SchemaDiff]] = None) -> Selection:
+    """
+    Selection della copia reale: closure sono gli uid di --only con le
+    dipendenze, diffs il diff semantico di fase 1 (già ristretto a closure).
+    Senza diffs vengono scritti tutti gli schema della closure.
+    """
+    schemas = load_schemas(source_root)
+    selection = Selection(known_schemas={schema.path for schema in schemas.values()})
+    if closure is not None:
+        selection.api_folders = set(api_folders_of(closure))
+        selection.schemas = {schemas[uid].path for uid in closure if uid in schemas}
+    if diffs is not None:
+        selection.schemas = {diff.source.path for diff in diffs if diff.changed and diff.source is not None}
+        for diff in diffs:
+            kind = 'Schema' if diff.uid.startswith('api::') else 'Component'
+            if diff.source is not None:
+                selection.labels[diff.source.path] = f'{kind} {diff.uid} ({diff.status})'
+            elif diff.status == 'removed' and kind == 'Component':
+                # Come la copia completa della cartella: il component sparisce dal target
+                selection.removed.append(diff.target.path)
+                selection.labels[diff.target.path] = f'{kind} {diff.uid}'
+    return selection
+
+
+@dataclass
+class PlanEntry:
+    """Effetto previsto di una migrazione su un singolo file del target"""
+    action: str
+    path: str
+    size: int
+    phase: str
+
+
+@dataclass
+class PlanReport:
+    """Risultato del dry-run (--plan)"""
+    entries: List[PlanEntry] = field(default_factory=list)
+    jobs: int = DEFAULT_JOBS
+
+    def totals(self, action: str) -> Tuple[int, int]:
+        """Returns: (numero file, byte) per l'azione indicata"""
+        selected = [e for e in self.entries if e.action == action]
+        return len(selected), sum(e.size for e in selected)
+
+    def estimated_seconds(self) -> float:
+        """Stima grossolana: byte scritti / throughput + overhead per file (diviso per --jobs)"""
+        written = sum(e.size for e in self.entries if e.action in ('create', 'overwrite', 'backup'))
+        touched = sum(1 for e in self.entries if e.action != 'unchanged')
+        return written / PLAN_THROUGHPUT_BYTES_S + touched * PLAN_FILE_OVERHEAD_S / max(1, self.jobs)
+
+
+def load_plans(plan_file: Optional[str]) -> Dict[str, Dict]:
+    """Piani predefiniti, eventualmente estesi/sovrascritti da un file JSON"""
+    plans = dict(PHASE_PLANS)
+    if plan_file:
+        with open(plan_file, 'r', encoding='utf-8') as f:
+            plans.update(json.load(f))
+    return plans
+
+
+def resolve_phases(selection: str, plans: Dict[str, Dict]) -> List[str]:
+    """Converte '--fasi fase1,fase2' (o un alias) nella lista ordinata delle fasi"""
+    phases: List[str] = []
+    for name in (part.strip() for part in selection.split(',') if part.strip()):
+        for phase in PHASE_ALIASES.get(name, [name]):
+            if phase not in plans:
+                raise ValueError(f'Fase sconosciuta: {phase} (disponibili: {", ".join(sorted(plans))})')
+            if phase not in phases:
+                phases.append(phase)
+    return phases
+
+
+def _is_excluded(rel: str, patterns: List) -> bool:
+    """True se rel o una delle sue cartelle padre corrisponde a un pattern"""
+    parts = rel.split('/')
+    candidates = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    return any(p.match(c) for p in patterns for c in candidates)
+
+
+def _expand_sources(source_root: Path, source) -> List[Path]:
+    if isinstance(source, list):
+        # Alternative: vale la prima esistente
+        for candidate in source:
+            if (source_root / candidate).exists():
+                return [source_root / candidate]
+        return []
+    if GLOB_CHARS & set(source):
+        return sorted(source_root.glob(source))
+    path = source_root / source
+    return [path] if path.exists() else []
+
+
+def step_name(step: Dict) -> str:
+    return step.get('name', str(step['source']))
+
+
+def _expand_step(source_root: Path, target_root: Path, phase: str, step: Dict,
+                 graph: OperationGraph, selection: Optional[Selection] = None) -> List[Operation]:
+    include = [compile_glob(p) for p in step.get('include', [])]
+    exclude = [compile_glob(p) for p in step.get('exclude', [])]
+    backup = bool(step.get('backup', False))
+    name = step_name(step)
+    # Gli step con schema vanno espansi file per file solo se la selezione li filtra
+    schema_filter = selection if step.get('schemas') and selection is not None and selection.schemas is not None else None
+
+    sources = _expand_sources(source_root, step['source'])
+    if not sources:
+        graph.missing.append(f'{phase}: {name} ({step["source"]})')
+        graph.missing_steps.add((phase, name))
+        return []
+
+    operations = []
+    for source in sources:
+        rel = source.relative_to(source_root).as_posix()
+        if _is_excluded(rel, exclude) or is_ignored(source):
+            continue
+        if selection is not None and selection.skips_api(rel):
+            continue
+        target = target_root / step['target'] if step.get('target') else target_root / rel
+        label = name if len(sources) == 1 else f'{name} {rel}'
+
+        if source.is_file():
+            if schema_filter is not None and schema_filter.skips_schema(source):
+                continue
+            label = selection.labels.get(source, label) if selection is not None else label
+            operations.append(Operation('file', source, target, phase, label, backup, name=name))
+            continue
+
+        if not include and not exclude and schema_filter is None:
+            operations.append(Operation('tree', source, target, phase, label, name=name))
+            continue
+
+        # Directory con filtri: scansione stat-only per selezionare i file
+        _, files = scan_tree(source)
+        selected = []
+        for file_rel, _ in files:
+            full_rel = f'{rel}/{file_rel.as_posix()}'
+            if include and not any(p.match(full_rel) for p in include):
+                continue
+            if _is_excluded(full_rel, exclude):
+                continue
+            # Il diff vale solo per gli schema: gli altri file (es. sottocartelle, file
+            # di supporto) vengono copiati come con la cartella intera
+            if schema_filter is not None and schema_filter.skips_schema(source / file_rel):
+                continue
+            selected.append(file_rel)
+        if len(selected) == len(files) and not include and schema_filter is None:
+            operations.append(Operation('tree', source, target, phase, label, name=name))
+            continue
+        for f in selected:
+            description = schema_filter.labels.get(source / f) if schema_filter is not None else None
+            operations.append(Operation('file', source / f, target / f, phase,
+                                        description or f'{label}/{f.as_posix()}', backup, name=name))
+        if schema_filter is not None:
+            for removed in schema_filter.removed:
+                if _contains(target, removed) and removed.exists():
+                    operations.append(Operation('remove', source / removed.relative_to(target), removed, phase,
+                                                schema_filter.labels.get(removed, removed.name), name=name))
+    return operations
+
+
+def _contains(outer: Path, inner: Path) -> bool:
+    return inner == outer or outer in inner.parents
+
+
+def build_graph(source_root: Path, target_root: Path, phases: List[str],
+                plans: Dict[str, Dict], selection: Optional[Selection] = None) -> OperationGraph:
+    """
+    Espande le fasi in operazioni e costruisce il grafo deduplicato:
+    - un'operazione contenuta in una directory copiata per intero dalla
+      stessa sorgente viene scartata (verrebbe copiata due volte)
+    - due copie dello stesso file sulla stessa destinazione diventano una
+      (con sorgenti diverse vince la fase successiva, segnalato come conflitto)
+    - un'operazione dentro una directory sostituita per intero da un'altra
+      sorgente dipende da quella (deve essere eseguita dopo l'rmtree)
+    selection (--only, diff semantico) limita le operazioni come nella copia reale.
+    """
+    graph = OperationGraph()
+    raw: List[Operation] = []
+    for phase in phases:
+        for step in plans[phase].get('steps', []):
+            raw.extend(_expand_step(source_root, target_root, phase, step, graph, selection))
+
+    mirrors = [op for op in raw if op.mirror]
+
+    def subsumed_by(op: Operation) -> Optional[Operation]:
+        for tree in mirrors:
+            if tree is op or not _contains(tree.target, op.target):
+                continue
+            if tree.target == op.target and op.mirror and mirrors.index(tree) > mirrors.index(op):
+                continue
+            if tree.source / op.target.relative_to(tree.target) == op.source:
+                return tree
+        return None
+
+    by_target: Dict[Path, Operation] = {}
+    for op in raw:
+        owner = subsumed_by(op)
+        if owner is not None:
+            graph.duplicates += 1
+            owner.backup = owner.backup or op.backup
+            continue
+        previous = by_target.get(op.target)
+        if previous is not None:
+            graph.duplicates += 1
+            if previous.source != op.source:
+                graph.conflicts.append(
+                    f'{op.target.relative_to(target_root).as_posix()}: '
+                    f'{previous.phase} sostituito da {op.phase}'
+                )
+            op.backup = op.backup or previous.backup
+            graph.operations.remove(previous)
+        by_target[op.target] = op
+        graph.operations.append(op)
+
+    _link_dependencies(graph)
+    return graph
+
+
+def graph_from_bundle(index: BundleIndex, extract_root: Path, target_root: Path) -> OperationGraph:
+    """Grafo delle operazioni registrate in un bundle, con sorgenti nei file estratti"""
+    graph = OperationGraph()
+    files_root = extract_root / BUNDLE_FILES
+    for op in index.operations:
+        graph.operations.append(
+            Operation(op.kind, files_root / op.path, target_root / op.path, op.phase, op.step, op.backup)
+        )
+    _link_dependencies(graph)
+    return graph
+
+
+def _link_dependencies(graph: OperationGraph) -> None:
+    # Dipendenze: prima le directory sostituite per intero, poi ciò che contengono
+    trees = [op for op in graph.operations if op.mirror]
+    for op in graph.operations:
+        for tree in trees:
+            if tree is not op and _contains(tree.target, op.target) and tree.target != op.target:
+                op.depends_on.append(graph.operations.index(tree))
+    for op in graph.operations:
+        op.level = _level(op, graph.operations)
+
+
+def _level(op: Operation, operations: List[Operation]) -> int:
+    if not op.depends_on:
+        return 0
+    return 1 + max(_level(operations[i], operations) for i in op.depends_on)
+
+
+def _execute_level(level: List[Operation], engine: CopyEngine,
+                   describe: Callable[[Operation], str]) -> Tuple[int, int]:
+    """
+    Esegue operazioni indipendenti tra loro, con le copie in parallelo
+    Returns: (file_migrati, errori)
+    """
+    migrated = 0
+    errors = 0
+    trees = [op for op in level if op.kind == 'tree']
+    plain_files = [op for op in level if op.kind == 'file' and not op.backup]
+    backup_files = [op for op in level if op.kind == 'file' and op.backup]
+
+    for files, success in copy_directories([(op.source, op.target, describe(op)) for op in trees], engine):
+        migrated += files
+        errors += 0 if success else 1
+
+    for files, success in copy_files([(op.source, op.target, describe(op)) for op in plain_files], engine):
+        migrated += files
+        errors += 0 if success else 1
+
+    for op in backup_files:
+        files, success = copy_file(op.source, op.target, describe(op), engine, create_backup=True)
+        migrated += files
+        errors += 0 if success else 1
+
+    for op in (op for op in level if op.kind == 'remove'):
+        try:
+            engine.remove_file(op.target)
+            print_warning(f'{describe(op)} rimosso (non più nel sorgente)')
+        except OSError as e:
+            print_error(f'{describe(op)}: {e}')
+            errors += 1
+
+    return migrated, errors
+
+
+def execute_graph(graph: OperationGraph, engine: CopyEngine) -> Tuple[int, int]:
+    """
+    Esegue il grafo livello per livello, con le copie di ogni livello in parallelo
+    Returns: (file_migrati, errori)
+    """
+    migrated = 0
+    errors = 0
+    for level in graph.levels():
+        files, level_errors = _execute_level(level, engine, lambda op: f'[{op.phase}] {op.step}')
+        migrated += files
+        errors += level_errors
+    return migrated, errors
+
+
+def execute_steps(graph: OperationGraph, engine: CopyEngine, plans: Dict[str, Dict], phase: str,
+                  first_step: int, total_steps: int,
+                  after_step: Optional[Callable[[Dict, int, bool], None]] = None) -> Tuple[int, int]:
+    """
+    Esegue il grafo di una fase step per step, nell'ordine del piano, come
+    passi numerati dello script ([n/totale] a partire da first_step).
+    Dopo ogni step riuscito stampa 'details' e 'warnings' dello step;
+    after_step(step, file, successo) aggiunge l'output specifico dello script.
+    Returns: (file_migrati, errori)
+    """
+    migrated = 0
+    errors = 0
+    for number, step in enumerate(plans[phase].get('steps', []), first_step):
+        name = step_name(step)
+        print_step(name, total_steps, number, f'Migrazione {name}')
+        operations = [op for op in graph.operations if op.phase == phase and op.name == name]
+
+        files = step_errors = 0
+        levels = sorted({op.level for op in operations})
+        for level in levels:
+            level_files, level_errors = _execute_level(
+                [op for op in operations if op.level == level], engine, lambda op: op.step
+            )
+            files += level_files
+            step_errors += level_errors
+
+        success = step_errors == 0 and (phase, name) not in graph.missing_steps
+        if (phase, name) in graph.missing_steps:
+            print_warning(f'{name} non trovato - skip ({step["source"]})')
+        elif not operations:
+            print_success(f'{name}: nessun file da scrivere')
+        if success and operations:
+            for detail in step.get('details', []):
+                print_detail(detail)
+            for warning in step.get('warnings', []):
+                print_warning(warning)
+        if after_step is not None:
+            after_step(step, files, success)
+        print()
+        migrated += files
+        errors += step_errors
+    return migrated, errors
+
+
+def plan_graph(graph: OperationGraph, target_root: Path, incremental: bool = False,
+               jobs: int = DEFAULT_JOBS) -> PlanReport:
+    """
+    Calcola l'effetto del grafo sul target senza toccare il disco.
+    Solo stat: il contenuto dei file non viene mai letto. In modalità
+    incrementale un file è 'invariato' se dimensione e mtime coincidono
+    con il manifest (o con il target, dato che copy2 preserva l'mtime).
+    """
+    report = PlanReport(jobs=jobs)
+    manifest = None
+    if incremental:
+        manifest = SyncManifest(target_root)
+        manifest.load()
+
+    def key(path: Path) -> str:
+        return path.relative_to(target_root).as_posix()
+
+    def unchanged(target: Path, src_stat, dst_stat) -> bool:
+        if not incremental or dst_stat is None or dst_stat.st_size != src_stat.st_size:
+            return False
+        entry = manifest.entries.get(key(target))
+        if entry:
+            return entry['size'] == src_stat.st_size and entry['mtime_ns'] == src_stat.st_mtime_ns
+        return dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+    def add_file(op: Operation, source: Path, target: Path, src_stat, dst_stat, backup: bool):
+        # I file con backup identici al sorgente non vengono riscritti: con
+        # stat-only si assume identico un file con stessa dimensione e mtime
+        same_stat = (backup and dst_stat is not None and dst_stat.st_size == src_stat.st_size
+                     and dst_stat.st_mtime_ns == src_stat.st_mtime_ns)
+        if same_stat or unchanged(target, src_stat, dst_stat):
+            report.entries.append(PlanEntry('unchanged', key(target), src_stat.st_size, op.phase))
+            return
+        if dst_stat is None:
+            report.entries.append(PlanEntry('create', key(target), src_stat.st_size, op.phase))
+            return
+        if backup:
+            report.entries.append(PlanEntry('backup', key(target), dst_stat.st_size, op.phase))
+        report.entries.append(PlanEntry('overwrite', key(target), src_stat.st_size, op.phase))
+
+    for op in graph.operations:
+        if op.kind == 'remove':
+            report.entries.append(PlanEntry('delete', key(op.target), op.target.stat().st_size, op.phase))
+            continue
+        if op.kind == 'file':
+            try:
+                dst_stat = op.target.stat()
+            except OSError:
+                dst_stat = None
+            add_file(op, op.source, op.target, op.source.stat(), dst_stat, op.backup)
+            continue
+
+        _, source_files = scan_tree(op.source)
+        target_files = dict(scan_tree(op.target)[1]) if op.target.is_dir() else {}
+        for rel, src_stat in source_files:
+            dst_stat = target_files.pop(rel, None)
+            add_file(op, op.source / rel, op.target / rel, src_stat, dst_stat, False)
+
+        # File rimasti solo nel target: eliminati dall'rmtree (in modalità
+        # incrementale solo quelli registrati nel manifest)
+        for rel, dst_stat in sorted(target_files.items()):
+            target = op.target / rel
+            if incremental and key(target) not in manifest.entries:
+                continue
+            report.entries.append(PlanEntry('delete', key(target), dst_stat.st_size, op.phase))
+
+    return report
+
+
+def print_plan_report(report: PlanReport):
+    """Stampa il dry-run: elenco file per azione, totali e durata stimata"""
+    for action, label in PLAN_ACTIONS.items():
+        count, size = report.totals(action)
+        if count == 0 or action == 'unchanged':
+            continue
+        print_info(f'{label}: {count} ({format_size(size)})')
+        for entry in (e for e in report.entries if e.action == action):
+            print_detail(f'{entry.path} ({format_size(entry.size)}) [{entry.phase}]')
+        print()
+
+    print_header('📋 RIEPILOGO DRY-RUN', Colors.CYAN)
+    for action, label in PLAN_ACTIONS.items():
+        count, size = report.totals(action)
+        print_success(f'{label}: {count} ({format_size(size)})')
+    print_success(f'Durata stimata: ~{report.estimated_seconds():.1f} s (--jobs {report.jobs})')
+    print_ignored()
+    print()
+    print_info('Nessun file è stato modificato (--plan)')
+    print()
+
+
+def print_graph(graph: OperationGraph, phases: List[str], plans: Dict[str, Dict]):
+    """Stampa il riepilogo del grafo costruito"""
+    for phase in phases:
+        print_detail(f'{phase}: {plans[phase].get("description", "")}')
+    print()
+    trees = sum(1 for op in graph.operations if op.kind == 'tree')
+    print_success(f'{len(graph.operations)} operazioni ({trees} directory, {len(graph.operations) - trees} file)')
+    print_success(f'{graph.duplicates} operazioni duplicate eliminate')
+    print_success(f'{len(graph.levels())} livelli di dipendenza')
+    for missing in graph.missing:
+        print_warning(f'Sorgente non trovata - skip: {missing}')
+    for conflict in graph.conflicts:
+        print_warning(f'Conflitto: {conflict}')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Esegue una o più fasi di migrazione come un unico piano deduplicato'
+    )
+    parser.add_argument(
+        '--target',
+        type=str,
+        help='Percorso al progetto Strapi target (es: C:\\progetti\\strapi-docker); non serve con --bundle'
+    )
+    parser.add_argument(
+        '--fasi',
+        type=str,
+        default='tutte',
+        help='Fasi da eseguire separate da virgola: completa, fase1, fase2, fase3, tutte (default: tutte)'
+    )
+    parser.add_argument(
+        '--plan-file',
+        type=str,
+        help='File JSON con piani aggiuntivi o sostitutivi (stesso formato di PHASE_PLANS)'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Dry-run: mostra file creati/sovrascritti/eliminati e durata stimata senza copiare'
+    )
+    parser.add_argument(
+        '--bundle',
+        type=str,
+        metavar='FILE',
+        help='Esporta i file delle fasi in un archivio .tar.zst/.tar.gz (- = stdout) invece di copiarli'
+    )
+    parser.add_argument(
+        '--base',
+        type=str,
+        metavar='RELEASE',
+        help='Con --bundle: crea un bundle delta rispetto alla release applicata al target '
+             '(.migrazione/release.json del target, o la cartella del progetto target)'
+    )
+    parser.add_argument(
+        '--apply-bundle',
+        type=str,
+        metavar='FILE',
+        help='Applica al target un bundle creato con --bundle (- = stdin), verificandone gli hash'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Dopo la copia confronta hash e dimensioni di ogni file del target con il sorgente'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Copia solo i file nuovi o modificati (manifest degli hash nel target)'
+    )
+    parser.add_argument(
+        '--staged',
+        action='store_true',
+        help='Copia ogni directory in una cartella temporanea e la sostituisce con rename atomici'
+    )
+    parser.add_argument(
+        '--hardlink',
+        action='store_true',
+        help='Crea hardlink invece di copie (solo mirror in sola lettura: modificare il target modifica il sorgente)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Riprende una migrazione interrotta saltando le operazioni già completate nel journal del target '
+             '(il journal si scrive sempre e viene eliminato a fine esecuzione senza errori)'
+    )
+    parser.add_argument(
+        '--backup-keep',
+        type=int,
+        default=DEFAULT_BACKUP_KEEP,
+        help=f'Archivi di backup da conservare in .migrazione/backups (default: {DEFAULT_BACKUP_KEEP})'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f'Numero di copie eseguite in parallelo (default: {DEFAULT_JOBS}, 1 = sequenziale)'
+    )
+
+    args = parser.parse_args()
+    if not args.target and not args.bundle:
+        parser.error('--target è obbligatorio (tranne con --bundle)')
+    if args.bundle and args.apply_bundle:
+        parser.error('--bundle e --apply-bundle non possono essere usati insieme')
+    if args.base and not args.bundle:
+        parser.error('--base si usa solo con --bundle')
+
+    if args.bundle == '-' or args.apply_bundle == '-':
+        # stdout è riservato al bundle (o lo è lo stdin): i messaggi vanno su stderr
+        sys.stdout = sys.stderr
+
+    print()
+    print_header('🧭 MIGRAZIONE PER PIANO', Colors.CYAN)
+
+    if args.apply_bundle:
+        apply_bundle(args)
+
+    plans = load_plans(args.plan_file)
+    try:
+        phases = resolve_phases(args.fasi, plans)
+    except ValueError as e:
+        print_error(str(e))
+        sys.exit(1)
+
+    if args.bundle:
+        export_bundle(args, phases, plans)
+
+    source_path, target_path = validate_paths(args.target, 3)
+
+    print_step('Costruzione piano', 3, 2, 'Costruzione grafo operazioni')
+    graph = build_graph(source_path, target_path, phases, plans)
+    print_graph(graph, phases, plans)
+
+    if args.plan:
+        print_step('Dry-run', 3, 3, 'Calcolo differenze (stat-only)')
+        print_plan_report(plan_graph(graph, target_path, args.incremental, args.jobs))
+        sys.exit(0)
+
+    print_step('Esecuzione piano', 3, 3, 'Esecuzione piano')
+    engine = CopyEngine(source_path, target_path, incremental=args.incremental, jobs=args.jobs,
+                        staged=args.staged, hardlink=args.hardlink, resume=args.resume,
+                        backup_keep=args.backup_keep, verify=args.verify)
+    errors = run_graph(graph, engine, phases, args.verify)
+    sys.exit(0 if errors == 0 else 1)
+
+
+def run_graph(graph: OperationGraph, engine: CopyEngine, phases: List[str], verify: bool) -> int:
+    """Esegue il grafo e stampa il riepilogo. Returns: numero di errori"""
+    try:
+        total_files, errors = execute_graph(graph, engine)
+        if verify:
+            print()
+            errors += len(verify_copies(engine).mismatches)
+    finally:
+        engine.close()
+    if errors == 0:
+        engine.complete()
+    print()
+
+    copy_summary = engine.summary()
+    print_header('📊 RIEPILOGO PIANO', Colors.GREEN if errors == 0 else Colors.YELLOW)
+    print_success(f'Fasi: {", ".join(phases)}')
+    print_success(f'Files migrati: {total_files}')
+    print_success(f'Dati migrati: {format_size(copy_summary.bytes)} '
+                  f'({copy_summary.copied} file scritti, {format_size(copy_summary.bytes_copied)})')
+    print_ignored()
+    if errors:
+        print_error(f'Errori: {errors}')
+    print()
+    print_info('Verifica dipendenze e .env con gli script delle singole fasi')
+    print()
+    return errors
+
+
+def export_bundle(args, phases: List[str], plans: Dict[str, Dict]):
+    """--bundle: scrive le operazioni delle fasi in un archivio, senza target"""
+    print_step('Validazione percorsi', 3, 1, 'Validazione sorgente')
+    source_path = validate_source()
+    base = None
+    if args.base:
+        try:
+            base = load_release(Path(args.base))
+        except BundleError as e:
+            print_error(str(e))
+            sys.exit(1)
+        if base.phases != phases:
+            # Con fasi diverse i file assenti verrebbero scambiati per eliminati
+            print_error(f'La release base contiene le fasi {", ".join(base.phases)}: usa --fasi {",".join(base.phases)}')
+            sys.exit(1)
+        print_success(f'Release base: {base.release[:12]} del {base.created} ({len(base.files)} file)')
+    print()
+
+    print_step('Costruzione piano', 3, 2, 'Costruzione grafo operazioni')
+    # Il target non serve: i path del bundle sono relativi alla root del progetto
+    target_root = Path(BUNDLE_FILES)
+    graph = build_graph(source_path, target_root, phases, plans)
+    print_graph(graph, phases, plans)
+
+    output = 'stdout' if args.bundle == '-' else args.bundle
+    print_step('Bundle', 3, 3, f'Scrittura bundle {"delta " if base else ""}{output}')
+
+    def on_operation(op: Operation, files: int):
+        if base is None:
+            print_success(f'[{op.phase}] {op.step} ({files} file)')
+        elif files:
+            print_success(f'[{op.phase}] {op.step} ({files} modificati)')
+
+    try:
+        index = write_bundle(args.bundle, graph.operations, target_root, phases, source_path.name,
+                             on_operation, base)
+    except (BundleError, OSError) as e:
+        print_error(f'Bundle non creato: {e}')
+        sys.exit(1)
+    for key in index.deleted:
+        print_detail(f'eliminato: {key}')
+    print()
+
+    print_header('📦 BUNDLE CREATO', Colors.GREEN)
+    print_success(f'Fasi: {", ".join(phases)}')
+    print_success(f'{len(index.files)} file, {format_size(index.bytes)}')
+    if base is not None:
+        print_success(f'Delta su {base.release[:12]}: {len(index.files)} file nuovi o modificati, '
+                      f'{len(index.deleted)} eliminati')
+    if args.bundle != '-':
+        print_success(f'Archivio: {args.bundle} ({format_size(Path(args.bundle).stat().st_size)})')
+    print_ignored()
+    print()
+    print_info('Sul target: python migrazione_piano.py --target <progetto> --apply-bundle <archivio>')
+    print()
+    sys.exit(0)
+
+
+def apply_bundle(args):
+    """--apply-bundle: estrae e verifica il bundle nel target, poi esegue le sue operazioni"""
+    print_step('Validazione percorsi', 3, 1, 'Validazione target')
+    target_path = validate_target(args.target)
+    print()
+
+    source = 'stdin' if args.apply_bundle == '-' else args.apply_bundle
+    print_step('Estrazione bundle', 3, 2, f'Estrazione e verifica {source}')
+    extract_root = bundle_extract_root(target_path)
+    try:
+        index = extract_bundle(args.apply_bundle, extract_root)
+    except (BundleError, OSError) as e:
+        print_error(f'Bundle scartato, target non modificato: {e}')
+        sys.exit(1)
+    print_success(f'{len(index.files)} file verificati ({format_size(index.bytes)})')
+    print_detail(f'Creato il {index.created} da {index.source}, fasi: {", ".join(index.phases)}')
+    print()
+
+    try:
+        if index.delta:
+            errors = apply_delta_bundle(index, extract_root, target_path, args)
+        else:
+            graph = graph_from_bundle(index, extract_root, target_path)
+            print_step('Esecuzione piano', 3, 3, 'Applicazione bundle')
+            # I file estratti sono sullo stesso filesystem: hardlink invece di una seconda copia
+            engine = CopyEngine(extract_root, target_path, incremental=args.incremental, jobs=args.jobs,
+                                staged=args.staged, hardlink=True, resume=args.resume,
+                                backup_keep=args.backup_keep, verify=args.verify)
+            engine.known_hashes = {extract_root / BUNDLE_FILES / key: entry['sha256']
+                                   for key, entry in index.files.items()}
+            errors = run_graph(graph, engine, index.phases, args.verify)
+            if errors == 0:
+                save_release(target_path, index, index.files)
+    finally:
+        shutil.rmtree(extract_root, ignore_errors=True)
+    sys.exit(0 if errors == 0 else 1)
+
+
+def apply_delta_bundle(index: BundleIndex, extract_root: Path, target_path: Path, args) -> int:
+    """Applica un bundle delta (tutto o niente). Returns: numero di errori"""
+    print_step('Esecuzione piano', 3, 3, f'Applicazione delta su {index.base[:12]}')
+    backups = BackupStore(target_path, args.backup_keep)
+    try:
+        result = apply_delta(index, extract_root, target_path, backups)
+    except (BundleError, OSError) as e:
+        print_error(f'Delta non applicato, target invariato: {e}')
+        return 1
+    finally:
+        backups.close()
+    for key in sorted(index.files):
+        print_success(key)
+    for key in index.deleted:
+        print_detail(f'eliminato: {key}')
+    if result.backups:
+        print_info(f'Backup: {backups.path.name} ({result.backups} file)')
+
+    errors = 0
+    if args.verify:
+        print()
+        print_info('Verifica integrità dei file sostituiti...')
+        for key, entry in sorted(index.files.items()):
+            if file_sha256(target_path / key) != entry['sha256']:
+                print_error(f'{key}: contenuto diverso dal bundle (hash SHA-256)')
+                errors += 1
+        if not errors:
+            print_success(f'Verifica integrità: {len(index.files)} file OK')
+    if errors == 0:
+        save_release(target_path, index, result.files)
+    else:
+        # Un target con file diversi dal bundle non è una base valida per i delta successivi
+        print_warning('Release non registrata: il target non corrisponde al bundle')
+    print()
+
+    print_header('📊 RIEPILOGO DELTA', Colors.GREEN if errors == 0 else Colors.YELLOW)
+    print_success(f'Fasi: {", ".join(index.phases)}')
+    print_success(f'Release: {index.base[:12]} → {index.release[:12]}')
+    print_success(f'File scritti: {result.written} ({format_size(result.bytes_written)})')
+    print_success(f'File eliminati: {result.deleted}')
+    if errors:
+        print_error(f'Errori: {errors}')
+    print()
+    return errors
+
+
+if __name__ == '__main__':
+    main()
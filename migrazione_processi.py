@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+====================================
+Esecuzione di comandi esterni (npm)
+====================================
+Livello comune per i processi lanciati dagli script di migrazione:
+- l'output viene letto e inoltrato riga per riga mentre il comando gira
+  (di un npm install lento si vede subito l'avanzamento) e in memoria
+  restano solo le ultime righe, per i messaggi di errore;
+- la cartella di lavoro è passata a ogni comando (cwd=), senza os.chdir;
+- timeout per comando: allo scadere il processo viene terminato;
+- run_concurrently esegue più operazioni lunghe e indipendenti in
+  parallelo con asyncio (es. installazione dipendenze durante la copia).
+====================================
+"""
+
+import asyncio
+import shutil
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+DEFAULT_TIMEOUT = 30 * 60
+TAIL_LINES = 20
+
+
+@dataclass
+class CommandResult:
+    """Esito di un comando esterno"""
+    command: List[str]
+    returncode: Optional[int] = None
+    timed_out: bool = False
+    tail: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+def _resolve(command: List[str]) -> List[str]:
+    """Path completo dell'eseguibile (su Windows npm è npm.cmd)"""
+    executable = shutil.which(command[0])
+    return [executable or command[0], *command[1:]]
+
+
+async def stream_command(command: List[str], cwd: Path, timeout: Optional[float] = DEFAULT_TIMEOUT,
+                         on_line: Optional[Callable[[str], None]] = None) -> CommandResult:
+    """
+    Esegue command in cwd inoltrando stdout e stderr (uniti) riga per riga a on_line.
+    Returns: CommandResult con exit code e ultime righe di output
+    """
+    result = CommandResult(command)
+    tail = deque(maxlen=TAIL_LINES)
+    process = await asyncio.create_subprocess_exec(
+        *_resolve(command),
+        cwd=str(cwd),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+
+    async def pump():
+        while True:
+            raw = await process.stdout.readline()
+            if not raw:
+                break
+            line = raw.decode('utf-8', errors='replace').rstrip()
+            tail.append(line)
+            if on_line is not None and line:
+                on_line(line)
+        await process.wait()
+
+    try:
+        await asyncio.wait_for(pump(), timeout)
+    except asyncio.TimeoutError:
+        result.timed_out = True
+        process.kill()
+        await process.wait()
+    except BaseException:
+        # Ctrl-C o cancellazione: il processo non deve sopravvivere allo script
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    result.returncode = process.returncode
+    result.tail = list(tail)
+    return result
+
+
+def run_command(command: List[str], cwd: Path, timeout: Optional[float] = DEFAULT_TIMEOUT,
+                on_line: Optional[Callable[[str], None]] = None) -> CommandResult:
+    """Versione sincrona di stream_command (usabile anche da un thread secondario)"""
+    return asyncio.run(stream_command(command, cwd, timeout, on_line))
+
+
+def run_concurrently(*tasks: Callable[[], Any]) -> List[Any]:
+    """
+    Esegue in parallelo operazioni sincrone indipendenti (ognuna su un thread).
+    Returns: i risultati nell'ordine dei task; la prima eccezione viene rilanciata
+    """
+    async def gather():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(None, task) for task in tasks))
+
+    return asyncio.run(gather())
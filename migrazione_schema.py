@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+====================================
+Diff semantico degli schema Strapi
+====================================
+Confronta gli schema dei content-type (src/api/*/content-types/*/schema.json)
+e dei components (src/components/<categoria>/<nome>.json) di sorgente e
+target a livello di significato, non di byte: attributi aggiunti/rimossi,
+cambi di tipo, relazioni, valori enum, components e opzioni.
+
+Ogni modifica ha un impatto:
+- rewrite: Strapi al boot riscrive (o ricostruisce) la tabella: cambio del
+  tipo di colonna, relazioni che cambiano tabella di link (*_lnk),
+  components ripetibili, draftAndPublish, nuovi indici unique;
+- breaking: possibile perdita di dati (attributi rimossi, valori enum
+  eliminati, target di relazioni, collectionName rinominata);
+- safe: solo validazione/admin (default, min/max, displayName, ...).
+
+migrazione_fase1.py scrive solo gli schema davvero cambiati, così Strapi
+non esegue sincronizzazioni inutili; con --schema-diff mostra solo il report.
+Se il progetto sorgente ha il database SQLite (.tmp/data.db) le tabelle
+con molte righe vengono evidenziate.
+
+GRAFO DELLE DIPENDENZE (--only):
+Relazioni verso altri content-type (es. api::pagina.pagina), components
+(url.url-addizionali, shared.seo) e dynamic zone formano un grafo. Con
+--only <collection> gli script migrano solo la chiusura transitiva della
+collection: i content-type e i components di cui ha bisogno, in ordine
+di dipendenza (prima le dipendenze).
+
+TABELLE DEL DATABASE:
+strapi_table_dependencies ricava dagli schema le tabelle che Strapi crea
+accanto a quella della collection (es. paginas): le tabelle di link
+<tabella>_<attributo>_lnk per le relazioni e <tabella>_cmps per
+components e dynamic zone, ognuna dipendente dalle tabelle che collega.
+Usato da migrazione_database.py per ordinare la copia dei dati.
+====================================
+"""
+
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from migrazione_cache import read_json
+from migrazione_comune import Colors, print_header, print_success, print_warning, print_info, print_detail
+
+SQLITE_DATABASE = Path('.tmp') / 'data.db'
+DEFAULT_LARGE_ROWS = 100_000
+
+IMPACT_LABELS = {
+    'rewrite': 'Riscrittura tabella',
+    'breaking': 'Possibile perdita dati',
+    'safe': 'Sicuro',
+}
+IMPACT_ORDER = ['safe', 'breaking', 'rewrite']
+
+# Tipo di colonna SQL usato da Strapi per ogni tipo di attributo scalare:
+# un cambio di tipo che cambia colonna forza un ALTER COLUMN (riscrittura)
+COLUMN_TYPES = {
+    'string': 'varchar', 'email': 'varchar', 'uid': 'varchar', 'enumeration': 'varchar', 'password': 'varchar',
+    'text': 'text', 'richtext': 'text',
+    'blocks': 'jsonb', 'json': 'jsonb',
+    'integer': 'integer', 'biginteger': 'bigint', 'float': 'double', 'decimal': 'decimal',
+    'date': 'date', 'time': 'time', 'datetime': 'timestamp', 'timestamp': 'timestamp',
+    'boolean': 'boolean',
+}
+
+# Tipi che non sono colonne della tabella ma tabelle collegate
+STRUCTURAL_TYPES = {'relation', 'component', 'dynamiczone', 'media'}
+
+# Opzioni che toccano solo validazione e admin panel
+SAFE_OPTIONS = {
+    'default', 'required', 'min', 'max', 'minLength', 'maxLength', 'private', 'configurable',
+    'pluginOptions', 'regex', 'targetField', 'allowedTypes', 'options', 'customField', 'conditions',
+}
+
+
+@dataclass
+class SchemaDef:
+    """Schema di un content-type ('api::<api>.<nome>') o di un component ('<categoria>.<nome>')"""
+    uid: str
+    kind: str
+    path: Path
+    data: Dict
+
+    @property
+    def table(self) -> str:
+        return self.data.get('collectionName', '')
+
+
+@dataclass
+class SchemaChange:
+    """Singola differenza semantica tra due versioni di uno schema"""
+    attribute: str
+    description: str
+    impact: str = 'safe'
+
+
+@dataclass
+class SchemaDiff:
+    """Differenze di un content-type o component tra sorgente e target"""
+    uid: str
+    status: str
+    source: Optional[SchemaDef] = None
+    target: Optional[SchemaDef] = None
+    changes: List[SchemaChange] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return self.status != 'unchanged'
+
+    @property
+    def impact(self) -> str:
+        impacts = [change.impact for change in self.changes] or ['safe']
+        return max(impacts, key=IMPACT_ORDER.index)
+
+    @property
+    def table(self) -> str:
+        schema = self.source or self.target
+        return schema.table if schema else ''
+
+
+def _read_json(path: Path) -> Optional[Dict]:
+    try:
+        return read_json(path)
+    except (OSError, ValueError):
+        return None
+
+
+def load_schemas(project_root: Path) -> Dict[str, SchemaDef]:
+    """Legge gli schema di content-type e components di un progetto Strapi"""
+    schemas: Dict[str, SchemaDef] = {}
+
+    api_root = project_root / 'src' / 'api'
+    for schema_path in sorted(api_root.glob('*/content-types/*/schema.json')):
+        data = _read_json(schema_path)
+        if data is None:
+            continue
+        api_name = schema_path.parents[2].name
+        uid = f'api::{api_name}.{schema_path.parent.name}'
+        schemas[uid] = SchemaDef(uid, 'contentType', schema_path, data)
+
+    components_root = project_root / 'src' / 'components'
+    for component_path in sorted(components_root.glob('*/*.json')):
+        data = _read_json(component_path)
+        if data is None:
+            continue
+        uid = f'{component_path.parent.name}.{component_path.stem}'
+        schemas[uid] = SchemaDef(uid, 'component', component_path, data)
+
+    return schemas
+
+
+def _diff_attribute(name: str, source: Dict, target: Dict) -> List[SchemaChange]:
+    """Differenze di un attributo presente in entrambe le versioni (target → sorgente)"""
+    changes = []
+    old_type, new_type = target.get('type'), source.get('type')
+
+    if old_type != new_type:
+        if old_type in STRUCTURAL_TYPES or new_type in STRUCTURAL_TYPES:
+            changes.append(SchemaChange(name, f'tipo {old_type} → {new_type} (colonna/tabelle collegate sostituite)', 'breaking'))
+        elif COLUMN_TYPES.get(old_type) != COLUMN_TYPES.get(new_type):
+            changes.append(SchemaChange(name, f'tipo {old_type} → {new_type} (ALTER COLUMN)', 'rewrite'))
+        else:
+            changes.append(SchemaChange(name, f'tipo {old_type} → {new_type} (stessa colonna)'))
+        return changes
+
+    if new_type == 'relation':
+        if source.get('relation') != target.get('relation'):
+            changes.append(SchemaChange(
+                name, f'relazione {target.get("relation")} → {source.get("relation")} (tabella di link ricostruita)', 'rewrite'))
+        if source.get('target') != target.get('target'):
+            changes.append(SchemaChange(
+                name, f'target {target.get("target")} → {source.get("target")}', 'breaking'))
+        for key in ('inversedBy', 'mappedBy'):
+            if source.get(key) != target.get(key):
+                changes.append(SchemaChange(name, f'{key} {target.get(key)} → {source.get(key)}', 'rewrite'))
+
+    elif new_type == 'enumeration':
+        old_values, new_values = target.get('enum', []), source.get('enum', [])
+        removed = [v for v in old_values if v not in new_values]
+        added = [v for v in new_values if v not in old_values]
+        if removed:
+            changes.append(SchemaChange(name, f'valori enum rimossi: {", ".join(removed)}', 'breaking'))
+        if added:
+            changes.append(SchemaChange(name, f'valori enum aggiunti: {", ".join(added)}'))
+        if not removed and not added and old_values != new_values:
+            changes.append(SchemaChange(name, 'ordine dei valori enum'))
+
+    elif new_type == 'component':
+        if source.get('component') != target.get('component'):
+            changes.append(SchemaChange(
+                name, f'component {target.get("component")} → {source.get("component")}', 'breaking'))
+        if bool(source.get('repeatable')) != bool(target.get('repeatable')):
+            changes.append(SchemaChange(name, 'repeatable cambiato (tabella *_cmps ricostruita)', 'rewrite'))
+
+    elif new_type == 'dynamiczone':
+        old_components, new_components = target.get('components', []), source.get('components', [])
+        removed = [c for c in old_components if c not in new_components]
+        added = [c for c in new_components if c not in old_components]
+        if removed:
+            changes.append(SchemaChange(name, f'components rimossi dalla dynamic zone: {", ".join(removed)}', 'breaking'))
+        if added:
+            changes.append(SchemaChange(name, f'components aggiunti alla dynamic zone: {", ".join(added)}'))
+
+    elif new_type == 'media':
+        if bool(source.get('multiple')) != bool(target.get('multiple')):
+            changes.append(SchemaChange(name, 'multiple cambiato (relazioni dei file ricostruite)', 'rewrite'))
+
+    if bool(source.get('unique')) != bool(target.get('unique')):
+        if source.get('unique'):
+            changes.append(SchemaChange(name, 'unique aggiunto (creazione indice, fallisce con duplicati)', 'rewrite'))
+        else:
+            changes.append(SchemaChange(name, 'unique rimosso'))
+
+    handled = {'type', 'relation', 'target', 'inversedBy', 'mappedBy', 'enum', 'component', 'repeatable',
+               'components', 'multiple', 'unique'}
+    for key in sorted((set(source) | set(target)) - handled):
+        if source.get(key) != target.get(key):
+            impact = 'safe' if key in SAFE_OPTIONS else 'breaking'
+            changes.append(SchemaChange(name, f'{key}: {target.get(key)!r} → {source.get(key)!r}', impact))
+
+    return changes
+
+
+def diff_schema(uid: str, source: Optional[SchemaDef], target: Optional[SchemaDef]) -> SchemaDiff:
+    """Confronta la versione sorgente (nuova) con quella nel target (attuale)"""
+    if target is None:
+        return SchemaDiff(uid, 'added', source, target, [SchemaChange('*', 'nuovo schema (nuova tabella)')])
+    if source is None:
+        return SchemaDiff(uid, 'removed', source, target, [SchemaChange('*', 'presente solo nel target', 'breaking')])
+    if source.data == target.data:
+        return SchemaDiff(uid, 'unchanged', source, target)
+
+    changes = []
+    new_data, old_data = source.data, target.data
+
+    if new_data.get('collectionName') != old_data.get('collectionName'):
+        changes.append(SchemaChange(
+            '*', f'collectionName {old_data.get("collectionName")} → {new_data.get("collectionName")} (nuova tabella)',
+            'breaking'))
+
+    old_options, new_options = old_data.get('options', {}), new_data.get('options', {})
+    if bool(new_options.get('draftAndPublish')) != bool(old_options.get('draftAndPublish')):
+        changes.append(SchemaChange('*', 'draftAndPublish cambiato (righe draft/published riscritte)', 'rewrite'))
+
+    old_localized = old_data.get('pluginOptions', {}).get('i18n', {}).get('localized', False)
+    new_localized = new_data.get('pluginOptions', {}).get('i18n', {}).get('localized', False)
+    if bool(old_localized) != bool(new_localized):
+        changes.append(SchemaChange('*', 'i18n localized cambiato (righe per locale riscritte)', 'rewrite'))
+
+    for key in ('info', 'config', 'kind'):
+        if new_data.get(key) != old_data.get(key):
+            changes.append(SchemaChange('*', f'{key} modificato', 'breaking' if key == 'kind' else 'safe'))
+
+    old_attributes, new_attributes = old_data.get('attributes', {}), new_data.get('attributes', {})
+    for name, attribute in new_attributes.items():
+        if name not in old_attributes:
+            changes.append(SchemaChange(name, f'attributo aggiunto ({attribute.get("type")})'))
+        elif attribute != old_attributes[name]:
+            changes.extend(_diff_attribute(name, attribute, old_attributes[name]))
+    for name, attribute in old_attributes.items():
+        if name not in new_attributes:
+            changes.append(SchemaChange(name, f'attributo rimosso ({attribute.get("type")})', 'breaking'))
+
+    if not changes:
+        # Stesso contenuto a parte opzioni non confrontate sopra o l'ordine degli attributi
+        changes.append(SchemaChange('*', 'opzioni o ordine degli attributi'))
+
+    return SchemaDiff(uid, 'changed', source, target, changes)
+
+
+def diff_projects(source_root: Path, target_root: Path) -> List[SchemaDiff]:
+    """Diff semantico di tutti gli schema (content-type prima, poi components)"""
+    source_schemas = load_schemas(source_root)
+    target_schemas = load_schemas(target_root)
+    uids = sorted(set(source_schemas) | set(target_schemas), key=lambda uid: (not uid.startswith('api::'), uid))
+    return [diff_schema(uid, source_schemas.get(uid), target_schemas.get(uid)) for uid in uids]
+
+
+def schema_dependencies(schema: SchemaDef) -> Set[str]:
+    """UID di content-type e components referenziati dagli attributi di uno schema"""
+    dependencies = set()
+    for attribute in schema.data.get('attributes', {}).values():
+        attribute_type = attribute.get('type')
+        if attribute_type == 'relation' and attribute.get('target', '').startswith('api::'):
+            dependencies.add(attribute['target'])
+        elif attribute_type == 'component' and attribute.get('component'):
+            dependencies.add(attribute['component'])
+        elif attribute_type == 'dynamiczone':
+            dependencies.update(attribute.get('components', []))
+    dependencies.discard(schema.uid)
+    return dependencies
+
+
+def build_dependency_graph(schemas: Dict[str, SchemaDef]) -> Dict[str, Set[str]]:
+    """
+    Grafo uid → dipendenze dirette. Le relazioni verso plugin (upload, users)
+    e gli uid non presenti nel progetto vengono ignorati.
+    """
+    return {uid: {dep for dep in schema_dependencies(schema) if dep in schemas} for uid, schema in schemas.items()}
+
+
+# Tabelle dei plugin referenziate dagli schema del progetto
+PLUGIN_TABLES = {
+    'plugin::upload.file': 'files',
+    'plugin::users-permissions.user': 'up_users',
+    'plugin::users-permissions.role': 'up_roles',
+    'admin::user': 'admin_users',
+}
+MEDIA_MORPH_TABLE = 'files_related_mph'
+
+
+def _snake_case(name: str) -> str:
+    """Nome di colonna/tabella come lo genera Strapi dal nome dell'attributo"""
+    return re.sub(r'(?<=[a-z0-9])(?=[A-Z])', '_', name).replace('-', '_').lower()
+
+
+def strapi_table_dependencies(schemas: Dict[str, SchemaDef]) -> Dict[str, Set[str]]:
+    """
+    Tabelle del database → tabelle da cui dipendono, secondo le convenzioni
+    di nome di Strapi 5: <tabella>_<attributo>_lnk (relazioni, lato
+    proprietario), <tabella>_cmps (components e dynamic zone) e
+    files_related_mph (media)
+    """
+    tables = {uid: schema.table for uid, schema in schemas.items() if schema.table}
+    tables.update(PLUGIN_TABLES)
+    graph: Dict[str, Set[str]] = {}
+    for uid, schema in schemas.items():
+        table = schema.table
+        if not table:
+            continue
+        graph.setdefault(table, set())
+        components: Set[str] = set()
+        for name, attribute in schema.data.get('attributes', {}).items():
+            attribute_type = attribute.get('type')
+            if attribute_type == 'relation' and 'mappedBy' not in attribute:
+                link = f'{table}_{_snake_case(name)}_lnk'
+                graph.setdefault(link, set()).add(table)
+                if attribute.get('target') in tables:
+                    graph[link].add(tables[attribute['target']])
+            elif attribute_type == 'component':
+                components.add(attribute.get('component', ''))
+            elif attribute_type == 'dynamiczone':
+                components.update(attribute.get('components', []))
+            elif attribute_type == 'media':
+                graph.setdefault(MEDIA_MORPH_TABLE, set()).add(PLUGIN_TABLES['plugin::upload.file'])
+        if components:
+            graph.setdefault(f'{table}_cmps', set()).update(
+                {table} | {tables[c] for c in components if c in tables}
+            )
+    return graph
+
+
+def resolve_only(selection: str, schemas: Dict[str, SchemaDef]) -> List[str]:
+    """
+    Converte '--only pagina,articoli' (nomi delle cartelle in src/api o uid
+    completi come api::pagina.pagina o shared.seo) negli uid di partenza
+    """
+    roots = []
+    for name in (part.strip() for part in selection.split(',') if part.strip()):
+        if name in schemas:
+            matches = [name]
+        else:
+            matches = [uid for uid in schemas if uid.startswith(f'api::{name}.')]
+        if not matches:
+            raise ValueError(f'Collection sconosciuta: {name}')
+        roots.extend(uid for uid in matches if uid not in roots)
+    return roots
+
+
+def dependency_order(graph: Dict[str, Set[str]], roots: List[str]) -> List[str]:
+    """
+    Chiusura transitiva di roots in ordine topologico (dipendenze prima).
+    I cicli (relazioni reciproche tra content-type) non bloccano l'ordinamento.
+    """
+    ordered: List[str] = []
+    visited: Set[str] = set()
+
+    def visit(uid: str):
+        if uid in visited:
+            return
+        visited.add(uid)
+        for dep in sorted(graph.get(uid, ())):
+            visit(dep)
+        ordered.append(uid)
+
+    for root in roots:
+        visit(root)
+    return ordered
+
+
+def select_closure(source_root: Path, selection: str) -> List[str]:
+    """Uid da migrare per --only, in ordine di dipendenza"""
+    schemas = load_schemas(source_root)
+    return dependency_order(build_dependency_graph(schemas), resolve_only(selection, schemas))
+
+
+def api_folders_of(uids: List[str]) -> List[str]:
+    """Cartelle di src/api che contengono i content-type indicati"""
+    folders = []
+    for uid in uids:
+        if uid.startswith('api::'):
+            folder = uid[len('api::'):].split('.', 1)[0]
+            if folder not in folders:
+                folders.append(folder)
+    return folders
+
+
+def print_selection(uids: List[str], selection: str):
+    """Mostra cosa verrà migrato con --only"""
+    content_types = [uid for uid in uids if uid.startswith('api::')]
+    components = [uid for uid in uids if not uid.startswith('api::')]
+    print_info(f'--only {selection}: {len(content_types)} content-type e {len(components)} components '
+               f'(chiusura delle dipendenze)')
+    for uid in uids:
+        print_detail(uid)
+    print()
+
+
+def table_row_counts(db_path: Path) -> Dict[str, int]:
+    """
+    Numero di righe per tabella dal database SQLite di Strapi (sola lettura).
+    Returns: dizionario vuoto se il database non esiste o non è leggibile
+    """
+    if not db_path.exists():
+        return {}
+    counts = {}
+    try:
+        connection = sqlite3.connect(f'file:{db_path.as_posix()}?mode=ro', uri=True)
+        try:
+            tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                counts[table] = connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return {}
+    return counts
+
+
+def print_schema_report(diffs: List[SchemaDiff], row_counts: Optional[Dict[str, int]] = None,
+                        large_rows: int = DEFAULT_LARGE_ROWS):
+    """Stampa le differenze semantiche, evidenziando le riscritture su tabelle grandi"""
+    row_counts = row_counts or {}
+    changed = [diff for diff in diffs if diff.changed]
+
+    for diff in changed:
+        rows = row_counts.get(diff.table)
+        rows_text = f', {rows} righe' if rows is not None else ''
+        label = f'{diff.uid} [{diff.status}] ({IMPACT_LABELS[diff.impact]}{rows_text})'
+        if diff.impact == 'rewrite' and rows is not None and rows >= large_rows:
+            print_warning(f'{label} - TABELLA GRANDE: pianificare una finestra di manutenzione')
+        elif diff.impact == 'safe':
+            print_info(label)
+        else:
+            print_warning(label)
+        for change in diff.changes:
+            print_detail(f'{change.attribute}: {change.description}')
+    if changed:
+        print()
+
+    print_header('🧬 RIEPILOGO DIFF SCHEMA', Colors.CYAN)
+    print_success(f'Invariati: {len(diffs) - len(changed)}')
+    for status, label in (('added', 'Nuovi'), ('changed', 'Modificati'), ('removed', 'Solo nel target')):
+        print_success(f'{label}: {sum(1 for diff in changed if diff.status == status)}')
+    for impact in ('rewrite', 'breaking'):
+        count = sum(1 for diff in changed if diff.impact == impact)
+        if count:
+            print_warning(f'{IMPACT_LABELS[impact]}: {count}')
+    print()
@@ -10,6 +10,9 @@
 // - Filtro automatico per tipoLayout='statico' (evita collisioni con pagine dinamiche)
 // - Invalidazione automatica su create/update/delete via global lifecycle
 // - Supporto multi-collection (pagina, comunicati-stampa, etc.)
+// - Warm start da indice precompilato (.migrazione/path-index.json, generato
+//   da migrazione_percorsi.py): dal database si rileggono solo le entity
+//   cambiate dopo la compilazione
 //
 // Utilizzo:
 // - await pathResolver.initialize() - Inizializza la cache
@@ -24,26 +27,47 @@
  * per risolvere velocemente quale pagina corrisponde ad un dato path.
  */
 
+import fs from 'fs';
+import path from 'path';
+
+interface PathEntry {
+  slug: string;
+  documentId: string;
+  id: string | number;
+  isPrimary: boolean; // true se è lo slug principale, false se url addizionale
+  contentType: string; // es: 'api::pagina.pagina', 'api::comunicati-stampa.comunicati-stampa'
+  tipoLayout?: string; // Solo per api::pagina.pagina
+}
+
 interface PathMap {
-  [path: string]: {
-    slug: string;
-    documentId: string;
-    id: string | number;
-    isPrimary: boolean; // true se è lo slug principale, false se url addizionale
-    contentType: string; // es: 'api::pagina.pagina', 'api::comunicati-stampa.comunicati-stampa'
-    tipoLayout?: string; // Solo per api::pagina.pagina
-  } | {
-    slug: string;
-    documentId: string;
-    id: string | number;
-    isPrimary: boolean;
-    contentType: string;
-    tipoLayout?: string;
-  }[];
+  [path: string]: PathEntry | PathEntry[];
 }
 
+/**
+ * Collection nell'indice compilato: entity pubblicate come
+ * [id, documentId, slug, tipoLayout, url_addizionali], più id massimo e
+ * updatedAt più recente al momento della compilazione
+ */
+interface CompiledContentType {
+  maxId: number;
+  updatedAt: string | null;
+  entities: [number, string, string, string | null, string[]][];
+}
+
+interface PathIndex {
+  version: number;
+  compiledAt: string;
+  release: string | null;
+  contentTypes: { [uid: string]: CompiledContentType };
+}
+
+// Indice dei path compilato offline da migrazione_percorsi.py
+const PATH_INDEX_VERSION = 1;
+const PATH_INDEX_FILE = path.join('.migrazione', 'path-index.json');
+
 export default ({ strapi }: { strapi: any }) => ({
   pathMap: null as PathMap | null,
+  pathIndex: undefined as PathIndex | null | undefined,
   isInitialized: false,
   isInitializing: false,
 
@@ -75,121 +99,25 @@ export default ({ strapi }: { strapi: any }) => ({
       });
 
       this.pathMap = {};
-      let totalPaths = 0;
-      let totalEntities = 0;
+
+      // Indice compilato offline (migrazione_percorsi.py), se presente
+      const pathIndex = await this.loadPathIndex();
 
       // Itera su ogni collection type
       for (const contentTypeUID of contentTypes) {
         try {
-          const contentType = strapi.contentTypes[contentTypeUID];
-          const attributes = contentType.attributes || {};
-          const hasUrlAddizionali = attributes.url_addizionali !== undefined;
-
-          // Query con status: 'published' per Strapi v5
-          // Include tipoLayout per api::pagina.pagina
-          const fields: any = ['id', 'slug', 'documentId', 'publishedAt'];
-          if (contentTypeUID === 'api::pagina.pagina' && attributes.tipoLayout) {
-            fields.push('tipoLayout');
-          }
-
-          const allEntities: any = await strapi.entityService.findMany(contentTypeUID as any, {
-            fields,
-            status: 'published', // Solo versioni pubblicate in Strapi v5
-            populate: hasUrlAddizionali ? {
-              url_addizionali: {
-                fields: ['path'],
-              },
-            } : {},
-            limit: -1, // Tutte le entità
-          });
-
-          if (!allEntities || !Array.isArray(allEntities)) {
-
+          const compiled = pathIndex?.contentTypes[contentTypeUID];
+          if (compiled) {
+            // Warm start: entity dell'indice + solo quelle cambiate dopo la compilazione
+            await this.reconcileContentType(contentTypeUID, compiled);
             continue;
           }
 
-          if (allEntities.length > 0) {
-
-          }
-
-          // Filtro manualmente solo le entità pubblicate (doppia sicurezza)
-          const entities = allEntities.filter(e => e.publishedAt !== null && e.publishedAt !== undefined);
-
-          // Log di debug per verificare lo stato delle entità
-
-          if (entities.length > 0) {
-            entities.forEach(e => {
-
-            });
-          }
-
-          totalEntities += entities.length;
+          const entities = await this.findPublishedEntities(contentTypeUID);
 
           // Costruisce la mappa per questa collection
           for (const entity of entities) {
-            // Aggiunge lo slug principale
-            if (entity.slug) {
-              const normalizedSlug = this.normalizePath(entity.slug);
-              
-              const pathEntry = {
-                slug: entity.slug,
-                documentId: entity.documentId,
-                id: entity.id,
-                isPrimary: true,
-                contentType: contentTypeUID,
-                ...(entity.tipoLayout && { tipoLayout: entity.tipoLayout }),
-              };
-              
-              // Controlla duplicati tra collection diverse
-              if (this.pathMap[normalizedSlug]) {
-                // Se esiste già, trasforma in array
-                const existing = this.pathMap[normalizedSlug];
-                if (Array.isArray(existing)) {
-                  existing.push(pathEntry);
-
-                } else {
-                  this.pathMap[normalizedSlug] = [existing, pathEntry];
-
-                }
-              } else {
-                this.pathMap[normalizedSlug] = pathEntry;
-                totalPaths++;
-              }
-            }
-
-            // Aggiunge gli url addizionali (se presenti)
-            if (hasUrlAddizionali && entity.url_addizionali && Array.isArray(entity.url_addizionali)) {
-              for (const urlAdd of entity.url_addizionali) {
-                if (urlAdd.path) {
-                  const normalizedPath = this.normalizePath(urlAdd.path);
-                  
-                  const pathEntry = {
-                    slug: entity.slug,
-                    documentId: entity.documentId,
-                    id: entity.id,
-                    isPrimary: false,
-                    contentType: contentTypeUID,
-                    ...(entity.tipoLayout && { tipoLayout: entity.tipoLayout }),
-                  };
-                  
-                  // Controlla duplicati
-                  if (this.pathMap[normalizedPath]) {
-                    // Se esiste già, trasforma in array
-                    const existing = this.pathMap[normalizedPath];
-                    if (Array.isArray(existing)) {
-                      existing.push(pathEntry);
-
-                    } else {
-                      this.pathMap[normalizedPath] = [existing, pathEntry];
-
-                    }
-                  } else {
-                    this.pathMap[normalizedPath] = pathEntry;
-                    totalPaths++;
-                  }
-                }
-              }
-            }
+            this.addEntityPaths(entity, contentTypeUID);
           }
         } catch (error) {
 
@@ -208,6 +136,149 @@ export default ({ strapi }: { strapi: any }) => ({
     }
   },
 
+  /**
+   * Entità pubblicate di una collection con slug, url_addizionali e tipoLayout
+   */
+  async findPublishedEntities(contentTypeUID: string, filters?: any) {
+    const contentType = strapi.contentTypes[contentTypeUID];
+    const attributes = contentType.attributes || {};
+    const hasUrlAddizionali = attributes.url_addizionali !== undefined;
+
+    // Query con status: 'published' per Strapi v5
+    // Include tipoLayout per api::pagina.pagina
+    const fields: any = ['id', 'slug', 'documentId', 'publishedAt'];
+    if (contentTypeUID === 'api::pagina.pagina' && attributes.tipoLayout) {
+      fields.push('tipoLayout');
+    }
+
+    const allEntities: any = await strapi.entityService.findMany(contentTypeUID as any, {
+      ...(filters && { filters }),
+      fields,
+      status: 'published', // Solo versioni pubblicate in Strapi v5
+      populate: hasUrlAddizionali ? {
+        url_addizionali: {
+          fields: ['path'],
+        },
+      } : {},
+      limit: -1, // Tutte le entità
+    });
+
+    if (!allEntities || !Array.isArray(allEntities)) {
+      return [];
+    }
+
+    // Filtro manualmente solo le entità pubblicate (doppia sicurezza)
+    return allEntities.filter(e => e.publishedAt !== null && e.publishedAt !== undefined);
+  },
+
+  /**
+   * Aggiunge alla mappa lo slug principale e gli url addizionali di un'entità
+   */
+  addEntityPaths(entity: any, contentTypeUID: string) {
+    // Aggiunge lo slug principale
+    if (entity.slug) {
+      this.addPathEntry(this.normalizePath(entity.slug), {
+        slug: entity.slug,
+        documentId: entity.documentId,
+        id: entity.id,
+        isPrimary: true,
+        contentType: contentTypeUID,
+        ...(entity.tipoLayout && { tipoLayout: entity.tipoLayout }),
+      });
+    }
+
+    // Aggiunge gli url addizionali (se presenti)
+    if (entity.url_addizionali && Array.isArray(entity.url_addizionali)) {
+      for (const urlAdd of entity.url_addizionali) {
+        if (urlAdd.path) {
+          this.addPathEntry(this.normalizePath(urlAdd.path), {
+            slug: entity.slug,
+            documentId: entity.documentId,
+            id: entity.id,
+            isPrimary: false,
+            contentType: contentTypeUID,
+            ...(entity.tipoLayout && { tipoLayout: entity.tipoLayout }),
+          });
+        }
+      }
+    }
+  },
+
+  /**
+   * Inserisce una voce nella mappa; i path duplicati diventano un array
+   */
+  addPathEntry(normalizedPath: string, pathEntry: PathEntry) {
+    // Controlla duplicati tra collection diverse
+    const existing = this.pathMap[normalizedPath];
+    if (!existing) {
+      this.pathMap[normalizedPath] = pathEntry;
+    } else if (Array.isArray(existing)) {
+      existing.push(pathEntry);
+    } else {
+      this.pathMap[normalizedPath] = [existing, pathEntry];
+    }
+  },
+
+  /**
+   * Legge l'indice dei path compilato da migrazione_percorsi.py
+   * (.migrazione/path-index.json o PATH_INDEX_FILE). Null se manca, è
+   * illeggibile o di un'altra versione: in quel caso si legge tutto dal database.
+   */
+  async loadPathIndex(): Promise<PathIndex | null> {
+    if (this.pathIndex !== undefined) return this.pathIndex;
+
+    const file = process.env.PATH_INDEX_FILE
+      || path.join(strapi.dirs?.app?.root ?? process.cwd(), PATH_INDEX_FILE);
+    try {
+      const data = JSON.parse(await fs.promises.readFile(file, 'utf-8'));
+      this.pathIndex = data?.version === PATH_INDEX_VERSION && data.contentTypes ? data : null;
+    } catch (error) {
+      this.pathIndex = null;
+    }
+    return this.pathIndex;
+  },
+
+  /**
+   * Ricostruisce i path di una collection dall'indice compilato, rileggendo
+   * dal database solo le entità modificate (updatedAt) o pubblicate (nuovo id)
+   * dopo la compilazione e scartando quelle non più pubblicate
+   */
+  async reconcileContentType(contentTypeUID: string, compiled: CompiledContentType) {
+    const changedFilters: any[] = [{ id: { $gt: compiled.maxId } }];
+    if (compiled.updatedAt) {
+      changedFilters.push({ updatedAt: { $gte: compiled.updatedAt } });
+    }
+    const changed = await this.findPublishedEntities(contentTypeUID, { $or: changedFilters });
+
+    // Solo i documentId pubblicati: nessun populate, una sola colonna
+    const published: any = await strapi.entityService.findMany(contentTypeUID as any, {
+      fields: ['documentId', 'publishedAt'],
+      status: 'published',
+      limit: -1,
+    });
+    const publishedIds = new Set(
+      (Array.isArray(published) ? published : [])
+        .filter(e => e.publishedAt !== null && e.publishedAt !== undefined)
+        .map(e => e.documentId)
+    );
+    const changedIds = new Set(changed.map(e => e.documentId));
+
+    for (const [id, documentId, slug, tipoLayout, urls] of compiled.entities) {
+      if (!publishedIds.has(documentId) || changedIds.has(documentId)) continue;
+      this.addEntityPaths({
+        id,
+        documentId,
+        slug,
+        tipoLayout,
+        url_addizionali: urls.map(urlPath => ({ path: urlPath })),
+      }, contentTypeUID);
+    }
+
+    for (const entity of changed) {
+      this.addEntityPaths(entity, contentTypeUID);
+    }
+  },
+
   /**
    * Aspetta che l'inizializzazione finisca
    */
@@ -588,6 +659,10 @@ export default ({ strapi }: { strapi: any }) => ({
       primaryPaths,
       additionalPaths,
       duplicatePaths,
+      pathIndex: this.pathIndex ? {
+        compiledAt: this.pathIndex.compiledAt,
+        release: this.pathIndex.release,
+      } : null,
     };
   },
 });
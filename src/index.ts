@@ -60,6 +60,8 @@ export default {
       // Mappa tutti i path (slug + url_addizionali) alle rispettive entity.
       // Gestisce automaticamente duplicati filtrando per tipoLayout='statico'.
       // Si invalida automaticamente su create/update/delete di qualsiasi collection con slug.
+      // Con .migrazione/path-index.json (migrazione_percorsi.py) parte dall'indice
+      // precompilato e rilegge solo le entity cambiate dopo la compilazione.
       // ==========================================
       const pathResolver = strapi.service('api::common.path-resolver');
       if (pathResolver?.initialize) {
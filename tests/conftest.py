@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Gli script di migrazione sono moduli nella radice del repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
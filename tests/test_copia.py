@@ -0,0 +1,101 @@
+"""
+Test di migrazione_copia.py: journal scritto a ogni esecuzione e ripresa
+con --resume di una copia interrotta a metà.
+"""
+
+import pytest
+
+from migrazione_copia import CopyEngine, MigrationJournal
+
+
+def write_file(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+
+
+@pytest.fixture
+def roots(tmp_path):
+    """Sorgente con due cartelle e due file singoli, target vuoto"""
+    source, target = tmp_path / 'sorgente', tmp_path / 'target'
+    write_file(source / 'src/api/pagina/schema.json', '{"kind": "collectionType"}')
+    write_file(source / 'src/api/pagina/controllers/pagina.js', 'module.exports = {};')
+    write_file(source / 'src/components/seo.json', '{"attributes": {}}')
+    write_file(source / 'package.json', '{"name": "progetto"}')
+    write_file(source / 'favicon.png', 'png')
+    target.mkdir()
+    return source, target
+
+
+def test_resume_after_interrupted_copy(roots, monkeypatch):
+    source, target = roots
+    trees = [(source / 'src/api', target / 'src/api'), (source / 'src/components', target / 'src/components')]
+    files = [(source / 'package.json', target / 'package.json'), (source / 'favicon.png', target / 'favicon.png')]
+
+    # Prima esecuzione, senza --resume: la copia di favicon.png fallisce
+    write_file_ok = CopyEngine._write_file
+
+    def broken_write(self, src, destination):
+        if src.name == 'favicon.png':
+            raise OSError('disco pieno')
+        return write_file_ok(self, src, destination)
+
+    monkeypatch.setattr(CopyEngine, '_write_file', broken_write)
+    engine = CopyEngine(source, target, jobs=1)
+    try:
+        assert all(result.copied for result in engine.copy_trees(trees))
+        outcomes = list(engine.copy_files(files))
+    finally:
+        engine.close()
+    assert outcomes[0] is True
+    assert isinstance(outcomes[1], OSError)
+
+    # L'esecuzione con errori conserva il journal con le operazioni completate
+    journal = MigrationJournal(target)
+    journal.load()
+    assert set(journal.entries) == {
+        ('tree', 'src/api'), ('tree', 'src/components'), ('file', 'package.json'),
+    }
+
+    # Ripresa: le operazioni completate vengono saltate senza riscrivere nulla
+    written = []
+
+    def counting_write(self, src, destination):
+        written.append(src.name)
+        return write_file_ok(self, src, destination)
+
+    monkeypatch.setattr(CopyEngine, '_write_file', counting_write)
+    engine = CopyEngine(source, target, jobs=1, resume=True)
+    try:
+        results = list(engine.copy_trees(trees))
+        outcomes = list(engine.copy_files(files))
+    finally:
+        engine.close()
+    assert [result.resumed for result in results] == [True, True]
+    assert [result.skipped for result in results] == [2, 1]
+    assert outcomes == [False, True]
+    assert written == ['favicon.png']
+    assert (target / 'favicon.png').read_text(encoding='utf-8') == 'png'
+
+    # Esecuzione senza errori: il journal viene eliminato
+    engine.complete()
+    assert not journal.path.exists()
+    assert not (target / '.migrazione').exists()
+
+
+def test_resume_recopies_changed_source(roots):
+    source, target = roots
+    engine = CopyEngine(source, target, jobs=1)
+    try:
+        engine.copy_tree(source / 'src/api', target / 'src/api')
+    finally:
+        engine.close()
+
+    write_file(source / 'src/api/pagina/schema.json', '{"kind": "singleType", "draftAndPublish": true}')
+    engine = CopyEngine(source, target, jobs=1, resume=True)
+    try:
+        result = engine.copy_tree(source / 'src/api', target / 'src/api')
+    finally:
+        engine.close()
+    assert not result.resumed
+    assert result.copied == 2
+    assert '"singleType"' in (target / 'src/api/pagina/schema.json').read_text(encoding='utf-8')
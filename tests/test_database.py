@@ -0,0 +1,208 @@
+"""
+Test di migrazione_database.py: checksum identico per i valori letti da
+SQLite e riletti da PostgreSQL, round trip di caricamento e verifica,
+ordine del caricamento parallelo secondo il grafo delle dipendenze.
+
+Il round trip richiede un PostgreSQL di prova:
+    MIGRAZIONE_TEST_DATABASE_URL=postgresql://postgres@localhost/postgres pytest tests
+"""
+
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from migrazione_database import (
+    ConnectionPool, PostgresConnection, canonical_value, collect_deferred, copy_field, drop_deferred,
+    load_tables, plan_tables, quote_ident, row_digest, table_dependencies, verify_tables, open_sqlite,
+)
+
+TEST_DATABASE_URL = os.environ.get('MIGRAZIONE_TEST_DATABASE_URL')
+
+# 2024-01-15 10:30:00.250 UTC
+MOMENT = datetime(2024, 1, 15, 10, 30, 0, 250000, tzinfo=timezone.utc)
+MOMENT_MS = 1705314600250
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data), encoding='utf-8')
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Progetto Strapi minimo: pagina → autore (relazione) e shared.seo (component)"""
+    write_json(tmp_path / 'src/api/autore/content-types/autore/schema.json', {
+        'kind': 'collectionType', 'collectionName': 'autori',
+        'attributes': {'nome': {'type': 'string'}},
+    })
+    write_json(tmp_path / 'src/api/pagina/content-types/pagina/schema.json', {
+        'kind': 'collectionType', 'collectionName': 'paginas',
+        'attributes': {
+            'titolo': {'type': 'string'},
+            'autore': {'type': 'relation', 'relation': 'manyToOne', 'target': 'api::autore.autore'},
+            'seo': {'type': 'component', 'component': 'shared.seo'},
+        },
+    })
+    write_json(tmp_path / 'src/components/shared/seo.json', {
+        'collectionName': 'components_shared_seos', 'attributes': {'titolo': {'type': 'string'}},
+    })
+    return tmp_path
+
+
+# ============================================
+# Checksum
+# ============================================
+
+@pytest.mark.parametrize('value', [
+    MOMENT_MS,
+    '2024-01-15 10:30:00.250',
+    '2024-01-15T10:30:00.250Z',
+    datetime(2024, 1, 15, 10, 30, 0, 250000),
+    MOMENT.astimezone(timezone(timedelta(hours=1))),
+])
+def test_canonical_timestamp(value):
+    assert canonical_value(value, 'timestamp') == str(MOMENT_MS)
+
+
+def test_row_digest_sqlite_and_postgres():
+    kinds = ['int', 'bool', 'json', 'timestamp', 'float', 'text']
+    sqlite_row = [7, 1, '{"b": [1, 2], "a": "è"}', MOMENT_MS, 3, 'testo']
+    postgres_row = [7, True, {'a': 'è', 'b': [1, 2]}, MOMENT, 3.0, 'testo']
+    assert row_digest(sqlite_row, kinds) == row_digest(postgres_row, kinds)
+    assert row_digest(sqlite_row, kinds) != row_digest([7, False] + postgres_row[2:], kinds)
+
+
+def test_copy_timestamp_explicit_utc():
+    assert copy_field('2024-01-15 10:30:00.250', 'timestamp') == '2024-01-15T10:30:00.250000+00:00'
+    assert copy_field(MOMENT_MS, 'timestamp') == '2024-01-15T10:30:00.250000+00:00'
+
+
+# ============================================
+# Caricamento su PostgreSQL
+# ============================================
+
+SQLITE_TABLES = {
+    'autori': 'id INTEGER PRIMARY KEY, nome TEXT, created_at INTEGER',
+    'paginas': 'id INTEGER PRIMARY KEY, titolo TEXT, attiva INTEGER, dati TEXT, prezzo REAL, '
+               'published_at TEXT, updated_at TEXT',
+    'paginas_autore_lnk': 'id INTEGER PRIMARY KEY, pagina_id INTEGER, autore_id INTEGER',
+    'paginas_cmps': 'id INTEGER PRIMARY KEY, entity_id INTEGER, cmp_id INTEGER, '
+                    'component_type TEXT, field TEXT, "order" REAL',
+    'components_shared_seos': 'id INTEGER PRIMARY KEY, titolo TEXT',
+    'recensioni': 'id INTEGER PRIMARY KEY, pagina_id INTEGER, voto INTEGER',
+}
+
+POSTGRES_TABLES = [
+    'CREATE TABLE autori (id integer PRIMARY KEY, nome varchar(255), created_at timestamp(6))',
+    'CREATE TABLE paginas (id integer PRIMARY KEY, titolo varchar(255), attiva boolean, dati jsonb, '
+    'prezzo double precision, published_at timestamp(6), updated_at timestamptz)',
+    'CREATE TABLE paginas_autore_lnk (id integer PRIMARY KEY, pagina_id integer, autore_id integer)',
+    'CREATE TABLE paginas_cmps (id integer PRIMARY KEY, entity_id integer, cmp_id integer, '
+    'component_type varchar(255), field varchar(255), "order" double precision)',
+    'CREATE TABLE components_shared_seos (id integer PRIMARY KEY, titolo varchar(255))',
+    # Dipendenza nota solo dalla foreign key (nessuno schema.json)
+    'CREATE TABLE recensioni (id integer PRIMARY KEY, pagina_id integer REFERENCES paginas (id), voto integer)',
+    'CREATE INDEX recensioni_pagina_idx ON recensioni (pagina_id)',
+]
+
+
+def create_sqlite(path, pages: int):
+    with closing(sqlite3.connect(path)) as db:
+        for name, columns in SQLITE_TABLES.items():
+            db.execute(f'CREATE TABLE {name} ({columns})')
+        db.executemany('INSERT INTO autori VALUES (?, ?, ?)',
+                       [(i, f'Autore {i}', MOMENT_MS + i) for i in range(1, 4)])
+        for i in range(1, pages + 1):
+            db.execute('INSERT INTO paginas VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                i, f'Pagina\t{i}', i % 2, json.dumps({'blocchi': [i], 'nota': 'città'}), i / 3,
+                '2024-01-15 10:30:00.250', '2024-01-15 10:30:00.250',
+            ))
+            db.execute('INSERT INTO paginas_autore_lnk VALUES (?, ?, ?)', (i, i, i % 3 + 1))
+            db.execute('INSERT INTO paginas_cmps VALUES (?, ?, ?, ?, ?, ?)', (i, i, i, 'shared.seo', 'seo', 1))
+            db.execute('INSERT INTO components_shared_seos VALUES (?, ?)', (i, f'Seo {i}'))
+            db.execute('INSERT INTO recensioni VALUES (?, ?, ?)', (i, i, 5))
+        db.commit()
+
+
+@pytest.fixture
+def postgres():
+    """Schema PostgreSQL temporaneo, con la sessione di default in un time zone diverso da UTC"""
+    if not TEST_DATABASE_URL:
+        pytest.skip('MIGRAZIONE_TEST_DATABASE_URL non impostata')
+    psycopg = pytest.importorskip('psycopg')
+    url = psycopg.conninfo.make_conninfo(TEST_DATABASE_URL, options='-c TimeZone=Europe/Rome')
+    schema = f'migrazione_test_{uuid.uuid4().hex[:8]}'
+    with closing(psycopg.connect(url, autocommit=True)) as conn:
+        conn.execute(f'CREATE SCHEMA {quote_ident(schema)}')
+    try:
+        pg = PostgresConnection(url, schema)
+        try:
+            for sql in POSTGRES_TABLES:
+                pg.execute(sql)
+            pg.commit()
+        finally:
+            pg.close()
+        yield url, schema
+    finally:
+        with closing(psycopg.connect(url, autocommit=True)) as conn:
+            conn.execute(f'DROP SCHEMA {quote_ident(schema)} CASCADE')
+
+
+def test_load_and_verify_round_trip(project, postgres, tmp_path):
+    url, schema = postgres
+    db_path = tmp_path / 'data.db'
+    create_sqlite(db_path, pages=10)
+
+    pg = PostgresConnection(url, schema)
+    try:
+        with closing(open_sqlite(db_path)) as db:
+            specs, only_source = plan_tables(db, pg)
+        assert only_source == []
+        deferred = collect_deferred(pg, [spec.name for spec in specs])
+        assert [item[1] for item in deferred.constraints] == ['recensioni']
+        graph = table_dependencies(specs, deferred, project)
+        drop_deferred(pg, deferred)
+    finally:
+        pg.close()
+
+    loaded = []
+    pool = ConnectionPool(url, schema, 4)
+    try:
+        report = load_tables(specs, graph, pool, db_path, deferred, jobs=4, batch_rows=4, chunk_rows=3,
+                             on_table=lambda result, chunks: loaded.append(result.table))
+        verify_tables(specs, report, pool, jobs=4, batch_rows=4)
+    finally:
+        pool.close()
+
+    assert report.index_errors == []
+    assert len(report.chunks['paginas']) > 1
+    for spec in specs:
+        result = report.results[spec.name]
+        assert result.ok, (spec.name, result)
+        assert result.rows_target == spec.rows
+
+    # Grafo: foreign key (recensioni) e convenzioni di Strapi (_lnk, _cmps)
+    assert graph['recensioni'] == {'paginas'}
+    assert graph['paginas_autore_lnk'] == {'paginas', 'autori'}
+    assert graph['paginas_cmps'] == {'paginas', 'components_shared_seos'}
+    for table, dependencies in graph.items():
+        for dependency in dependencies:
+            assert loaded.index(dependency) < loaded.index(table), (dependency, table)
+
+    # Le date sono salvate in UTC anche con il server in un altro time zone
+    pg = PostgresConnection(url, schema)
+    try:
+        published, updated = pg.query('SELECT published_at, updated_at FROM paginas WHERE id = 1')[0]
+        constraints = pg.query(
+            "SELECT conname FROM pg_constraint c JOIN pg_namespace n ON n.oid = c.connamespace "
+            "WHERE n.nspname = %s AND c.contype = 'f'", (schema,))
+    finally:
+        pg.close()
+    assert published == MOMENT.replace(tzinfo=None)
+    assert updated == MOMENT
+    assert len(constraints) == 1
@@ -0,0 +1,226 @@
+"""
+Test di migrazione_media.py su un progetto temporaneo con database SQLite
+(tabelle del plugin upload di Strapi) e file in public/uploads.
+"""
+
+import argparse
+import json
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from migrazione_media import (
+    DEFAULT_BREAKPOINTS, GCS_PROVIDER, FilesystemBucket, MediaDatabase, command_formati, expected_formats,
+    find_duplicates, local_media, merge_duplicates, merged_texts, plan_media, upload_media,
+)
+
+Image = pytest.importorskip('PIL.Image')
+
+UPLOAD_TABLES = '''
+CREATE TABLE files (id integer PRIMARY KEY AUTOINCREMENT, document_id varchar(255), name varchar(255),
+    alternative_text varchar(255), caption varchar(255), width integer, height integer, formats json,
+    hash varchar(255), ext varchar(255), mime varchar(255), size float, url varchar(255),
+    preview_url varchar(255), provider varchar(255), provider_metadata json, folder_path varchar(255));
+CREATE TABLE upload_folders (id integer PRIMARY KEY AUTOINCREMENT, name varchar(255), path_id integer,
+    path varchar(255));
+CREATE TABLE upload_folders_parent_lnk (id integer PRIMARY KEY AUTOINCREMENT, folder_id integer,
+    inv_folder_id integer, folder_ord float);
+CREATE TABLE files_folder_lnk (id integer PRIMARY KEY AUTOINCREMENT, file_id integer, folder_id integer,
+    file_ord float);
+CREATE TABLE files_related_mph (id integer PRIMARY KEY AUTOINCREMENT, file_id integer, related_id integer,
+    related_type varchar(255), field varchar(255), "order" float);
+'''
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """Progetto Strapi con .tmp/data.db e public/uploads, directory corrente dei comandi"""
+    (tmp_path / 'package.json').write_text(json.dumps({'dependencies': {'@strapi/strapi': '5.0.0'}}))
+    (tmp_path / 'public' / 'uploads').mkdir(parents=True)
+    (tmp_path / '.tmp').mkdir()
+    with closing(sqlite3.connect(tmp_path / '.tmp' / 'data.db')) as db:
+        db.executescript(UPLOAD_TABLES)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('DATABASE_CLIENT', raising=False)
+    monkeypatch.delenv('DATABASE_FILENAME', raising=False)
+    return tmp_path
+
+
+def execute(project, sql, rows):
+    with closing(sqlite3.connect(project / '.tmp' / 'data.db')) as db:
+        db.executemany(sql, rows)
+        db.commit()
+
+
+def add_file(project, file_id, file_hash, data, **columns):
+    """Riga di files con il suo file in public/uploads (se l'URL è locale)"""
+    ext = columns.get('ext', '.jpg')
+    values = {'id': file_id, 'name': f'foto {file_id}{ext}', 'hash': file_hash, 'ext': ext, 'mime': 'image/jpeg',
+              'url': f'/uploads/{file_hash}{ext}', 'provider': 'local', **columns}
+    if values['url'].startswith('/uploads/'):
+        (project / 'public' / values['url'].lstrip('/')).write_bytes(data)
+    execute(project, f'INSERT INTO files ({", ".join(values)}) VALUES ({", ".join("?" * len(values))})',
+            [tuple(values.values())])
+
+
+def add_image(project, file_id, file_hash, size):
+    """Immagine JPEG in public/uploads con la sua riga di files"""
+    path = project / 'public' / 'uploads' / f'{file_hash}.jpg'
+    Image.new('RGB', size, (file_id * 40 % 255, 90, 160)).save(path)
+    add_file(project, file_id, file_hash, path.read_bytes(), width=size[0], height=size[1])
+
+
+def files_rows(project, columns='id, formats'):
+    with closing(sqlite3.connect(project / '.tmp' / 'data.db')) as db:
+        return db.execute(f'SELECT {columns} FROM files ORDER BY id').fetchall()
+
+
+def database_args(**options):
+    defaults = {'database_url': None, 'schema': 'public', 'sqlite': None, 'jobs': 2, 'batch_rows': 100,
+                'yes': True}
+    defaults.update(options)
+    return argparse.Namespace(**defaults)
+
+
+# ============================================
+# Caricamento nel layout del bucket
+# ============================================
+
+def test_upload_media_keys_rows_and_second_run(project, tmp_path_factory):
+    thumbnail = {'name': 'thumbnail_Foto è 1.JPG', 'hash': 'thumbnail_Foto_e_1_abc', 'ext': '.JPG',
+                 'mime': 'image/jpeg', 'width': 200, 'height': 150, 'url': '/uploads/thumbnail_Foto_e_1_abc.JPG'}
+    (project / 'public' / 'uploads' / 'thumbnail_Foto_e_1_abc.JPG').write_bytes(b'miniatura')
+    add_file(project, 1, 'Foto_e_1_abc', b'originale 1', name='Foto è 1.JPG', ext='.JPG',
+             formats=json.dumps({'thumbnail': thumbnail}))
+    add_file(project, 2, 'logo_2f3', b'originale 2', ext='.PNG', mime='image/png')
+    add_file(project, 3, 'remoto_9', b'', url='https://storage.googleapis.com/altro/remoto.jpg', provider='altro')
+    execute(project, 'INSERT INTO upload_folders (id, name, path_id, path) VALUES (?, ?, ?, ?)',
+            [(1, 'Notizie', 1, '/1'), (2, 'Città/2024', 2, '/1/2')])
+    execute(project, 'INSERT INTO upload_folders_parent_lnk (folder_id, inv_folder_id) VALUES (?, ?)', [(2, 1)])
+    execute(project, 'INSERT INTO files_folder_lnk (file_id, folder_id) VALUES (?, ?)', [(1, 2)])
+
+    root = tmp_path_factory.mktemp('bucket')
+    bucket = FilesystemBucket(root, 'https://cdn.example.test/media-bucket/')
+    db = MediaDatabase(project)
+    try:
+        plan = plan_media(db, project, 'media/')
+        assert plan.remote == 1
+        assert {obj.key: obj.format for row in plan.rows for obj in row.objects} == {
+            'media/Notizie/Città-2024/Fotoe1abc.jpg': None,
+            'media/Notizie/Città-2024/thumbnailFotoe1abc.jpg': 'thumbnail',
+            'media/logo_2f3/logo2f3.png': None,
+        }
+        stats = upload_media(plan, bucket, db, jobs=2, batch_rows=1)
+        assert (stats.uploaded, stats.present, stats.rows, stats.errors) == (3, 0, 2, [])
+
+        # Stesso piano rieseguito (es. interruzione prima della scrittura): nessun nuovo upload
+        again = upload_media(plan, bucket, db, jobs=2, batch_rows=10)
+        assert (again.uploaded, again.present, again.rows, again.errors) == (0, 3, 2, [])
+        # Le righe riscritte non sono più locali
+        second = plan_media(db, project, 'media/')
+        assert (second.rows, second.remote) == ([], 3)
+    finally:
+        db.close()
+
+    assert (root / 'media/Notizie/Città-2024/Fotoe1abc.jpg').read_bytes() == b'originale 1'
+    assert (root / 'media/Notizie/Città-2024/thumbnailFotoe1abc.jpg').read_bytes() == b'miniatura'
+    assert (root / 'media/logo_2f3/logo2f3.png').read_bytes() == b'originale 2'
+    assert not list(root.rglob('*.migrazione-tmp'))
+
+    rows = files_rows(project, 'id, url, provider, formats')
+    base = 'https://cdn.example.test/media-bucket'
+    assert rows[0][:3] == (1, f'{base}/media/Notizie/Città-2024/Fotoe1abc.jpg', GCS_PROVIDER)
+    assert json.loads(rows[0][3]) == {'thumbnail': dict(thumbnail, url=f'{base}/media/Notizie/Città-2024/'
+                                                                        'thumbnailFotoe1abc.jpg')}
+    assert rows[1] == (2, f'{base}/media/logo_2f3/logo2f3.png', GCS_PROVIDER, None)
+    assert rows[2] == (3, 'https://storage.googleapis.com/altro/remoto.jpg', 'altro', None)
+
+
+# ============================================
+# Formati responsive
+# ============================================
+
+@pytest.mark.parametrize('width, height, names', [
+    (None, 600, []),
+    (200, 150, []),
+    (300, 100, ['thumbnail']),
+    (600, 400, ['thumbnail', 'small']),
+    (800, 1200, ['thumbnail', 'large', 'medium', 'small']),
+])
+def test_expected_formats(width, height, names):
+    sizes = expected_formats(width, height, DEFAULT_BREAKPOINTS)
+    assert [name for name, _, _ in sizes] == names
+    assert all(name == 'thumbnail' or max_width == DEFAULT_BREAKPOINTS[name] for name, max_width, _ in sizes)
+
+
+def test_formati_restores_rows_from_manifest(project):
+    add_image(project, 1, 'foto_1_abc', (1200, 900))
+    add_image(project, 2, 'foto_2_def', (640, 480))
+    args = database_args(breakpoints=None, force=False)
+
+    assert command_formati(args) == 0
+    generated = {file_id: json.loads(formats) for file_id, formats in files_rows(project)}
+    assert list(generated[1]) == ['thumbnail', 'large', 'medium', 'small']
+    assert list(generated[2]) == ['thumbnail', 'small']
+    derivative = project / 'public' / 'uploads' / 'large_foto_1_abc.jpg'
+    assert derivative.is_file()
+    mtime = derivative.stat().st_mtime_ns
+
+    # Database ricreato: i file e il manifest ci sono, formats no
+    with closing(sqlite3.connect(project / '.tmp' / 'data.db')) as db:
+        db.execute('UPDATE files SET formats = NULL')
+        db.commit()
+    assert command_formati(args) == 0
+    restored = {file_id: json.loads(formats) for file_id, formats in files_rows(project)}
+    assert restored == generated
+    assert derivative.stat().st_mtime_ns == mtime
+
+    # Righe già allineate al manifest: nessuna scrittura
+    with closing(sqlite3.connect(project / '.tmp' / 'data.db')) as db:
+        db.execute('UPDATE files SET formats = ? WHERE id = 2', (json.dumps(generated[2], indent=1),))
+        db.commit()
+    assert command_formati(args) == 0
+    assert files_rows(project)[1][1] == json.dumps(generated[2], indent=1)
+
+
+# ============================================
+# Deduplicazione
+# ============================================
+
+def test_dedup_merges_rows_references_and_texts(project):
+    content = b'stessa immagine' * 100
+    add_file(project, 1, 'a_1', content, caption='Didascalia 1')
+    add_file(project, 2, 'b_2', content, alternative_text='Alt 2')
+    add_file(project, 3, 'c_3', content, alternative_text='Alt 3', caption='Altra')
+    add_file(project, 4, 'd_4', content[:-1] + b'X')
+    add_file(project, 5, 'e_5', b'piccola')
+    execute(project, 'INSERT INTO files_related_mph (id, file_id, related_id, related_type, field, "order") '
+                     'VALUES (?, ?, ?, ?, ?, ?)', [
+                         (1, 1, 10, 'api::pagina.pagina', 'immagine', 1),
+                         (2, 2, 10, 'api::pagina.pagina', 'galleria', 1),
+                         (3, 3, 10, 'api::pagina.pagina', 'galleria', 2),
+                         (4, 3, 11, 'api::pagina.pagina', 'immagine', 1),
+                         (5, 4, 12, 'api::pagina.pagina', 'immagine', 1),
+                     ])
+    execute(project, 'INSERT INTO files_folder_lnk (file_id, folder_id, file_ord) VALUES (?, ?, ?)', [(2, 1, 1)])
+
+    db = MediaDatabase(project)
+    try:
+        media, skipped = local_media(db, project)
+        groups, hashed = find_duplicates(media, jobs=2)
+        assert (len(media), skipped, hashed) == (5, 0, 4)
+        assert [(group.keep.id, [dup.id for dup in group.duplicates]) for group in groups] == [(1, [2, 3])]
+        assert merged_texts(groups[0]) == ({'alternative_text': 'Alt 2'}, ['Alt 3', 'Altra'])
+        assert merge_duplicates(db, groups) == (2, 1, 2)
+    finally:
+        db.close()
+
+    assert files_rows(project, 'id, alternative_text, caption') == [
+        (1, 'Alt 2', 'Didascalia 1'), (4, None, None), (5, None, None)]
+    with closing(sqlite3.connect(project / '.tmp' / 'data.db')) as db:
+        references = db.execute('SELECT id, file_id, related_id, field FROM files_related_mph ORDER BY id').fetchall()
+        folders = db.execute('SELECT COUNT(*) FROM files_folder_lnk').fetchone()[0]
+    assert references == [(1, 1, 10, 'immagine'), (2, 1, 10, 'galleria'), (4, 1, 11, 'immagine'),
+                          (5, 4, 12, 'immagine')]
+    assert folders == 0